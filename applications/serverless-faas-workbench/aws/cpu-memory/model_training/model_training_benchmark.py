@@ -23,21 +23,22 @@ def prepare(spec):
     spec['deploy_id'] = spec['deploy_id'] or random.randint(1000, 9999)
 
     spec.build(PY_BUILD_SLS)
-    spec.run(f"npm install", image=PY_BUILD_SLS)
-
-    #create the dataset and model buckets
-    spec.run(f"aws s3 mb s3://{model_bucket(spec)} --region={spec['region']}", image=PY_BUILD_SLS)
-    spec.run(f"aws s3 mb s3://{dataset_bucket(spec)} --region={spec['region']}", image=PY_BUILD_SLS)
+    #install dependencies and create the dataset and model buckets concurrently
+    spec.run_many([
+        "npm install",
+        f"aws s3 mb s3://{model_bucket(spec)} --region={spec['region']}",
+        f"aws s3 mb s3://{dataset_bucket(spec)} --region={spec['region']}"
+    ], image=PY_BUILD_SLS)
 
     #create dataset copies inside dataset_bucket
     data_key_splitted = spec['data_object_key'].split('.')
     data_key_prefix = data_key_splitted[0] #e.g., reviews10mb
     data_key_suffix = data_key_splitted[1] #e.g., csv
-    for data_number in range(0, spec['data_replication']):
-        if data_number == 0: #upload it from local only once
-            spec.run(f"aws s3 cp ./test_data/{spec['data_object_key']} s3://{dataset_bucket(spec)}/{data_key_prefix}-{data_number}.{data_key_suffix}", image=PY_BUILD_SLS)
-        else: #create the copies within the S3 bucket
-            spec.run(f"aws s3 cp s3://{dataset_bucket(spec)}/{data_key_prefix}-0.{data_key_suffix} s3://{dataset_bucket(spec)}/{data_key_prefix}-{data_number}.{data_key_suffix}", image=PY_BUILD_SLS)
+    #upload it from local only once
+    spec.run(f"aws s3 cp ./test_data/{spec['data_object_key']} s3://{dataset_bucket(spec)}/{data_key_prefix}-0.{data_key_suffix}", image=PY_BUILD_SLS)
+    #create the copies within the S3 bucket concurrently
+    spec.run_many([f"aws s3 cp s3://{dataset_bucket(spec)}/{data_key_prefix}-0.{data_key_suffix} s3://{dataset_bucket(spec)}/{data_key_prefix}-{data_number}.{data_key_suffix}"
+                   for data_number in range(1, spec['data_replication'])], image=PY_BUILD_SLS)
     
     #deploy lambda function
     spec.run(sls_cmd('deploy', spec), image=PY_BUILD_SLS)
@@ -67,8 +68,10 @@ def invoke(spec):
 
 
 def cleanup(spec): #delete everything that the app created including the deployment itself
-    spec.run(f"aws s3 rb s3://{dataset_bucket(spec)} --force", image=PY_BUILD_SLS)
-    spec.run(f"aws s3 rb s3://{model_bucket(spec)} --force", image=PY_BUILD_SLS)
+    spec.run_many([
+        f"aws s3 rb s3://{dataset_bucket(spec)} --force",
+        f"aws s3 rb s3://{model_bucket(spec)} --force"
+    ], image=PY_BUILD_SLS)
     spec.run(sls_cmd('remove', spec), image=PY_BUILD_SLS)
 
 
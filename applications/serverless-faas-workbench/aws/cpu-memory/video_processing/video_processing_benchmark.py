@@ -20,22 +20,23 @@ def prepare(spec):
     spec['deploy_id'] = spec['deploy_id'] or random.randint(1000, 9999)
 
     spec.build(PY_BUILD_SLS)
-    spec.run(f"npm install", image=PY_BUILD_SLS)
-
-    #create the dataset and model buckets
-    spec.run(f"aws s3 mb s3://{input_bucket(spec)} --region={spec['region']}", image=PY_BUILD_SLS)
-    spec.run(f"aws s3 mb s3://{output_bucket(spec)} --region={spec['region']}", image=PY_BUILD_SLS)
+    #install dependencies and create the input and output buckets concurrently
+    spec.run_many([
+        "npm install",
+        f"aws s3 mb s3://{input_bucket(spec)} --region={spec['region']}",
+        f"aws s3 mb s3://{output_bucket(spec)} --region={spec['region']}"
+    ], image=PY_BUILD_SLS)
 
     #create dataset copies inside dataset_bucket
     obj_key_splitted = spec['object_key'].split('.')
     obj_key_prefix = obj_key_splitted[0] #e.g., vid1
     obj_key_suffix = obj_key_splitted[1] #e.g., mp4
 
-    for data_number in range(0, spec['data_replication']):
-        if data_number == 0: #upload it from local only once
-            spec.run(f"aws s3 cp ./test_video/{spec['object_key']} s3://{input_bucket(spec)}/{obj_key_prefix}-{data_number}.{obj_key_suffix}", image=PY_BUILD_SLS)
-        else: #create the copies within the S3 bucket
-            spec.run(f"aws s3 cp s3://{input_bucket(spec)}/{obj_key_prefix}-0.{obj_key_suffix} s3://{input_bucket(spec)}/{obj_key_prefix}-{data_number}.{obj_key_suffix}", image=PY_BUILD_SLS)
+    #upload it from local only once
+    spec.run(f"aws s3 cp ./test_video/{spec['object_key']} s3://{input_bucket(spec)}/{obj_key_prefix}-0.{obj_key_suffix}", image=PY_BUILD_SLS)
+    #create the copies within the S3 bucket concurrently
+    spec.run_many([f"aws s3 cp s3://{input_bucket(spec)}/{obj_key_prefix}-0.{obj_key_suffix} s3://{input_bucket(spec)}/{obj_key_prefix}-{data_number}.{obj_key_suffix}"
+                   for data_number in range(1, spec['data_replication'])], image=PY_BUILD_SLS)
     #deploy lambda function    
     spec.run(sls_cmd('deploy', spec), image=PY_BUILD_SLS)
     spec['endpoint'] = spec.run(sls_cmd('info', spec) + " | grep ServiceEndpoint | awk '{print $2}'", image=PY_BUILD_SLS).rstrip()
@@ -61,8 +62,10 @@ def invoke(spec):
 
 def cleanup(spec): 
     logging.info('cleanup(): delete all functions and resources (e.g., test files or databases)')
-    spec.run(f"aws s3 rb s3://{input_bucket(spec)} --force", image=PY_BUILD_SLS)
-    spec.run(f"aws s3 rb s3://{output_bucket(spec)} --force", image=PY_BUILD_SLS)
+    spec.run_many([
+        f"aws s3 rb s3://{input_bucket(spec)} --force",
+        f"aws s3 rb s3://{output_bucket(spec)} --force"
+    ], image=PY_BUILD_SLS)
     spec.run(sls_cmd('remove', spec), image=PY_BUILD_SLS) #delete deployment
 
 
@@ -87,7 +87,8 @@ def run_trial(sb):
     # 2 minutes waiting time should be sufficient for apps to complete
     # and for the X-Ray traces to be processed when using only 60 invocations from 4 bursts of 20.
     sb.wait(2*60)
-    sb.get_traces()
+    # Analyze traces while downloading such that trace_breakdown.csv is ready after the download
+    sb.get_traces(analyze=True)
 
 
 def prepare_with_retry(sb):
@@ -7,6 +7,7 @@ Requires a Python environment with sb installed.
 from pathlib import Path
 import os
 from sb.sb import Sb
+from sb.trace_files import traces_file_names
 
 
 root_dir = Path(__file__).parent.parent.resolve()
@@ -15,14 +16,17 @@ default_data_path = root_dir / 'data' / data_source / 'raw'
 apps_path = os.environ.get('SB_DATA_DIR', None) or default_data_path
 
 # Force reanalysis (e.g., after updates to analyzer)
+# Only new or changed traces are recomputed if the analyzer is unchanged
+# because per-trace results are cached in trace_analysis_cache.pickle
 always_analyze = False
 
 print(f"Analyze new traces.json files in {apps_path}")
-traces = list(apps_path.glob('**/traces.json'))
+# Includes compressed traces.json.gz|zst files, which are decompressed while reading
+traces = [trace for name in traces_file_names() for trace in apps_path.glob(f"**/{name}")]
 sb = Sb()
 for trace in traces:
 	log_dir = trace.parent
 	trace_breakdown = log_dir / 'trace_breakdown.csv'
 	if always_analyze or not trace_breakdown.is_file():
 		print(trace)
-		sb.analyze_traces(trace)
+		sb.analyze_traces(trace, cache=True)
@@ -182,7 +182,12 @@ def read_sb_app_config(execution):
     return app_config, app_name
 
 def read_trace_breakdown(execution) -> pd.DataFrame:
-    """Returns a pandas dataframe with the parsed trace_breakdown.csv"""
+    """Returns a pandas dataframe with the parsed trace_breakdown.csv.
+    Prefers the columnar trace_breakdown.parquet or trace_breakdown.arrow if available."""
+    for file_name, reader in [('trace_breakdown.parquet', pd.read_parquet), ('trace_breakdown.arrow', pd.read_feather)]:
+        columnar_path = execution / file_name
+        if columnar_path.is_file():
+            return read_columnar_trace_breakdown(columnar_path, reader)
     trace_breakdown_path = execution / 'trace_breakdown.csv'
     converters = {
         # Parsing list of strings though json
@@ -213,6 +218,75 @@ def read_trace_breakdown(execution) -> pd.DataFrame:
     trace_breakdown = trace_breakdown.sort_values(by=['relative_time'])
     return trace_breakdown
 
+def read_columnar_trace_breakdown(path, reader=pd.read_parquet) -> pd.DataFrame:
+    """Returns a pandas dataframe of a columnar trace breakdown (i.e., Parquet or Arrow IPC).
+    Durations, timestamps, and lists (as arrays) are natively typed and need no parsing.
+    Produces the same columns as the CSV-based read_trace_breakdown."""
+    trace_breakdown = reader(path)
+    # Missing urls as NaN consistent with the CSV parser (see request_type)
+    trace_breakdown['url'] = trace_breakdown['url'].astype(object).where(trace_breakdown['url'].notna(), np.nan)
+    trace_breakdown['start_time_ts'] = trace_breakdown['start_time']
+    # start_time and end_time in epoc time (float) consistent with the CSV parser
+    for col in ['start_time', 'end_time']:
+        trace_breakdown[col] = trace_breakdown[col].values.astype('datetime64[us]').astype('int64') / 1e6
+    start = trace_breakdown['start_time'].min()
+    trace_breakdown['relative_time'] = trace_breakdown['start_time'] - start
+    trace_breakdown = trace_breakdown.sort_values(by=['relative_time'])
+    return trace_breakdown
+
+FILTER_OPERATORS = {
+    '==': lambda col, value: col == value,
+    '!=': lambda col, value: col != value,
+    '<': lambda col, value: col < value,
+    '<=': lambda col, value: col <= value,
+    '>': lambda col, value: col > value,
+    '>=': lambda col, value: col >= value,
+    'in': lambda col, value: col.isin(value),
+    'not in': lambda col, value: ~col.isin(value)
+}
+
+def read_critical_path(execution, columns=None, filters=None) -> pd.DataFrame or None:
+    """Returns a pandas dataframe with one row per critical path entry of every valid trace
+    from trace_critical_path.parquet|arrow|csv (see sb analyze_traces --critical_path)
+    or None if the execution has no critical path output.
+    Only loads the given `columns` and the rows matching the pyarrow-style `filters`,
+    for example [('category', '==', 'computation')]. Parquet pushes both down to the reader.
+    Timestamps are in epoch time (float) and durations are timedeltas."""
+    parquet_path = execution / 'trace_critical_path.parquet'
+    arrow_path = execution / 'trace_critical_path.arrow'
+    csv_path = execution / 'trace_critical_path.csv'
+    filter_columns = [col for col, _, _ in filters or []]
+    read_columns = None if columns is None else list(dict.fromkeys(columns + filter_columns))
+    if parquet_path.is_file():
+        critical_path = pd.read_parquet(parquet_path, columns=read_columns, filters=filters)
+    elif arrow_path.is_file():
+        critical_path = pd.read_feather(arrow_path, columns=read_columns)
+    elif csv_path.is_file():
+        critical_path = pd.read_csv(csv_path, usecols=read_columns)
+        if 'duration' in critical_path:
+            critical_path['duration'] = pd.to_timedelta(critical_path['duration'])
+    else:
+        return None
+    for col in ['start_time', 'end_time']:
+        if col in critical_path and not pd.api.types.is_numeric_dtype(critical_path[col]):
+            critical_path[col] = critical_path[col].values.astype('datetime64[us]').astype('int64') / 1e6
+    if filters and not parquet_path.is_file():
+        for col, op, value in filters:
+            critical_path = critical_path[FILTER_OPERATORS[op](critical_path[col], value)]
+    if columns is not None:
+        critical_path = critical_path[columns]
+    return critical_path.reset_index(drop=True)
+
+def critical_path_latency(execution, by=['origin', 'name'], filters=None) -> pd.DataFrame or None:
+    """Returns the total, mean, and count of critical path durations grouped by `by`
+    (e.g., per service or resource) without re-analyzing the traces.
+    Example: critical_path_latency(execution, by=['category', 'origin'])"""
+    critical_path = read_critical_path(execution, columns=by + ['duration'], filters=filters)
+    if critical_path is None:
+        return None
+    grouped = critical_path.groupby(by, dropna=False)['duration']
+    return grouped.agg(['sum', 'mean', 'count']).sort_values('sum', ascending=False)
+
 def read_invalid_traces(execution) -> pd.DataFrame:
     invalid_traces_path = execution / 'invalid_traces.csv'
     invalid_traces = pd.read_csv(invalid_traces_path)
@@ -1,10 +1,16 @@
 import logging
-import json
+import hashlib
+import inspect
+import pickle
 from pathlib import Path
 import csv
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-import networkx as nx
 from more_itertools import peekable
+from sb import json_backend
+from sb.trace_files import open_traces, is_compressed
 
 
 """
@@ -42,8 +48,84 @@ def timediff(start_time, end_time) -> timedelta:
     return t(end_time) - t(start_time)
 
 
+class Span:
+    """Compact record of a single segment or subsegment (i.e., node) in a TraceGraph.
+    Frequently accessed fields of the segment document are copied into slots.
+    A placeholder span without doc represents a missing (parent) segment."""
+    __slots__ = ('id', 'doc', 'start_time', 'end_time', 'name', 'origin',
+                 'parent', 'children', 'sorted_children', 'invocation_type')
+
+    def __init__(self, id) -> None:
+        self.id = id
+        self.doc = None
+        self.start_time = None
+        self.end_time = None
+        self.name = None
+        self.origin = None
+        # First predecessor (i.e., caller) or None for the root
+        self.parent = None
+        # Successors in insertion order
+        self.children = []
+        # Cached successors in critical path order (see sort_children)
+        self.sorted_children = None
+        # How this span has been invoked by its parent: client|sync|async
+        self.invocation_type = None
+
+    def set_doc(self, doc):
+        self.doc = doc
+        self.start_time = doc['start_time']
+        self.end_time = doc['end_time']
+        self.name = doc.get('name')
+        self.origin = doc.get('origin')
+
+
+class TraceGraph:
+    """Directed graph of the spans in a single trace.
+    Spans are kept in insertion order and indexed by their id.
+    Global trace metrics are accessible via G.graph[METRIC_NAME].
+    """
+    __slots__ = ('graph', 'spans', 'index')
+
+    def __init__(self, **attr) -> None:
+        self.graph = attr
+        self.spans = []
+        self.index = {}
+
+    def __getitem__(self, id) -> Span:
+        return self.index[id]
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def span(self, id) -> Span:
+        """Returns the span for a given id and adds an empty placeholder span if missing."""
+        span = self.index.get(id)
+        if span is None:
+            span = Span(id)
+            self.index[id] = span
+            self.spans.append(span)
+        return span
+
+    def add_span(self, doc) -> Span:
+        """Adds or updates the span for a given segment document."""
+        span = self.span(doc['id'])
+        span.set_doc(doc)
+        return span
+
+    def add_edge(self, parent_id, child_id):
+        """Adds a causal relationship from the parent to the child span."""
+        parent = self.span(parent_id)
+        child = self.span(child_id)
+        if child.parent is None:
+            child.parent = parent
+        elif child in parent.children:
+            return
+        parent.children.append(child)
+        parent.sorted_children = None
+
+
 def create_span_graph(trace):
-    """Returns a Networkx graph representing a single trace where
+    """Returns a TraceGraph representing a single trace where
     each node represents a span (or trace segment in XRay terminology) and
     each edge represents a casual relationship.
     """
@@ -57,7 +139,7 @@ def create_span_graph(trace):
         'duration': timedelta(seconds=trace['Duration']),
         'limit_exceeded': trace['LimitExceeded']
     }
-    G = nx.DiGraph(**graph_attr)
+    G = TraceGraph(**graph_attr)
     for segment in segments:
         # Optionally skip inferred segments because they are duplicates of their parents
         # if 'inferred' in segment and segment['inferred']:
@@ -65,11 +147,7 @@ def create_span_graph(trace):
         # Trace is not completed and hence some end_time is missing
         if segment.get('in_progress', False):
             raise Exception(f"Segment {segment['id']} in progress.")
-        node_attr = {
-            'doc': segment,
-            'duration': duration(segment)
-        }
-        G.add_node(segment['id'], **node_attr)
+        G.add_span(segment)
         if 'parent_id' in segment:
             # Special case of missing parent: creates an empty parent node if
             # the segment for the given parent_id is missing.
@@ -88,7 +166,7 @@ def parse_trace_segments(trace) -> list:
 
 
 def parse_segment_json(segment_wrapper):
-    return json.loads(segment_wrapper['Document'])
+    return json_backend.loads(segment_wrapper['Document'])
 
 
 def invocation_type(parent_doc, child_doc) -> str:
@@ -126,12 +204,7 @@ def add_subsegments_recursive(G, segment):
             # Trace is not completed and hence some end_time is missing
             if subsegment.get('in_progress', False):
                 raise Exception(f"Subsegment {subsegment['id']} in progress.")
-            attr = {
-                'doc': subsegment,
-                'duration': duration(subsegment),
-                'subsegment': True
-            }
-            G.add_node(subsegment['id'], **attr)
+            G.add_span(subsegment)
             G.add_edge(segment['id'], subsegment['id'])
             add_subsegments_recursive(G, subsegment)
     return G
@@ -150,54 +223,52 @@ def add_global_stats(G):
     # id of latest time (i.e., end of trace)
     end = None
     end_time = None
-    # List of trace ids with a downstream failure
-    errors = []
-    # List of trace ids causing a failure
-    faults = []
-    throttles = []
+    # Number of spans with a downstream failure
+    errors = 0
+    # Number of spans causing a failure
+    faults = 0
+    throttles = 0
     G.graph['url'] = None
     G.graph['services'] = []
-    # Iterate over all nodes to calculate global trace metrics
-    for id, attr in G.nodes(data=True):
-        if not attr:
-            raise Exception(f"Node {id} has empty attributes.")
-        doc = attr['doc']
+    # Iterate over all spans to calculate global trace metrics
+    for span in G.spans:
+        doc = span.doc
+        if doc is None:
+            raise Exception(f"Node {span.id} has empty attributes.")
         # Guess invocation type (i.e., how this trace has been invoked by its parent)
         # This cannot be done during graph construction due potentially missing parent.
         # It would naturally better fit into edges but it is mostly used in the invoked nodes.
-        parent_id = next(G.predecessors(id), None)
-        if parent_id is not None:
-            parent_node = G.nodes[parent_id]
-            if parent_node:
-                parent_doc = parent_node['doc']
-                attr['invocation_type'] = invocation_type(parent_doc, doc)
+        parent = span.parent
+        if parent is not None:
+            if parent.doc is not None:
+                span.invocation_type = invocation_type(parent.doc, doc)
             else:
                 msg = (
                     f"Incomplete trace {G.graph['trace_id']} because"
-                    f" the parent node {parent_id} of node {id} is empty."
+                    f" the parent node {parent.id} of node {span.id} is empty."
                 )
                 raise Exception(msg)
         else:  # trace root
-            attr['invocation_type'] = 'client'
+            span.invocation_type = 'client'
         # Identify trace start and end times
-        if start_time is None or doc['start_time'] < start_time:
-            start_time = doc['start_time']
-            start = id
-        if end_time is None or doc['end_time'] > end_time:
-            end_time = doc['end_time']
-            end = id
+        if start_time is None or span.start_time < start_time:
+            start_time = span.start_time
+            start = span.id
+        if end_time is None or span.end_time > end_time:
+            end_time = span.end_time
+            end = span.id
         # Identify relevant characteristics
-        if 'origin' in doc:
-            G.graph['services'].append(doc['origin'])
-            if doc['origin'] == 'AWS::ApiGateway::Stage':
+        if span.origin is not None:
+            G.graph['services'].append(span.origin)
+            if span.origin == 'AWS::ApiGateway::Stage':
                 G.graph['url'] = doc['http']['request']['url']
         # Keep track of special cases
-        if 'error' in doc and doc['error']:
-            errors.append(id)
-        if 'fault' in doc and doc['fault']:
-            faults.append(id)
-        if 'throttle' in doc and doc['throttle']:
-            throttles.append(id)
+        if doc.get('error'):
+            errors += 1
+        if doc.get('fault'):
+            faults += 1
+        if doc.get('throttle'):
+            throttles += 1
 
     # Validate if root node exists
     if 'start' not in G.graph:
@@ -230,9 +301,9 @@ def add_global_stats(G):
     # Assign globals
     G.graph['end'] = end
     G.graph['end_time'] = end_time
-    G.graph['errors'] = len(errors)
-    G.graph['faults'] = len(faults)
-    G.graph['throttles'] = len(throttles)
+    G.graph['errors'] = errors
+    G.graph['faults'] = faults
+    G.graph['throttles'] = throttles
 
     # Critical path
     G.graph['call_stack'] = call_stack(G, end)
@@ -243,22 +314,30 @@ def add_global_stats(G):
 def call_stack(G, end):
     """Returns an asynchronous call stack without the root"""
     stack = []
-    node = end
-    while node:
-        if node in stack:
-            loop_start_index = stack.index(node)
+    visited = set()
+    span = G[end]
+    while span is not None:
+        if span.id in visited:
+            loop_start_index = stack.index(span.id)
             loop = stack[loop_start_index:]
             logging.debug(f"Infinite loop: {loop}")
-            raise Exception(f"Detected infinite loop starting from node {node}")
-        stack.append(node)
-        node = next(G.predecessors(node), None)
+            raise Exception(f"Detected infinite loop starting from node {span.id}")
+        stack.append(span.id)
+        visited.add(span.id)
+        span = span.parent
     # Could indicate missing connection
-    # assert node == G.graph['start']
+    # assert stack[-1] == G.graph['start']
     return stack
 
 
 def longest_path(G, node):
-    """Returns the critical path (i.e., the longest path). Initialize with the id of the start node.
+    """Returns the ids of the critical path (i.e., the longest path).
+    Initialize with the id of the start node. See longest_path_spans."""
+    return [span.id for span in longest_path_spans(G, G[node])]
+
+
+def longest_path_spans(G, span):
+    """Returns the critical path (i.e., the longest path). Initialize with the start span.
     Implementation based on the paper qiu:20:
     * Url: https://www.usenix.org/conference/osdi20/presentation/qiu
     * Title: "FIRM: An Intelligent Fine-grained Resource Management Framework
@@ -270,103 +349,108 @@ def longest_path(G, node):
     https://gitlab.engr.illinois.edu/DEPEND/firm/-/blob/master/metrics/analysis/cpa-training-features.py#L111
     Their actual implementation uses a while loop instead of recursion and
     assumes ordered child_nodes.
+    Similarly, this implementation replaces the recursion with an explicit stack of
+    visits (see critical_path_visit) to support arbitrarily deep traces.
     """
     path = []
-    path.append(node)
-    if G.out_degree(node) == 0:
-        return path
+    visits = [critical_path_visit(G, span, path)]
+    while visits:
+        child = next(visits[-1], None)
+        if child is None:
+            visits.pop()
+        else:
+            visits.append(critical_path_visit(G, child, path))
+    return path
+
+
+def critical_path_visit(G, span, path):
+    """Appends the span to the critical `path` and yields the children to follow in order.
+    Corresponds to a recursive call of the FIRM algorithm where every yielded child is
+    fully visited before the visit of its parent resumes. Hence, path[-1] is the last span
+    of the path of the previously followed child."""
+    path.append(span)
+    if not span.children:
+        return
     # Remove node from call stack if present
-    if len(G.graph['call_stack']) > 0 and G.graph['call_stack'][-1] == node:
-        G.graph['call_stack'].pop()
-    sorted_children = get_sorted_children(G, node)
+    stack = G.graph['call_stack']
+    if len(stack) > 0 and stack[-1] == span.id:
+        stack.pop()
+    sorted_children = sort_children(span)
     last_returning_child = sorted_children[-1]
     for child in sorted_children:
-        if happens_before(G, child, last_returning_child):
-            last_doc = G.nodes[path[-1]]['doc']
-            parent_doc = G.nodes[node]['doc']
+        if happens_before(child, last_returning_child):
             # Only recurse into synchronous calls if there is not already
             # a longer asynchronous call present
-            if last_doc['end_time'] <= parent_doc['end_time']:
-                path.extend(longest_path(G, child))
+            if path[-1].end_time <= span.end_time:
+                yield child
     # Conditionally recurse into last_returning_child
-    parent_doc = G.nodes[node]['doc']
-    child_doc = G.nodes[last_returning_child]['doc']
-    if is_async_call(parent_doc, child_doc):
+    if is_async_call(span.doc, last_returning_child.doc):
         # Check against call stack for asynchronous calls by only following calls that are
         # connected to the end node with the latest timestamp
-        if len(G.graph['call_stack']) > 0 and G.graph['call_stack'][-1] == last_returning_child:
-            path.extend(longest_path(G, last_returning_child))
+        if len(stack) > 0 and stack[-1] == last_returning_child.id:
+            yield last_returning_child
     else:
         # Only recurse into synchronous calls if there is not already
         # a longer asynchronous call present
-        last_doc = G.nodes[path[-1]]['doc']
-        if last_doc['end_time'] <= parent_doc['end_time']:
-            path.extend(longest_path(G, last_returning_child))
-
-    return path
+        if path[-1].end_time <= span.end_time:
+            yield last_returning_child
 
 
 def get_sorted_children(G, node):
     """Returns a list of child ids sorted in ascending order
+    primarily by end_time and secondarily by start_time (see sort_children)."""
+    return [child.id for child in sort_children(G[node])]
+
+
+def sort_children(span):
+    """Returns a list of child spans sorted in ascending order
     primarily by end_time and secondarily by start_time.
     The secondary sort key is necessary to resolve special cases where
     two consecutive children have the same end_time (i.e., duration = 0ms)
     but one happens earlier indicated by an earlier start_time.
     Example timeline: start1<end1=start2=end2
+    The sorted children are cached in the span until another child is added.
     """
-    succ_ids = G.successors(node)
-    sorted_ids = sorted(succ_ids, key=lambda id: (G.nodes[id]['doc']['end_time'], G.nodes[id]['doc']['start_time']))  # noqa: E501
-    return sorted_ids
+    if span.sorted_children is None:
+        span.sorted_children = sorted(span.children,
+                                      key=lambda child: (child.end_time, child.start_time))
+    return span.sorted_children
+
 
+def happens_before(first, second):
+    """Returns true if the first span happens before the second span in sequential order."""
+    return first.end_time <= second.start_time
 
-def happens_before(G, first, second):
-    """Returns true if first happens before second in sequential order."""
-    first_doc = G.nodes[first]['doc']
-    second_doc = G.nodes[second]['doc']
-    return first_doc['end_time'] <= second_doc['start_time']
+
+def parent_span(span) -> Span:
+    """Returns the parent of a span or raises an exception for the root span."""
+    if span.parent is None:
+        raise Exception(f"Node {span.id} has no parent.")
+    return span.parent
 
 
 def calculate_breakdown(G):
     # Initialize cold start counter along critical path, updated along the way
     G.graph['num_cold_starts'] = 0
-    longest_path = G.graph['longest_path']
+    longest_path = [G[id] for id in G.graph['longest_path']]
     peek_iter = peekable(longest_path)
     critical_path = []
-    for id in peek_iter:
-        node = G.nodes[id]
-        doc = G.nodes[id]['doc']
-        next_id = peek_iter.peek(None)
-        if next_id is not None:
-            next_node = G.nodes[next_id]
-            critical_path.extend(pair_path(G, peek_iter, node, next_node))
+    for span in peek_iter:
+        next_span = peek_iter.peek(None)
+        if next_span is not None:
+            critical_path.extend(pair_path(G, peek_iter, span, next_span))
         else:
             # doc span itself
             critical_path.append({
-                'start_time': doc['start_time'],
-                'end_time': doc['end_time'],
-                'duration': timediff(doc['start_time'], doc['end_time']),
-                'resource': doc['id'],
+                'start_time': span.start_time,
+                'end_time': span.end_time,
+                'duration': timediff(span.start_time, span.end_time),
+                'resource': span.id,
                 'type': 'span',
-                'category': category_for_doc(G, doc)
+                'category': category_for_span(span)
             })
             # potential sync transition back to parent
-            critical_path.extend(add_sync_return(G, doc))
-
-            # OLD IMPL:
-            # parent_doc_id = next(G.predecessors(id), None)
-            # while parent_id and not is_async_call(parent_doc, current_doc)
-            # if parent_doc_id is not None:
-            #     parent_doc = G.nodes[parent_doc_id]['doc']
-            #     # TODO: need to do this recursively up
-            #     if not is_async_call(parent_doc, doc):
-            #         critical_path.append({
-            #             'start_time': doc['end_time'],
-            #             'end_time': parent_doc['end_time'],
-            #             'duration': timediff(doc['end_time'], parent_doc['end_time']),
-            #             'source': parent_doc['id'],
-            #     #        if exists ?! or from parent
-            #             'category': 'sync-back'  # parent_doc['origin']
-            #         })
+            critical_path.extend(add_sync_return(span))
 
     # Identify unique paths
     # NOTE: currently treats cold-start as a different path.
@@ -374,21 +458,18 @@ def calculate_breakdown(G):
     G.graph['longest_path_arns'] = []
     G.graph['longest_path_names'] = []
     G.graph['longest_path_details'] = []
-    for n in longest_path:
-        doc = G.nodes[n]['doc']
+    for span in longest_path:
         G.graph['longest_path_details'].append(
-            {'id': doc['id'],
-             'name': doc['name'],
-             'start_time': doc['start_time'],
-             'end_time': doc['end_time'],
-             'origin': doc.get('origin', None),
-             'invocation_type': G.nodes[n].get('invocation_type', None)}
+            {'id': span.id,
+             'name': span.name,
+             'start_time': span.start_time,
+             'end_time': span.end_time,
+             'origin': span.origin,
+             'invocation_type': span.invocation_type}
         )
-        G.graph['longest_path_names'].append(doc['name'])
-        if 'resource_arn' in doc:
-            G.graph['longest_path_arns'].append(doc['resource_arn'])
-        else:
-            pass
+        G.graph['longest_path_names'].append(span.name)
+        if 'resource_arn' in span.doc:
+            G.graph['longest_path_arns'].append(span.doc['resource_arn'])
     # List critical path:
     critical_path_details = []
     curr_duration = timedelta()
@@ -399,7 +480,7 @@ def calculate_breakdown(G):
             G.graph[e['category']] += e['duration']
         else:
             G.graph[e['category']] = e['duration']
-        critical_path_details.append(f"{e['duration']} {e['type']}:{e['category']} \t{e['resource']}:{G.nodes[e['resource']]['doc']['name'] if e['resource'] else ''} \t{e.get('source', '')}=>{e.get('target', '')}")  # noqa: E501
+        critical_path_details.append(f"{e['duration']} {e['type']}:{e['category']} \t{e['resource']}:{G[e['resource']].name if e['resource'] else ''} \t{e.get('source', '')}=>{e.get('target', '')}")  # noqa: E501
         # Validation
         curr_duration += e['duration']
         assert curr_duration == timediff(start, e['end_time']), f"Summed duration {curr_duration} does not match difference to trace start_time."  # noqa: E501
@@ -422,7 +503,7 @@ def calculate_breakdown(G):
     # TODO: update end node identification based on causal information
     # MAYBE: think about adding flagging traces where we detect and adjust for
     # potential clock synchronization issues.
-    if cp_last_target != G.graph['end'] and cp_last_target != G.graph['start'] and G.nodes[cp_last_target]['doc']['end_time'] != G.graph['end_time']:  # noqa: E501
+    if cp_last_target != G.graph['end'] and cp_last_target != G.graph['start'] and G[cp_last_target].end_time != G.graph['end_time']:  # noqa: E501
         msg = f"Segment with latest end time ({G.graph['end']}) does not match last target ({cp_last_target}) of critical path."  # noqa: E501
         raise Exception(msg)
     assert abs(G.graph['duration'] - curr_duration) < TIMESTAMP_MARGIN, f"Trace duration {G.graph['duration']} does not match latency breakdown {curr_duration} within margin {TIMESTAMP_MARGIN}."  # noqa: E501
@@ -435,304 +516,289 @@ def calculate_breakdown(G):
     return G
 
 
-def add_sync_return(G, doc):
+def add_sync_return(span):
+    """Returns the critical sub-path of synchronous transitions back to the parents of a span."""
     critical_path = []
-    parent_doc_id = next(G.predecessors(doc['id']), None)
-    if parent_doc_id is not None:
-        parent_doc = G.nodes[parent_doc_id]['doc']
-        child = G.nodes[doc['id']]
-        if child['invocation_type'] == 'sync':
-            critical_path.append({
-                'start_time': doc['end_time'],
-                'end_time': parent_doc['end_time'],
-                'duration': timediff(doc['end_time'], parent_doc['end_time']),
-                'resource': parent_doc['id'],
-                'source': doc['id'],
-                'target': parent_doc['id'],
-                'type': 'sync-receive',
-                'category': category_for_doc(G, parent_doc)
-            })
-            critical_path.extend(add_sync_return(G, parent_doc))
+    parent = span.parent
+    while parent is not None and span.invocation_type == 'sync':
+        critical_path.append({
+            'start_time': span.end_time,
+            'end_time': parent.end_time,
+            'duration': timediff(span.end_time, parent.end_time),
+            'resource': parent.id,
+            'source': span.id,
+            'target': parent.id,
+            'type': 'sync-receive',
+            'category': category_for_span(parent)
+        })
+        span = parent
+        parent = span.parent
     return critical_path
 
 
-def pair_path(G, peek_iter, node, next_node):
-    """Returns the critical sub-path for a pair of two consecutive nodes (i.e., doc, next_doc)"""
-    doc = node['doc']
-    next_doc = next_node['doc']
+def pair_path(G, peek_iter, span, next_span):
+    """Returns the critical sub-path for a pair of two consecutive spans (i.e., span, next_span)"""
     critical_path = []
     # Handle special synchronous call into lambda function with coldstart first.
     # If is_async_call would not handle transitions from AWS::Lambda into AWS::Lambda::Function,
     # it could be categorized as async invocation by mistake due to clock synchronization issues.
-    if is_cold_start_lambda_function(G, next_doc):
+    if is_cold_start_lambda_function(next_span):
         G.graph['num_cold_starts'] += 1
         # This is a special case because the Initialization segment
         # caused by 'AWS::Lambda::Function' is before its parent in the timeline.
-        init_doc_id = init_lambda_segment(G, next_doc)
-        init_doc = G.nodes[init_doc_id]['doc']
+        init_span = init_lambda_segment(next_span)
         # implicit container init
         critical_path.append({
-            'start_time': doc['start_time'],
-            'end_time': init_doc['start_time'],
-            'duration': timediff(doc['start_time'], init_doc['start_time']),
-            'resource': doc['id'],
+            'start_time': span.start_time,
+            'end_time': init_span.start_time,
+            'duration': timediff(span.start_time, init_span.start_time),
+            'resource': span.id,
             'type': 'span-parent',
             'category': 'container_initialization'
         })
         # runtime init span
         critical_path.append({
-            'start_time': init_doc['start_time'],
-            'end_time': init_doc['end_time'],
-            'duration': timediff(init_doc['start_time'], init_doc['end_time']),
-            'resource': init_doc['id'],
+            'start_time': init_span.start_time,
+            'end_time': init_span.end_time,
+            'duration': timediff(init_span.start_time, init_span.end_time),
+            'resource': init_span.id,
             'type': 'span',
             'category': 'runtime_initialization'
         })
         # transition from runtime init to lambda function span
         critical_path.append({
-            'start_time': init_doc['end_time'],
-            'end_time': next_doc['start_time'],
-            'duration': timediff(init_doc['end_time'], next_doc['start_time']),
-            'resource': doc['id'],
-            'source': init_doc['id'],
-            'target': next_doc['id'],
+            'start_time': init_span.end_time,
+            'end_time': next_span.start_time,
+            'duration': timediff(init_span.end_time, next_span.start_time),
+            'resource': span.id,
+            'source': init_span.id,
+            'target': next_span.id,
             'type': 'span-parent',
-            'category': category_for_doc(G, doc)
+            'category': category_for_span(span)
         })
         # skip two next spans being handled here as special case
         _ = next(peek_iter)  # function_id
         _ = next(peek_iter, None)  # init_id
-        post_init_id = peek_iter.peek(None)
+        post_init = peek_iter.peek(None)
         # Handle lambda function and the span following initialization
-        if post_init_id is not None:
-            post_init = G.nodes[post_init_id]
-            critical_path.extend(pair_path(G, peek_iter, next_node, post_init))
+        if post_init is not None:
+            critical_path.extend(pair_path(G, peek_iter, next_span, post_init))
         else:
             # TODO: generalize and extract this code into a method (almost same as below)
             # span itself
             critical_path.append({
-                'start_time': next_doc['start_time'],
-                'end_time': next_doc['end_time'],
-                'duration': timediff(next_doc['start_time'], next_doc['end_time']),
-                'resource': next_doc['id'],
+                'start_time': next_span.start_time,
+                'end_time': next_span.end_time,
+                'duration': timediff(next_span.start_time, next_span.end_time),
+                'resource': next_span.id,
                 'type': 'span',
-                'category': category_for_doc(G, next_doc)
+                'category': category_for_span(next_span)
             })
             # b) time-based (alternative): current span end time <= end time of trace
-            current_doc = next_doc
-            # Follow predecessor of current_doc (i.e., parent)
-            parent_id = next(G.predecessors(current_doc['id']))
-            parent_doc = G.nodes[parent_id]['doc']
+            current = next_span
+            # Follow predecessor of current span (i.e., parent)
+            parent = parent_span(current)
             # Ensure monotonically increasing time
-            while parent_doc['end_time'] >= current_doc['end_time']:
+            while parent.end_time >= current.end_time:
                 critical_path.append({
-                    'start_time': current_doc['end_time'],
-                    'end_time': parent_doc['end_time'],
-                    'duration': timediff(current_doc['end_time'], parent_doc['end_time']),
-                    'resource': parent_doc['id'],
-                    'source': current_doc['id'],
-                    'target': parent_doc['id'],
+                    'start_time': current.end_time,
+                    'end_time': parent.end_time,
+                    'duration': timediff(current.end_time, parent.end_time),
+                    'resource': parent.id,
+                    'source': current.id,
+                    'target': parent.id,
                     'type': 'sync-receive',
-                    'category': category_for_doc(G, parent_doc)
+                    'category': category_for_span(parent)
                 })
-                current_doc = parent_doc
-                # Follow predecessor of current_doc (i.e., parent)
-                parent_id = next(G.predecessors(current_doc['id']), None)
-                if parent_id is None:  # Returned till root
+                current = parent
+                # Follow predecessor of current span (i.e., parent)
+                parent = current.parent
+                if parent is None:  # Returned till root
                     break
-                parent_doc = G.nodes[parent_id]['doc']
     # Handle asynchronous invocations
     # NOTE: clock synchronization issues could make an invocation asynchronous
-    elif next_node['invocation_type'] == 'async':
+    elif next_span.invocation_type == 'async':
         # Adjust start if there is a different prior node in the longest path with a later end time
-        latest_start = doc['start_time']
+        latest_start = span.start_time
         # Count non-overlapping part in parent and overlapping part in child
-        early_end = min(doc['end_time'], next_doc['start_time'])
+        early_end = min(span.end_time, next_span.start_time)
         # doc span itself till potential adjusted end
         critical_path.append({
             'start_time': latest_start,
             'end_time': early_end,
             'duration': timediff(latest_start, early_end),
-            'resource': doc['id'],
+            'resource': span.id,
             'type': 'span',
-            'category': category_for_doc(G, doc)
+            'category': category_for_span(span)
         })
 
         # Invalidate trace if detecting extreme time shifts,
         # for example due to clock synchronization issues.
         # This check ensures that time monotonically increases along the critical path
         # within a given tolerance threshold, hence avoiding negative timediff.
-        if next_doc['start_time'] - doc['start_time'] + TIMESTAMP_THRESHOLD.total_seconds() < 0:
-            raise Exception(f"Negative time difference between current ({doc['id']}) and next ({next_doc['id']}) segment.")  # noqa: E501
+        if next_span.start_time - span.start_time + TIMESTAMP_THRESHOLD.total_seconds() < 0:
+            raise Exception(f"Negative time difference between current ({span.id}) and next ({next_span.id}) segment.")  # noqa: E501
 
         # async doc transition to next_doc span
         critical_path.append({
             'start_time': early_end,
-            'end_time': next_doc['start_time'],
-            'duration': timediff(early_end, next_doc['start_time']),
+            'end_time': next_span.start_time,
+            'duration': timediff(early_end, next_span.start_time),
             'resource': None,
-            'source': doc['id'],
-            'target': next_doc['id'],
+            'source': span.id,
+            'target': next_span.id,
             'type': 'async-send',
             'category': 'trigger'
         })
     else:  # assuming regular synchronous call (impossible to determine 100%)
-        # Drill in where current doc is parent and next_doc a synchronous invocation
-        if is_parent(G, doc['id'], next_doc['id']):
+        # Drill in where current span is parent and next_span a synchronous invocation
+        if is_parent(span, next_span):
             # sync doc transition into next_doc span
             critical_path.append({
-                'start_time': doc['start_time'],
-                'end_time': next_doc['start_time'],
-                'duration': timediff(doc['start_time'], next_doc['start_time']),
-                'resource': doc['id'],
-                'source': doc['id'],
-                'target': next_doc['id'],
+                'start_time': span.start_time,
+                'end_time': next_span.start_time,
+                'duration': timediff(span.start_time, next_span.start_time),
+                'resource': span.id,
+                'source': span.id,
+                'target': next_span.id,
                 'type': 'sync-send',
-                'category': category_for_doc(G, doc)
+                'category': category_for_span(span)
             })
         else:
             # span itself
             critical_path.append({
-                'start_time': doc['start_time'],
-                'end_time': doc['end_time'],
-                'duration': timediff(doc['start_time'], doc['end_time']),
-                'resource': doc['id'],
+                'start_time': span.start_time,
+                'end_time': span.end_time,
+                'duration': timediff(span.start_time, span.end_time),
+                'resource': span.id,
                 'type': 'span',
-                'category': category_for_doc(G, doc)
+                'category': category_for_span(span)
             })
             # Returning synchronous call
-            # critical_path.extend(add_sync_return(G, doc))
+            # critical_path.extend(add_sync_return(span))
             # Handle returning calls until:
-            # a) logical: current span has the same parent as the next_doc
-            # parent_id = next(G.predecessors(doc['id']))
-            # next_parent_id = next(G.predecessors(next_doc['id']))
-            # while parent_id != next_parent_id:
-            #     # Follow predecessor of current_doc (i.e., parent)
-            #     current_doc = G.nodes[parent_id]['doc']
-            #     parent_id = next(G.predecessors(parent_id))
-            #     parent_doc = G.nodes[parent_id]['doc']
+            # a) logical: current span has the same parent as the next_span
+            # parent = span.parent
+            # while parent != next_span.parent:
+            #     # Follow predecessor of current span (i.e., parent)
+            #     current = parent
+            #     parent = current.parent
             #     # Synchronous returning
             #     critical_path.append({
-            #         'start_time': current_doc['end_time'],
-            #         'end_time': parent_doc['end_time'],
-            #         'duration': timediff(current_doc['end_time'], parent_doc['end_time']),
-            #         'source': parent_doc['id'],
+            #         'start_time': current.end_time,
+            #         'end_time': parent.end_time,
+            #         'duration': timediff(current.end_time, parent.end_time),
+            #         'source': parent.id,
             #         'category': 'return-span-broken'
             #     })
 
             # TODO: check whether we can re-use sync-return here?!
-            # b) time-based (alternative): current span end time <= next_doc['start_time']
-            current_doc = doc
-            # Follow predecessor of current_doc (i.e., parent)
-            parent_id = next(G.predecessors(current_doc['id']))
-            parent_doc = G.nodes[parent_id]['doc']
-            while parent_doc['end_time'] <= next_doc['start_time']:
+            # b) time-based (alternative): current span end time <= next_span.start_time
+            current = span
+            # Follow predecessor of current span (i.e., parent)
+            parent = parent_span(current)
+            while parent.end_time <= next_span.start_time:
                 critical_path.append({
-                    'start_time': current_doc['end_time'],
-                    'end_time': parent_doc['end_time'],
-                    'duration': timediff(current_doc['end_time'], parent_doc['end_time']),
-                    'resource': parent_doc['id'],
-                    'source': current_doc['id'],
-                    'target': parent_doc['id'],
+                    'start_time': current.end_time,
+                    'end_time': parent.end_time,
+                    'duration': timediff(current.end_time, parent.end_time),
+                    'resource': parent.id,
+                    'source': current.id,
+                    'target': parent.id,
                     'type': 'sync-receive',
-                    'category': category_for_doc(G, parent_doc)
+                    'category': category_for_span(parent)
                 })
-                current_doc = parent_doc
-                # Follow predecessor of current_doc (i.e., parent)
-                parent_id = next(G.predecessors(current_doc['id']))
-                parent_doc = G.nodes[parent_id]['doc']
-
-            # sync doc transition over and across to next_doc span via common parent
-            parent_id = next(G.predecessors(next_doc['id']))
-            parent_doc = G.nodes[parent_id]['doc']
+                current = parent
+                # Follow predecessor of current span (i.e., parent)
+                parent = parent_span(current)
+
+            # sync doc transition over and across to next_span via common parent
+            next_parent = parent_span(next_span)
             critical_path.append({
-                'start_time': current_doc['end_time'],
-                'end_time': next_doc['start_time'],
-                'duration': timediff(current_doc['end_time'], next_doc['start_time']),
-                'resource': parent_id,
-                'source': current_doc['id'],
-                'target': next_doc['id'],
+                'start_time': current.end_time,
+                'end_time': next_span.start_time,
+                'duration': timediff(current.end_time, next_span.start_time),
+                'resource': next_parent.id,
+                'source': current.id,
+                'target': next_span.id,
                 'type': 'span-parent',
-                'category': category_for_doc(G, parent_doc)
+                'category': category_for_span(next_parent)
             })
 
     return critical_path
 
 
-def is_parent(G, candidate_parent_id, node_id):
-    """Returns true if the candidate_parent_id is a predecessor
-    node of the given node_id and false otherwise."""
-    predecessors = G.predecessors(node_id)
-    parent = next(predecessors, None)
-    if parent is None:
-        return False
-    else:
-        return parent == candidate_parent_id
+def is_parent(candidate_parent, span):
+    """Returns true if the candidate_parent is the predecessor
+    of the given span and false otherwise."""
+    return span.parent is not None and span.parent is candidate_parent
 
 
-def is_cold_start_lambda_function(G, doc):
-    return 'origin' in doc and \
-        doc['origin'] == 'AWS::Lambda::Function' and \
-        init_lambda_segment(G, doc) is not None
+def is_cold_start_lambda_function(span):
+    return span.origin == 'AWS::Lambda::Function' and \
+        init_lambda_segment(span) is not None
 
 
 # MAYBE: Could alternatively implement with lookahead of 3 elements
-def init_lambda_segment(G, lambda_function_doc):
-    """Returns the Initialization subsegment id of a lambda function or None if warm start."""
-    lambda_subsegments = G.successors(lambda_function_doc['id'])
-    init_subsegments = (s for s in lambda_subsegments if G.nodes[s]['doc']['name'] == 'Initialization')  # noqa: E501
+def init_lambda_segment(lambda_function_span):
+    """Returns the Initialization subsegment span of a lambda function or None if warm start."""
+    init_subsegments = (s for s in lambda_function_span.children if s.name == 'Initialization')
     return next(init_subsegments, None)
 
 
-def category_for_doc(G, doc) -> str:
-    if 'origin' in doc:
-        return category_for_origin(doc['origin'])
+# Categories of subsegments of AWS::Lambda::Function (and AWS::Lambda) by name
+LAMBDA_CATEGORY_MAPPINGS = {
+    'Overhead': 'overhead',
+    'Invocation': 'computation',
+    'Initialization': 'runtime_initialization',
+    # AWS::Lambda
+    'Dwell Time': 'queing'
+}
 
-    parent_id = next(G.predecessors(doc['id']))
-    parent_doc = G.nodes[parent_id]['doc']
+
+def category_for_span(span) -> str:
+    if span.origin is not None:
+        return category_for_origin(span.origin)
+
+    parent = parent_span(span)
 
     # special case for AWS::Lambda::Function
     # special Lambda cases
-    if 'origin' in parent_doc:
-        if parent_doc['origin'] == 'AWS::Lambda::Function':
-            lambda_mappings = {
-                'Overhead': 'overhead',
-                'Invocation': 'computation',
-                'Initialization': 'runtime_initialization',
-                # AWS::Lambda
-                'Dwell Time': 'queing'
-            }
-            return lambda_mappings.get(doc['name'], 'unclassified')
-        if parent_doc['origin'] == 'AWS::Lambda' and doc['name'] == 'Dwell Time':
+    if parent.origin is not None:
+        if parent.origin == 'AWS::Lambda::Function':
+            return LAMBDA_CATEGORY_MAPPINGS.get(span.name, 'unclassified')
+        if parent.origin == 'AWS::Lambda' and span.name == 'Dwell Time':
             return 'queing'
 
     # Use origin mapping of parent assuming that every valid trace segment has an origin field.
-    return category_for_doc(G, parent_doc)
+    return category_for_span(parent)
+
+
+# List of AWS resource types:
+# https://docs.aws.amazon.com/config/latest/developerguide/resource-config-reference.html
+ORIGIN_CATEGORY_MAPPINGS = {
+    # Triggers
+    'AWS::ApiGateway::Stage': 'orchestration',
+    'AWS::StepFunctions::StateMachine': 'orchestration',
+    'AWS::stepfunctions': 'orchestration',
+    'AWS::STEPFUNCTIONS': 'orchestration',
+    # AWS Lambda
+    'AWS::Lambda': 'orchestration',
+    'AWS::Lambda::Function': 'computation',
+    # External services
+    'AWS::S3::Bucket': 'external_service',
+    'AWS::S3': 'external_service',
+    'AWS::DynamoDB::Table': 'external_service',
+    'AWS::SQS::Queue': 'external_service',
+    'AWS::SNS': 'external_service',
+    'Database::SQL': 'external_service',
+    'AWS::Kinesis': 'external_service',
+    'AWS::rekognition': 'external_service'
+}
 
 
 def category_for_origin(origin) -> str:
-    # List of AWS resource types:
-    # https://docs.aws.amazon.com/config/latest/developerguide/resource-config-reference.html
-    category_mappings = {
-        # Triggers
-        'AWS::ApiGateway::Stage': 'orchestration',
-        'AWS::StepFunctions::StateMachine': 'orchestration',
-        'AWS::stepfunctions': 'orchestration',
-        'AWS::STEPFUNCTIONS': 'orchestration',
-        # AWS Lambda
-        'AWS::Lambda': 'orchestration',
-        'AWS::Lambda::Function': 'computation',
-        # External services
-        'AWS::S3::Bucket': 'external_service',
-        'AWS::S3': 'external_service',
-        'AWS::DynamoDB::Table': 'external_service',
-        'AWS::SQS::Queue': 'external_service',
-        'AWS::SNS': 'external_service',
-        'Database::SQL': 'external_service',
-        'AWS::Kinesis': 'external_service',
-        'AWS::rekognition': 'external_service'
-    }
-    return category_mappings.get(origin, 'unclassified')
+    return ORIGIN_CATEGORY_MAPPINGS.get(origin, 'unclassified')
 
 
 CSV_FIELDS = [
@@ -759,54 +825,495 @@ CSV_FIELDS = [
     'unclassified'
 ]
 
+# Pseudo field for the per-span critical path rows (see critical_path_rows)
+CRITICAL_PATH = 'critical_path'
+# One row per entry (i.e., edge) of the critical path of a trace
+CRITICAL_PATH_FIELDS = [
+    'trace_id',
+    'position',
+    'type',
+    'category',
+    'resource',
+    'name',
+    'origin',
+    'source',
+    'target',
+    'start_time',
+    'end_time',
+    'duration'
+]
+
+
+# Column types of the columnar (Parquet and Arrow IPC) trace breakdown output
+TIMESTAMP_FIELDS = ['start_time', 'end_time']
+DURATION_FIELDS = [
+    'duration',
+    'orchestration',
+    'trigger',
+    'container_initialization',
+    'runtime_initialization',
+    'computation',
+    'queing',
+    'overhead',
+    'external_service',
+    'unclassified'
+]
+COUNT_FIELDS = ['num_cold_starts', 'errors', 'throttles', 'faults', 'position']
+LIST_FIELDS = ['services', 'longest_path_names']
+
+BREAKDOWN_FILES = {
+    'csv': 'trace_breakdown.csv',
+    'parquet': 'trace_breakdown.parquet',
+    'arrow': 'trace_breakdown.arrow'
+}
+CRITICAL_PATH_FILES = {
+    'csv': 'trace_critical_path.csv',
+    'parquet': 'trace_critical_path.parquet',
+    'arrow': 'trace_critical_path.arrow'
+}
+# Number of rows buffered per columnar record batch (i.e., Parquet row group)
+BATCH_SIZE = 64 * 1024
+
+
+def import_pyarrow():
+    """Lazily imports the optional pyarrow dependency for columnar output."""
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise Exception("Columnar output requires pyarrow. Install via pip install --editable '.[parquet]'")  # noqa: E501
+
+
+def arrow_type(pa, field):
+    """Returns the Arrow type of a trace breakdown field.
+    Timestamps and durations use µs precision as the XRay timestamps."""
+    if field in TIMESTAMP_FIELDS:
+        return pa.timestamp('us')
+    if field in DURATION_FIELDS:
+        return pa.duration('us')
+    if field in COUNT_FIELDS:
+        return pa.int64()
+    if field in LIST_FIELDS:
+        return pa.list_(pa.string())
+    return pa.string()
+
+
+class CsvBreakdownWriter:
+    """Writes trace breakdown rows into a CSV file with a header row."""
+
+    def __init__(self, path, fields) -> None:
+        self.file = open(path, 'w')
+        self.writer = csv.writer(self.file, quoting=csv.QUOTE_MINIMAL)
+        self.writer.writerow(fields)
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArrowBreakdownWriter:
+    """Writes trace breakdown rows in record batches into a Parquet file or
+    an Arrow IPC file (i.e., Feather V2) with native timestamp, duration, and list types.
+    Epoch start and end times are converted into timestamps without time zone (i.e., UTC)."""
+
+    def __init__(self, path, fields, output_format='parquet', batch_size=BATCH_SIZE) -> None:
+        self.pa = import_pyarrow()
+        self.fields = fields
+        self.batch_size = batch_size
+        self.rows = []
+        self.schema = self.pa.schema([(field, arrow_type(self.pa, field)) for field in fields])
+        if output_format == 'parquet':
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = self.pa.ipc.new_file(path, self.schema)
+
+    def writerow(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = []
+        for i, field in enumerate(self.schema):
+            values = [row[i] for row in self.rows]
+            if field.name in TIMESTAMP_FIELDS:
+                values = [None if v is None else round(v * 1_000_000) for v in values]
+            elif field.type == self.pa.string():
+                values = [None if v is None else str(v) for v in values]
+            columns.append(self.pa.array(values, type=field.type))
+        self.writer.write_batch(self.pa.record_batch(columns, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def breakdown_writer(path, fields, output_format='csv'):
+    """Returns a writer for trace breakdown rows in the given output format."""
+    if output_format == 'csv':
+        return CsvBreakdownWriter(path, fields)
+    return ArrowBreakdownWriter(path, fields, output_format)
+
 
 def extract_trace_breakdown(trace, fields=CSV_FIELDS):
     G = create_span_graph(trace)
     G = calculate_breakdown(G)
     trace_breakdown = []
     for field in fields:
-        trace_breakdown.append(G.graph.get(field, None))
+        if field == CRITICAL_PATH:
+            trace_breakdown.append(critical_path_rows(G))
+        else:
+            trace_breakdown.append(G.graph.get(field, None))
     return trace_breakdown
 
 
+def critical_path_rows(G) -> list:
+    """Returns the critical path of a trace as rows of CRITICAL_PATH_FIELDS
+    with one row per span, span-parent, or sync-receive entry."""
+    rows = []
+    for position, e in enumerate(G.graph['critical_path']):
+        span = G[e['resource']] if e['resource'] else None
+        rows.append([
+            G.graph['trace_id'],
+            position,
+            e['type'],
+            e['category'],
+            e['resource'],
+            span.name if span else None,
+            span.origin if span else None,
+            e.get('source'),
+            e.get('target'),
+            e['start_time'],
+            e['end_time'],
+            e['duration']
+        ])
+    return rows
+
+
+def analyze_trace(trace, fields=CSV_FIELDS):
+    """Returns a tuple (valid, row) where row is the trace breakdown of a valid trace
+    or the trace id and error message of an invalid trace."""
+    try:
+        return True, extract_trace_breakdown(trace, fields)
+    except Exception as e:
+        trace_id = trace.get('Id')
+        message = str(e)
+        logging.debug(f"Skip invalid trace {trace_id}. {message}")
+        return False, [trace_id, message]
+
+
+# Target size of a byte range analyzed by a single worker process.
+# Multiple smaller chunks per worker balance the load across workers.
+CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def byte_ranges(file_size, num_chunks):
+    """Returns a list of (start, end) byte offsets that split a file of size
+    `file_size` into `num_chunks` ranges of roughly equal size.
+    The offsets do not consider line boundaries (see read_lines)."""
+    chunk_size = max(1, -(-file_size // num_chunks))
+    return [(start, min(start + chunk_size, file_size))
+            for start in range(0, file_size, chunk_size)]
+
+
+def read_lines(path, start, end):
+    """Yields all lines of a file that start within the byte range [start, end).
+    A line crossing the end offset is read entirely and hence belongs to the range
+    where it starts. This makes adjacent ranges cover every line exactly once."""
+    with open(path, 'rb') as f:
+        if start > 0:
+            # Skip the remainder of a line that started in the previous range.
+            # Reading from start - 1 keeps a line that starts exactly at start.
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line
+
+
+def analyze_line(line, fields=CSV_FIELDS, cache=None):
+    """Returns a tuple (key, result) with the analysis result (see analyze_trace)
+    of a single traces.json line. The result is looked up in the `cache` by the
+    content hash `key` of the line if a cache is given and the key is None otherwise."""
+    if cache is None:
+        return None, analyze_trace(json_backend.loads(line), fields)
+    key = trace_key(line)
+    result = cache.get(key)
+    if result is None:
+        result = analyze_trace(json_backend.loads(line), fields)
+    return key, result
+
+
+def trace_key(line) -> str:
+    """Returns the content hash of a single traces.json line (bytes)."""
+    return hashlib.sha1(line.strip()).hexdigest()
+
+
+# Cache of analysis results inherited by worker processes (see init_worker_cache)
+worker_cache = None
+
+
+def init_worker_cache(cache):
+    global worker_cache
+    worker_cache = cache
+
+
+def analyze_byte_range(path, start, end, fields=CSV_FIELDS, use_cache=False):
+    """Returns an ordered list of (key, result) tuples (see analyze_line)
+    for all traces in a byte range of a traces.json file."""
+    cache = worker_cache if use_cache else None
+    return [analyze_line(line, fields, cache) for line in read_lines(path, start, end)]
+
+
+def analyze_lines(lines, fields=CSV_FIELDS, use_cache=False):
+    """Returns an ordered list of (key, result) tuples (see analyze_line)
+    for a batch of traces.json lines."""
+    cache = worker_cache if use_cache else None
+    return [analyze_line(line, fields, cache) for line in lines]
+
+
+def line_batches(lines, batch_bytes=CHUNK_BYTES):
+    """Yields lists of consecutive lines with roughly `batch_bytes` in total."""
+    batch = []
+    size = 0
+    for line in lines:
+        batch.append(line)
+        size += len(line)
+        if size >= batch_bytes:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+def ordered_results(executor, tasks, max_pending):
+    """Submits `tasks` (tuples of a function and its arguments) lazily to an executor
+    and yields the elements of their result lists in the order of the tasks.
+    At most `max_pending` tasks are submitted but not yet consumed at any time to bound
+    the memory usage of results that complete ahead of the ordered iteration."""
+    pending = deque()
+    for fn, *args in tasks:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= max_pending:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+CACHE_FILE = 'trace_analysis_cache.pickle'
+# Version of the analysis results in the cache. Bump whenever a change affects the
+# result of analyzing a trace (e.g., the breakdown heuristics, TraceGraph, the critical
+# path, or the formatting of output values) but not for unrelated changes such as
+# logging, the CLI, or the output writers.
+# The unit tests pin ANALYZER_VERSION together with the analysis_source_hash and fail
+# if the source of ANALYSIS_SOURCES changes without updating both.
+ANALYZER_VERSION = 1
+# Functions and classes that determine the analysis result of a trace
+ANALYSIS_SOURCES = [
+    t, ft, timediff, Span, TraceGraph, create_span_graph, parse_trace_segments,
+    parse_segment_json, invocation_type, is_async_call, add_subsegments_recursive,
+    duration, add_global_stats, call_stack, longest_path, longest_path_spans,
+    critical_path_visit, get_sorted_children, sort_children, happens_before, parent_span,
+    calculate_breakdown, add_sync_return, pair_path, is_parent,
+    is_cold_start_lambda_function, init_lambda_segment, category_for_span,
+    category_for_origin, extract_trace_breakdown, critical_path_rows, analyze_trace
+]
+# Constants used by the ANALYSIS_SOURCES
+ANALYSIS_CONSTANTS = [
+    TIMESTAMP_MARGIN, TIMESTAMP_THRESHOLD, LAMBDA_CATEGORY_MAPPINGS, ORIGIN_CATEGORY_MAPPINGS,
+    CSV_FIELDS, CRITICAL_PATH_FIELDS
+]
+
+
+def analysis_source_hash() -> str:
+    """Returns a hash of the source code of the ANALYSIS_SOURCES and the values of the
+    ANALYSIS_CONSTANTS. A changed hash indicates that ANALYZER_VERSION might need a bump."""
+    sha = hashlib.sha256()
+    for obj in ANALYSIS_SOURCES:
+        sha.update(inspect.getsource(obj).encode())
+    sha.update(repr(ANALYSIS_CONSTANTS).encode())
+    return sha.hexdigest()
+
+
+def analyzer_version(fields=CSV_FIELDS) -> str:
+    """Returns the cache version of the ANALYZER_VERSION and the output fields.
+    Cached analysis results of a different analyzer version are invalid."""
+    return f"{ANALYZER_VERSION}:{','.join(fields)}"
+
+
+def load_cache(cache_file, version) -> dict:
+    """Returns the cached analysis results by trace key or an empty
+    cache if the cache file is missing, unreadable, or outdated."""
+    if not cache_file.is_file():
+        return {}
+    try:
+        with open(cache_file, 'rb') as f:
+            cache = pickle.load(f)
+    except Exception as e:
+        logging.warning(f"Ignore unreadable cache {cache_file.name}. {e}")
+        return {}
+    if cache.get('version') != version:
+        logging.info(f"Ignore outdated cache {cache_file.name} of a different analyzer version.")
+        return {}
+    return cache['results']
+
+
+def save_cache(cache_file, version, results):
+    with open(cache_file, 'wb') as f:
+        pickle.dump({'version': version, 'results': results}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
 class AwsTraceAnalyzer:
     """Parses traces.json files downloaded by the AwsTraceDownloader:
     1) Saves a trace summary into trace_breakdown.csv
     2) Saves a log of invalid trace into invalid_traces.csv
+    Multiple `workers` analyze the traces in parallel processes
+    while preserving the order of the traces in the output files.
+    The trace breakdown is written as CSV by default or optionally in a columnar
+    `output_format` (parquet|arrow) with native duration, timestamp, and list types.
+    With `critical_path` enabled, the critical path of every valid trace is additionally
+    saved into trace_critical_path.csv|parquet|arrow with one row per critical path entry.
+    With `cache` enabled, the analysis results of each trace are kept in
+    trace_analysis_cache.pickle keyed by the content hash of the trace.
+    Subsequent analyses only recompute new or changed traces unless the output fields
+    or the ANALYZER_VERSION have changed. The ANALYZER_VERSION must be bumped manually
+    whenever the analysis of a trace changes (see analysis_source_hash).
     """
 
-    def __init__(self, log_path) -> None:
+    def __init__(self, log_path, workers=1, cache=False, output_format='csv',
+                 critical_path=False) -> None:
         self.log_path = log_path
-
-    def analyze_traces(self):
+        self.workers = int(workers)
+        self.use_cache = bool(cache)
+        if output_format not in BREAKDOWN_FILES:
+            raise Exception(f"Unsupported output format {output_format}. Supported formats: {list(BREAKDOWN_FILES)}")  # noqa: E501
+        self.output_format = output_format
+        self.critical_path = bool(critical_path)
+
+    def analyze_traces(self, lines=None):
+        """Analyzes all traces in the traces.json file at log_path.
+        Compressed traces.json.gz or traces.json.zst files are decompressed while reading.
+        Optionally, an iterable of traces.json `lines` (bytes) can be analyzed while they
+        are being written (e.g., during the download) instead of reading log_path."""
         file = Path(self.log_path)
-        breakdown_file = file.parent / 'trace_breakdown.csv'
+        breakdown_file = file.parent / BREAKDOWN_FILES[self.output_format]
         invalid_file = file.parent / 'invalid_traces.csv'
+        cache_file = file.parent / CACHE_FILE
+        # The critical path rows are analyzed (and cached) as an additional pseudo field
+        fields = CSV_FIELDS + [CRITICAL_PATH] if self.critical_path else CSV_FIELDS
+
+        cache = None
+        if self.use_cache:
+            version = analyzer_version(fields)
+            cache = load_cache(cache_file, version)
+            # Only keep the results of the traces in the current file
+            new_cache = {}
 
         num_valid_traces = 0
         num_invalid_traces = 0
-        with open(file) as traces_json:
-            with open(breakdown_file, 'w') as traces_csv, open(invalid_file, 'w') as invalid_csv:
-                trace_writer = csv.writer(traces_csv, quoting=csv.QUOTE_MINIMAL)
-                trace_headers = CSV_FIELDS
-                trace_writer.writerow(trace_headers)
-                invalid_writer = csv.writer(invalid_csv, quoting=csv.QUOTE_MINIMAL)
-                invalid_headers = ['trace_id', 'message']
-                invalid_writer.writerow(invalid_headers)
-                for line in traces_json:
-                    trace = json.loads(line)
-                    try:
-                        trace_breakdown = extract_trace_breakdown(trace, trace_headers)
-                        trace_writer.writerow(trace_breakdown)
-                        num_valid_traces += 1
-                    except Exception as e:
-                        trace_id = trace.get('Id')
-                        message = str(e)
-                        invalid_writer.writerow([trace_id, message])
-                        logging.debug(f"Skip invalid trace {trace_id}. {message}")
-                        num_invalid_traces += 1
-
+        num_cached_traces = 0
+        trace_headers = CSV_FIELDS
+        with ExitStack() as stack:
+            trace_writer = stack.enter_context(
+                breakdown_writer(breakdown_file, trace_headers, self.output_format))
+            invalid_csv = stack.enter_context(open(invalid_file, 'w'))
+            invalid_writer = csv.writer(invalid_csv, quoting=csv.QUOTE_MINIMAL)
+            invalid_headers = ['trace_id', 'message']
+            invalid_writer.writerow(invalid_headers)
+            if self.critical_path:
+                critical_path_file = file.parent / CRITICAL_PATH_FILES[self.output_format]
+                critical_path_writer = stack.enter_context(
+                    breakdown_writer(critical_path_file, CRITICAL_PATH_FIELDS, self.output_format))
+            results = self.analysis_results(file, fields, cache, lines)
+            for key, (valid, row) in results:
+                if cache is not None:
+                    if key in cache:
+                        num_cached_traces += 1
+                    new_cache[key] = (valid, row)
+                if valid:
+                    if self.critical_path:
+                        *row, critical_path = row
+                        for critical_path_row in critical_path:
+                            critical_path_writer.writerow(critical_path_row)
+                    trace_writer.writerow(row)
+                    num_valid_traces += 1
+                else:
+                    invalid_writer.writerow(row)
+                    num_invalid_traces += 1
+
+        if cache is not None:
+            save_cache(cache_file, version, new_cache)
+            logging.info(f"Reused {num_cached_traces} cached trace analyses from {cache_file.name}.")  # noqa: E501
         logging.info(f"Analyzed {num_valid_traces} valid traces. Written to {breakdown_file.name}.")
+        if self.critical_path:
+            logging.info(f"Written critical paths to {critical_path_file.name}.")
         if num_invalid_traces > 0:
             invalid_rate = round(num_invalid_traces / (num_valid_traces + num_invalid_traces) * 100, 2)  # noqa: E501
             logging.warning(f"Detected {num_invalid_traces} ({invalid_rate}%) invalid traces. Written to {invalid_file.name}.")  # noqa: E501
+
+    def analysis_results(self, file, fields, cache=None, lines=None):
+        """Yields the (key, result) tuples (see analyze_line) in the order of the traces in `file`
+        or in the order of the given `lines`."""
+        if lines is not None:
+            for line in lines:
+                yield analyze_line(line, fields, cache)
+        elif self.workers > 1 and is_compressed(file):
+            yield from self.parallel_stream_analysis_results(file, fields, cache)
+        elif self.workers > 1:
+            yield from self.parallel_analysis_results(file, fields, cache)
+        else:
+            with open_traces(file) as traces_json:
+                for line in traces_json:
+                    yield analyze_line(line, fields, cache)
+
+    def parallel_analysis_results(self, file, fields, cache=None):
+        """Splits the newline-delimited `file` into byte ranges and
+        analyzes them in a pool of worker processes.
+        Each worker process receives a copy of the cache upon initialization.
+        At most two byte ranges per worker are pending at any time to bound
+        the memory usage of results that wait for the ordered output."""
+        file_size = file.stat().st_size
+        num_chunks = max(self.workers, -(-file_size // CHUNK_BYTES))
+        ranges = byte_ranges(file_size, num_chunks)
+        logging.info(f"Analyzing {len(ranges)} chunks of {file.name} with {self.workers} workers.")
+        use_cache = cache is not None
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker_cache,
+                                 initargs=(cache,)) as executor:
+            tasks = ((analyze_byte_range, file, start, end, fields, use_cache)
+                     for start, end in ranges)
+            yield from ordered_results(executor, tasks, 2 * self.workers)
+
+    def parallel_stream_analysis_results(self, file, fields, cache=None):
+        """Decompresses the `file` sequentially and analyzes batches of lines
+        in a pool of worker processes because compressed files cannot be split
+        into byte ranges. At most two batches per worker are pending at any time
+        to bound the memory usage of decompressed lines."""
+        logging.info(f"Analyzing {file.name} in batches with {self.workers} workers.")
+        use_cache = cache is not None
+        with open_traces(file) as traces_json, \
+                ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker_cache,
+                                    initargs=(cache,)) as executor:
+            tasks = ((analyze_lines, batch, fields, use_cache)
+                     for batch in line_batches(traces_json, CHUNK_BYTES))
+            yield from ordered_results(executor, tasks, 2 * self.workers)
@@ -1,7 +1,40 @@
 import logging
 import json
+import math
+import queue
+import random
+import threading
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import boto3
 from botocore.config import Config
+from botocore.exceptions import ClientError
+from sb.trace_files import compress, compression_of, find_traces_file, recompress, traces_file_name
+
+# Maximum number of trace ids per BatchGetTraces request
+BATCH_SIZE = 5
+# Default maximum number of concurrent BatchGetTraces requests
+MAX_IN_FLIGHT = 8
+# Error codes of throttled AWS API requests
+THROTTLING_ERRORS = [
+    'ThrottlingException',
+    'Throttling',
+    'TooManyRequestsException',
+    'RequestLimitExceeded'
+]
+# Retries of throttled requests with exponential backoff (in seconds) and full jitter
+MAX_RETRIES = 8
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+# Minimum number of seconds between progress logs
+PROGRESS_INTERVAL = 10
+# Minimum duration of a time slice for concurrently retrieving trace ids
+MIN_SLICE_DURATION = timedelta(minutes=1)
+# Maximum number of downloaded chunks buffered for the concurrent trace analysis
+ANALYSIS_QUEUE_SIZE = 64
+# Records the downloaded chunks of trace ids for resuming interrupted downloads
+CHECKPOINT_FILE = 'traces_checkpoint.jsonl'
 
 
 class AwsTraceDownloader:
@@ -11,86 +44,407 @@ class AwsTraceDownloader:
     https://docs.aws.amazon.com/xray/latest/devguide/xray-api-gettingdata.html
     """
 
-    def __init__(self, spec) -> None:
+    def __init__(self, spec, max_in_flight=MAX_IN_FLIGHT, client=None, compression=None) -> None:
         self.spec = spec
-        # Configure AWS XRay client
-        region = self.spec['region']
-        my_config = Config(
-            region_name=region
-        )
-        self.client = boto3.client('xray', config=my_config)
-
-    def get_traces(self):
+        self.max_in_flight = int(max_in_flight)
+        # Optional compression (gz|zst) of newly downloaded traces files
+        self.compression = None if str(compression) == 'None' else compression
+        traces_file_name(self.compression)
+        self.limiter = AdaptiveLimiter(self.max_in_flight)
+        # Configure AWS XRay client unless provided (e.g., stubbed client for testing)
+        if client is None:
+            region = self.spec['region']
+            my_config = Config(
+                region_name=region,
+                max_pool_connections=max(10, self.max_in_flight)
+            )
+            client = boto3.client('xray', config=my_config)
+        self.client = client
+
+    def get_traces(self, analyzer=None):
         """Retrieves X-Ray traces from the last invocation:
         1. saves all trace ids in a trace_ids.txt
-        2. saves all actual trace data in traces.json
+        2. saves all actual trace data in traces.json (or traces.json.gz|zst if compressed)
         3. saves unprocessed trace ids in unprocessed_trace_ids.txt
+        The download checkpoint traces_checkpoint.jsonl records the downloaded chunks
+        of trace ids. Re-running get_traces resumes an interrupted download from
+        its checkpoint or retries the unprocessed trace ids of a completed download.
+        An optional AwsTraceAnalyzer for the traces.json analyzes the traces of a new
+        download concurrently while they arrive. Resumed or retried downloads are
+        analyzed after the download completes.
         """
         start, end = self.spec.event_log.get_invoke_timespan()
         log_path = self.spec.logs_directory()
         trace_ids_file = log_path.joinpath('trace_ids.txt')
-        trace_file = log_path.joinpath('traces.json')
-        if trace_file.exists():
-            logging.error(f"Traces already exist under {trace_file} for this \
+        trace_file = self.trace_file(log_path)
+        checkpoint_file = log_path.joinpath(CHECKPOINT_FILE)
+        unprocessed_ids_file = log_path.joinpath('unprocessed_trace_ids.txt')
+        if checkpoint_file.exists():
+            ids_file = log_path.joinpath(read_checkpoint_header(checkpoint_file)['trace_ids_file'])
+            logging.info(f"Resuming interrupted download of trace ids in {ids_file.name} from checkpoint.")  # noqa: E501
+            trace_ids = read_trace_ids(ids_file)
+        elif trace_file.exists():
+            if not unprocessed_ids_file.exists():
+                logging.error(f"Traces already exist under {trace_file} for this \
 invocation starting time. Aborting.")
-            return None
-
-        trace_ids = self.retrieve_trace_ids(start, end, trace_ids_file)
+                return None
+            ids_file = unprocessed_ids_file
+            trace_ids = read_trace_ids(ids_file)
+            logging.info(f"Retrying download of {len(trace_ids)} unprocessed trace ids.")
+        else:
+            ids_file = trace_ids_file
+            trace_ids = self.retrieve_trace_ids(start, end, trace_ids_file)
 
         # Remove potential duplicates because boto3 BatchGetTraces fails if
         # a chunk contains duplicate trace IDs, which can be common with 10000s of trace ids.
-        unique_trace_ids = list(set(trace_ids))
+        # Preserving the order keeps the chunks stable across resumed downloads.
+        unique_trace_ids = list(dict.fromkeys(trace_ids))
         num_duplicate_ids = len(trace_ids) - len(unique_trace_ids)
         logging.info(f"Removed {num_duplicate_ids} duplicate trace ids.")
 
-        unprocessed_ids = self.retrieve_traces(unique_trace_ids, trace_file)
+        if analyzer is not None and not trace_file.exists():
+            unprocessed_ids = self.retrieve_and_analyze_traces(
+                analyzer, unique_trace_ids, trace_file, checkpoint_file, ids_file.name)
+        else:
+            unprocessed_ids = self.retrieve_traces(unique_trace_ids, trace_file,
+                                                   checkpoint_file, ids_file.name)
+            if analyzer is not None:
+                analyzer.analyze_traces()
         # Check and log for potential unprocessed trace ids
         if unprocessed_ids:
-            logging.warning(f"Found {len(unprocessed_ids)} unprocessed trace ids.")
-            unprocessed_ids_file = log_path.joinpath('unprocessed_trace_ids.txt')
+            logging.warning(f"Found {len(unprocessed_ids)} unprocessed trace ids. Re-run get_traces to retry.")  # noqa: E501
             with open(unprocessed_ids_file, 'w') as f:
                 for id in unprocessed_ids:
                     f.write("%s\n" % id)
+        elif unprocessed_ids_file.exists():
+            unprocessed_ids_file.unlink()
+        # The download is complete
+        checkpoint_file.unlink()
+        # Checkpoint offsets no longer apply such that per-chunk compression can be merged
+        recompress(trace_file)
 
         # Inform user
         logging.info(f"Downloaded {len(trace_ids)} traces for invocations between \
 {start} and {end} into {log_path}.")
 
-    def retrieve_trace_ids(self, start, end, trace_ids_file):
+    def trace_file(self, log_path):
+        """Returns the path of an existing (compressed) traces file in log_path
+        or the path of a new traces file with the configured compression."""
+        trace_file = find_traces_file(log_path)
+        if trace_file.exists():
+            return trace_file
+        return log_path.joinpath(traces_file_name(self.compression))
+
+    def retrieve_trace_ids(self, start, end, trace_ids_file, num_slices=None):
         """Retrieve and save trace ids from X-Ray.
+        The timespan is split into `num_slices` consecutive time slices, which are
+        enumerated concurrently. Defaults to time slices of at least MIN_SLICE_DURATION
+        and at most max_in_flight time slices.
+        Trace ids are saved in chronological order of the time slices and
+        trace ids already retrieved in an earlier time slice are skipped
+        because the boundaries of adjacent time slices overlap.
         Returns a list of trace ids."""
-        # Configure trace summaries (ts) iterator using pagination
+        if num_slices is None:
+            num_slices = min(self.max_in_flight, math.ceil((end - start) / MIN_SLICE_DURATION))
+        slices = time_slices(start, end, max(1, num_slices))
+        # Configure trace summaries (ts) paginator
         paginator = self.client.get_paginator('get_trace_summaries')
-        ts_iter = paginator.paginate(StartTime=start, EndTime=end)
 
         # Save trace ids to file
         trace_ids = []
-        with open(trace_ids_file, 'w') as f:
-            for trace_summary in ts_iter:
-                batch_trace_ids = extract_trace_ids(trace_summary)
-                trace_ids.extend(batch_trace_ids)
-                for trace_id in batch_trace_ids:
+        seen_ids = set()
+        with open(trace_ids_file, 'w') as f, \
+                ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(slices))) as executor:
+            slice_trace_ids = executor.map(
+                lambda timespan: self.fetch_trace_ids(paginator, *timespan), slices)
+            for batch_trace_ids in slice_trace_ids:
+                # Keep duplicates within a time slice as in a single enumeration
+                new_trace_ids = [id for id in batch_trace_ids if id not in seen_ids]
+                seen_ids.update(new_trace_ids)
+                trace_ids.extend(new_trace_ids)
+                for trace_id in new_trace_ids:
                     f.write(f"{trace_id}\n")
+        if len(slices) > 1:
+            logging.info(f"Retrieved {len(trace_ids)} trace ids from {len(slices)} time slices.")
         return trace_ids
 
-    def retrieve_traces(self, unique_trace_ids, trace_file):
+    def fetch_trace_ids(self, paginator, start, end):
+        """Returns the list of trace ids between start and end by paging through all trace summaries."""  # noqa: E501
+        def get_trace_ids():
+            trace_ids = []
+            for trace_summary in paginator.paginate(StartTime=start, EndTime=end):
+                trace_ids.extend(extract_trace_ids(trace_summary))
+            return trace_ids
+        trace_ids = self.call_with_backoff(get_trace_ids)
+        if trace_ids is None:
+            raise Exception(f"Failed to retrieve throttled trace summaries between {start} and {end}.")  # noqa: E501
+        return trace_ids
+
+    def retrieve_and_analyze_traces(self, analyzer, unique_trace_ids, trace_file,
+                                    checkpoint_file=None, trace_ids_file_name='trace_ids.txt'):
+        """Retrieves traces (see retrieve_traces) and passes the written lines
+        through a bounded queue to the analyzer running in a separate thread.
+        Returns a list of unprocessed trace ids."""
+        line_queue = queue.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+        errors = []
+
+        def queued_lines():
+            for lines in iter(line_queue.get, None):
+                for line in lines:
+                    yield line.encode()
+
+        def analyze():
+            lines = queued_lines()
+            try:
+                analyzer.analyze_traces(lines)
+            except Exception as e:
+                errors.append(e)
+                # Keep consuming to avoid blocking the download
+                for _ in lines:
+                    pass
+
+        analysis = threading.Thread(target=analyze, name='trace-analysis')
+        analysis.start()
+        try:
+            unprocessed_ids = self.retrieve_traces(unique_trace_ids, trace_file, checkpoint_file,
+                                                   trace_ids_file_name, line_queue.put)
+        finally:
+            line_queue.put(None)
+            analysis.join()
+        if errors:
+            raise errors[0]
+        return unprocessed_ids
+
+    def retrieve_traces(self, unique_trace_ids, trace_file, checkpoint_file=None,
+                        trace_ids_file_name='trace_ids.txt', on_lines=None):
         """Retrieve and save full trace details in chunks from X-Ray.
+        Traces are written as they arrive and hence in no particular order.
         Returns a list of unprocessed trace ids.
         Output format: Every line contains a single JSON-formatted trace.
         Example output of a single trace (partial data):
         {"Id": "1-60be2454-2cb82d1221d24201751ea2e3", "Duration": 9.315, "LimitExceeded": false, "Segments": [{"Id": "050793ca38bd8ff2", "Document": "{\"id\":\"050793ca38bd8ff2\",..."}]}  # noqa: E501
+        With a `checkpoint_file`, traces are appended to the trace_file and every
+        downloaded chunk is recorded in the checkpoint together with the resulting size
+        of the trace_file. An existing checkpoint resumes the download by truncating
+        the trace_file to the last recorded size and skipping all recorded chunks.
+        The optional callback `on_lines` receives every list of written lines.
+        A trace_file with a .gz or .zst suffix is compressed chunk by chunk (see write_traces)
+        such that checkpoint offsets remain valid truncation points. get_traces recompresses
+        the complete file into a single stream (see trace_files.recompress).
         """
-        unprocessed_ids = []
-        with open(trace_file, 'w') as f:
-            for trace_ids_batch in chunks(unique_trace_ids, 5):
-                paginator = self.client.get_paginator('batch_get_traces')
-                trace_iterator = paginator.paginate(TraceIds=trace_ids_batch)
-                for trace_batch in trace_iterator:
-                    unprocessed_ids.extend(trace_batch['UnprocessedTraceIds'])
-                    for trace in trace_batch['Traces']:
-                        f.write(json.dumps(trace) + '\n')
+        compression = compression_of(trace_file)
+        if checkpoint_file is None:
+            unprocessed_ids = []
+            with open(trace_file, 'wb') as f:
+                for _, traces, chunk_unprocessed_ids in self.download_traces(unique_trace_ids):
+                    unprocessed_ids.extend(chunk_unprocessed_ids)
+                    lines = write_traces(f, traces, compression)
+                    if on_lines is not None:
+                        on_lines(lines)
+            return unprocessed_ids
+
+        if not checkpoint_file.exists():
+            offset = trace_file.stat().st_size if trace_file.exists() else 0
+            with open(checkpoint_file, 'w') as checkpoint:
+                header = {'trace_ids_file': trace_ids_file_name, 'offset': offset}
+                checkpoint.write(json.dumps(header) + '\n')
+        offset, completed, checkpoint_size = read_checkpoint(checkpoint_file)
+        if completed:
+            logging.info(f"Skipping {len(completed)} chunks downloaded before the checkpoint.")
+        unprocessed_ids = [id for ids in completed.values() for id in ids]
+        with open(trace_file, 'ab') as f, open(checkpoint_file, 'a') as checkpoint:
+            # Discard traces written after the last checkpoint (e.g., partially written lines)
+            f.truncate(offset)
+            checkpoint.truncate(checkpoint_size)
+            downloads = self.download_traces(unique_trace_ids, skip_chunks=completed)
+            for index, traces, chunk_unprocessed_ids in downloads:
+                unprocessed_ids.extend(chunk_unprocessed_ids)
+                lines = write_traces(f, traces, compression)
+                f.flush()
+                entry = {'chunk': index, 'offset': f.tell(), 'unprocessed': chunk_unprocessed_ids}
+                checkpoint.write(json.dumps(entry) + '\n')
+                checkpoint.flush()
+                if on_lines is not None:
+                    on_lines(lines)
         return unprocessed_ids
 
+    def download_traces(self, trace_ids, skip_chunks=()):
+        """Yields tuples (chunk_index, traces, unprocessed_ids) for chunks of trace ids
+        in completion order. Skips the chunks with an index in `skip_chunks`.
+        Up to max_in_flight chunks are downloaded concurrently in a thread pool and the
+        adaptive limiter reduces the number of concurrent requests upon throttling."""
+        paginator = self.client.get_paginator('batch_get_traces')
+        trace_id_chunks = [(index, chunk)
+                           for index, chunk in enumerate(chunks(trace_ids, BATCH_SIZE))
+                           if index not in skip_chunks]
+        progress = DownloadProgress(sum(len(chunk) for _, chunk in trace_id_chunks))
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            for index, trace_ids_batch in trace_id_chunks:
+                # Bound the number of submitted chunks to limit buffered traces
+                if len(pending) >= 2 * self.max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from progress.results(done)
+                pending.add(executor.submit(self.fetch_chunk, paginator, index, trace_ids_batch))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from progress.results(done)
+        progress.log_summary()
+
+    def fetch_chunk(self, paginator, index, trace_ids):
+        """Returns a tuple (chunk_index, traces, unprocessed_ids) (see fetch_traces)."""
+        return (index, *self.fetch_traces(paginator, trace_ids))
+
+    def fetch_traces(self, paginator, trace_ids):
+        """Returns a tuple (traces, unprocessed_ids) for a single chunk of trace ids.
+        Returns all trace ids as unprocessed if the request remains throttled."""
+        def get_traces():
+            traces = []
+            unprocessed_ids = []
+            for trace_batch in paginator.paginate(TraceIds=trace_ids):
+                unprocessed_ids.extend(trace_batch['UnprocessedTraceIds'])
+                traces.extend(trace_batch['Traces'])
+            return traces, unprocessed_ids
+        result = self.call_with_backoff(get_traces)
+        if result is None:
+            return [], trace_ids
+        return result
+
+    def call_with_backoff(self, request):
+        """Returns the result of request() called within the adaptive limiter.
+        Retries throttled requests with exponential backoff and returns None
+        if the request remains throttled after MAX_RETRIES retries.
+        Requests are retried entirely and hence must page through all results."""
+        for attempt in range(MAX_RETRIES + 1):
+            throttled = False
+            self.limiter.acquire()
+            try:
+                return request()
+            except ClientError as e:
+                if not is_throttling_error(e):
+                    raise
+                throttled = True
+            finally:
+                self.limiter.release(throttled)
+            if attempt < MAX_RETRIES:
+                logging.debug(f"Throttled X-Ray request. Retry {attempt + 1}/{MAX_RETRIES}.")
+                time.sleep(backoff_delay(attempt))
+        logging.warning(f"Giving up on throttled X-Ray request after {MAX_RETRIES} retries.")
+        return None
+
+
+class AdaptiveLimiter:
+    """Limits the number of concurrent requests using additive increase and
+    multiplicative decrease (AIMD): every throttled request halves the limit and
+    every successful request increases the limit by about 1 per `limit` requests."""
+
+    def __init__(self, max_limit) -> None:
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit / 2)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class DownloadProgress:
+    """Tracks and periodically logs the progress and throughput of a trace download."""
+
+    def __init__(self, num_trace_ids) -> None:
+        self.num_trace_ids = num_trace_ids
+        self.num_requested = 0
+        self.num_traces = 0
+        self.start = time.monotonic()
+        self.last_log = self.start
+
+    def results(self, futures):
+        """Yields the results of completed chunk futures and updates the progress.
+        Failed futures are raised last such that all successful chunks are yielded."""
+        for future in sorted(futures, key=lambda future: future.exception() is not None):
+            index, traces, unprocessed_ids = future.result()
+            self.num_requested += len(traces) + len(unprocessed_ids)
+            self.num_traces += len(traces)
+            yield index, traces, unprocessed_ids
+        now = time.monotonic()
+        if now - self.last_log >= PROGRESS_INTERVAL:
+            self.last_log = now
+            logging.info(f"Downloaded {self.num_traces} traces ({self.num_requested}/{self.num_trace_ids} trace ids) at {self.throughput():.1f} traces/s.")  # noqa: E501
+
+    def throughput(self) -> float:
+        return self.num_traces / max(time.monotonic() - self.start, 1e-9)
+
+    def log_summary(self):
+        duration = time.monotonic() - self.start
+        logging.info(f"Downloaded {self.num_traces} traces in {duration:.1f}s at {self.throughput():.1f} traces/s.")  # noqa: E501
+
+
+def is_throttling_error(error) -> bool:
+    return error.response.get('Error', {}).get('Code') in THROTTLING_ERRORS
+
+
+def backoff_delay(attempt) -> float:
+    """Returns a random delay with exponential backoff and full jitter."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def time_slices(start, end, num_slices) -> list:
+    """Returns a list of `num_slices` consecutive (start, end) tuples of equal duration
+    covering the timespan between start and end."""
+    duration = (end - start) / num_slices
+    boundaries = [start + i * duration for i in range(num_slices)] + [end]
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def write_traces(f, traces, compression=None) -> list:
+    """Writes traces with one JSON-formatted trace per line into a binary file
+    and returns the written lines. The lines of a compressed file are written as a
+    single self-contained gzip member or zstd frame (see trace_files.compress)."""
+    lines = [json.dumps(trace) + '\n' for trace in traces]
+    f.write(compress(''.join(lines).encode(), compression))
+    return lines
+
+
+def read_trace_ids(trace_ids_file) -> list:
+    with open(trace_ids_file) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def read_checkpoint_header(checkpoint_file) -> dict:
+    with open(checkpoint_file) as f:
+        return json.loads(f.readline())
+
+
+def read_checkpoint(checkpoint_file):
+    """Returns a tuple (offset, completed, size) with the size of the trace file at the
+    last checkpoint, a dict of the unprocessed trace ids by completed chunk index,
+    and the size of the valid checkpoint excluding a partially written last line."""
+    completed = {}
+    with open(checkpoint_file, 'rb') as f:
+        header = f.readline()
+        offset = json.loads(header)['offset']
+        size = len(header)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            entry = json.loads(line)
+            completed[entry['chunk']] = entry['unprocessed']
+            offset = entry['offset']
+            size += len(line)
+    return offset, completed, size
+
 
 def extract_trace_ids(trace_summaries):
     return [trace['Id'] for trace in trace_summaries['TraceSummaries']]
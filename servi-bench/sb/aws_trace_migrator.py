@@ -1,6 +1,14 @@
+import io
 import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import shutil
+from sb.trace_files import open_traces, traces_file_names
+
+# Size of the text chunks read from the old traces file
+READ_CHUNK_SIZE = 1024 * 1024
+WHITESPACE = ' \t\n\r'
 
 
 def migrate_traces(traces_path, replace=False):
@@ -12,14 +20,163 @@ def migrate_traces(traces_path, replace=False):
     After:
     {"Id": "1-60be2454-2cb82d1221d24201751ea2e3", ... }
     {"Id": "1-60be244d-29f4c8461b7effa2caaa0848", ... }
+    The old file is parsed incrementally such that memory usage is bounded
+    by the size of the largest single trace rather than the (potentially GBs) file.
+    Compressed files (traces.json.gz|zst) are migrated into traces_v2.json.gz|zst
+    with the same compression.
+    Returns the number of migrated traces or None if the file has already been migrated.
     """
-    with open(traces_path) as traces_file:
-        new_traces_path = Path(traces_path).parent / 'traces_v2.json'
-        with open(new_traces_path, 'w') as new_traces_file:
-            # NOTE: Loading potentially large (GBs) file into memory
-            traces = json.load(traces_file)
-            for trace in traces.values():
-                new_traces_file.write(json.dumps(trace) + '\n')
+    if not is_legacy_format(traces_path):
+        logging.warning(f"Skip migration of {traces_path} because it is not in the old format.")
+        return None
+    num_traces = 0
+    traces_path = Path(traces_path)
+    new_traces_path = traces_path.parent / traces_path.name.replace('traces', 'traces_v2', 1)
+    with open_text(traces_path) as traces_file:
+        with open_traces(new_traces_path, 'wb') as new_traces_file:
+            for _, trace in iter_legacy_traces(traces_file):
+                new_traces_file.write((json.dumps(trace) + '\n').encode())
+                num_traces += 1
     # Optionally replace old file
     if replace:
         shutil.move(new_traces_path, traces_path)
+    return num_traces
+
+
+def migrate_logs(logs_path, replace=False, workers=1):
+    """Migrates all (compressed) traces.json files in the old format within a logs directory tree.
+    Files are migrated in parallel using multiple worker processes if workers > 1."""
+    traces_paths = sorted(path for name in traces_file_names()
+                          for path in Path(logs_path).glob(f"**/{name}"))
+    logging.info(f"Migrating {len(traces_paths)} traces files in {logs_path} ...")
+    if int(workers) > 1:
+        with ProcessPoolExecutor(max_workers=int(workers)) as executor:
+            futures = [executor.submit(migrate_traces, path, replace) for path in traces_paths]
+            results = [future.result() for future in futures]
+    else:
+        results = [migrate_traces(path, replace) for path in traces_paths]
+    for path, num_traces in zip(traces_paths, results):
+        if num_traces is not None:
+            logging.info(f"Migrated {num_traces} traces in {path}.")
+    return dict(zip(traces_paths, results))
+
+
+def is_legacy_format(traces_path) -> bool:
+    """Returns true if the traces file uses the old format with a
+    single top-level JSON object mapping trace ids to traces.
+    Traces in the new format start with their 'Id' key instead."""
+    with open_text(traces_path) as traces_file:
+        head = traces_file.read(READ_CHUNK_SIZE).lstrip(WHITESPACE)
+    if not head.startswith('{'):
+        return False
+    decoder = json.JSONDecoder()
+    try:
+        first_key, _ = decoder.raw_decode(head, skip_whitespace(head, 1))
+    except json.JSONDecodeError:
+        # Empty object or truncated key
+        return head[skip_whitespace(head, 1):].startswith('}')
+    return first_key != 'Id'
+
+
+def open_text(traces_path):
+    """Opens an optionally compressed traces file for reading text."""
+    return io.TextIOWrapper(open_traces(traces_path), encoding='utf-8')
+
+
+def iter_legacy_traces(traces_file, chunk_size=READ_CHUNK_SIZE):
+    """Yields (trace_id, trace) tuples by incrementally parsing the
+    top-level JSON object {trace_id: trace, ...} of an old traces file.
+    Fails at the first invalid value with its line number instead of
+    reading the remainder of a malformed file."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    # Number of lines in the consumed chunks dropped from the buffer
+    dropped_lines = 0
+
+    def fill():
+        """Reads the next chunk and drops the already consumed part of the buffer."""
+        nonlocal buffer, pos, eof, dropped_lines
+        chunk = traces_file.read(chunk_size)
+        if not chunk:
+            eof = True
+        dropped_lines += buffer.count('\n', 0, pos)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def line(position) -> int:
+        return dropped_lines + buffer.count('\n', 0, position) + 1
+
+    def invalid(message, position=None) -> Exception:
+        return Exception(f"Invalid traces file at line {line(pos if position is None else position)}: {message}")  # noqa: E501
+
+    def next_token():
+        """Skips whitespace and returns the next character or None at the end of the file."""
+        nonlocal pos
+        while True:
+            pos = skip_whitespace(buffer, pos)
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                return None
+            fill()
+
+    def decode():
+        """Decodes the next JSON value and reads more chunks as long as the value is incomplete.
+        Keys and traces are strings and objects, which can only be decoded once complete."""
+        nonlocal pos
+        while True:
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+                return value
+            except json.JSONDecodeError as e:
+                if eof or not is_incomplete(e, buffer):
+                    raise invalid(e.msg, e.pos)
+                fill()
+
+    if next_token() != '{':
+        raise invalid('expected a top-level JSON object.')
+    pos += 1
+    while True:
+        token = next_token()
+        if token == '}':
+            pos += 1
+            if next_token() is not None:
+                raise invalid('unexpected data after the top-level JSON object.')
+            return
+        if token is None:
+            raise invalid('unexpected end of file.')
+        if token == ',':
+            pos += 1
+            next_token()
+        trace_id = decode()
+        if next_token() != ':':
+            raise invalid(f"expected ':' after trace id {trace_id}.")
+        pos += 1
+        next_token()
+        trace_pos = pos
+        trace = decode()
+        if not isinstance(trace, dict):
+            raise invalid(f"expected a trace object for trace id {trace_id}.", trace_pos)
+        yield trace_id, trace
+
+
+# Errors within this many characters before the end of the buffer might be caused by
+# a value that continues in the next chunk (e.g., a truncated literal or escape sequence)
+INCOMPLETE_MARGIN = 16
+
+
+def is_incomplete(error, buffer) -> bool:
+    """Returns true if a JSONDecodeError might be caused by the end of the buffer
+    rather than invalid JSON. Strings cannot contain unescaped newlines (strict mode)
+    such that an unterminated string always reaches the end of the buffer."""
+    if error.msg.startswith('Unterminated string'):
+        return True
+    return skip_whitespace(buffer, error.pos) >= len(buffer) - INCOMPLETE_MARGIN
+
+
+def skip_whitespace(text, pos) -> int:
+    while pos < len(text) and text[pos] in WHITESPACE:
+        pos += 1
+    return pos
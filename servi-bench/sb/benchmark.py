@@ -10,6 +10,7 @@ from mergedeep import merge
 
 from sb.event_log import EventLog
 from sb.benchmark_spec import BenchmarkSpec
+from sb.k6_monitor import K6Monitor, REPORT_INTERVAL
 
 HOOKS = ['prepare', 'invoke', 'cleanup']
 BENCHMARK_CONFIG = 'BENCHMARK_CONFIG'
@@ -79,7 +80,8 @@ class Benchmark:
     def invoke(self, workload_type=None,
                scale_factor=1, scale_type='linear',
                workload_trace=None, workload_options=None,
-               seconds_to_skip=3 * 60):
+               seconds_to_skip=3 * 60, live_metrics_interval=REPORT_INTERVAL,
+               stage_tolerance=None):
         logging.info('invoke()')
         start = self.log_start('invoke')
         # string comparison handles Docker-mode case where None is passed as string
@@ -91,10 +93,20 @@ class Benchmark:
         self.spec['scale_type'] = scale_type
         self.spec['workload_trace'] = workload_trace
         self.spec['seconds_to_skip'] = seconds_to_skip
+        self.spec['stage_tolerance'] = stage_tolerance
 
         self.save_config()
         self.spec.create_workload_options_file(self.path, workload_options)
-        self.plugin.invoke(self.spec)
+        monitor = None
+        if float(live_metrics_interval) > 0:
+            monitor = K6Monitor(self.spec.workload_log_file(), self.spec.logs_directory(),
+                                float(live_metrics_interval))
+            monitor.start()
+        try:
+            self.plugin.invoke(self.spec)
+        finally:
+            if monitor is not None:
+                monitor.stop()
         end = self.log_end('invoke')
         self.save_config()
         logging.info(f"[{self.spec.name}]invoke_time={end - start}")
@@ -1,4 +1,6 @@
 import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path, PurePosixPath, PureWindowsPath
 from sb.event_log import EventLog
 import subprocess
@@ -8,12 +10,25 @@ import platform
 import logging
 from subprocess import TimeoutExpired
 
+from sb.load_generator import MAX_IN_FLIGHT, LoadGenerator, request_from_envs
 from sb.provider import Provider
-from sb.workload_generator import WorkloadGenerator
+from sb.workload_cache import WorkloadOptionsCache, cache_key
+from sb.workload_generator import WorkloadGenerator, log_stage_error
 
 logger = logging.getLogger('run')
 
 DEFAULT_TIMEOUT = 30  # seconds
+# Default number of concurrent commands in spec.run_many()
+MAX_PARALLEL = 8
+
+
+class RunResult(namedtuple('RunResult', ['cmd', 'output', 'returncode', 'full_cmd'])):
+    """Output and exit status of a spec.run() command."""
+
+    @property
+    def success(self) -> bool:
+        """Commands without exit status (i.e., killed after a timeout) are not failed."""
+        return self.returncode is None or self.returncode == 0
 
 
 def win_vol(path) -> str:
@@ -70,6 +85,8 @@ class BenchmarkSpec:
         # Indicates whether the last `spec.run` command succeeded
         # Used to implement conditional `.sb` cleanup
         self.last_run_success = True
+        # Local mode runs spec.run() commands directly on the host instead of Docker
+        self.local = False
 
     def run_k6(self, envs={}, options='', image='k6'):
         """Runs k6 with automated workload injection and csv logging.
@@ -80,7 +97,16 @@ class BenchmarkSpec:
         envs: dict of environment variables
         options: optional k6 command line options https://k6.io/docs/using-k6/options
         image: the Docker image with k6 installation
+        The benchmark config `load_generator: python` selects the built-in Python
+        load generator instead of k6 (see run_load_generator).
         """
+        if self['load_generator'] == 'python':
+            if options:
+                logger.warning(f"Ignoring k6 options '{options}' of the Python load generator.")
+            self.run_load_generator(envs)
+            return
+        elif self['load_generator'] not in (None, 'k6'):
+            raise Exception(f"Unknown load_generator {self['load_generator']}. Supported: k6|python")  # noqa: E501
         workload_script, workload_options = self.workload_file_paths()
         cmd = (
             "k6 run"
@@ -92,6 +118,21 @@ class BenchmarkSpec:
         )
         self.run(cmd, image=image)
 
+    def run_load_generator(self, envs={}) -> dict:
+        """Runs the workload_options.json with the open-loop Python load generator
+        on the host without a k6 container and returns a summary of the requests.
+        Sends the same request (envs URL, BODY, METHOD, CONTENT_TYPE) with a new
+        X-Ray trace header every iteration and logs into the same k6_metrics.csv.
+        Workload scripts with custom JavaScript logic still require k6.
+        Configure the maximum concurrent requests via `load_generator_max_in_flight`.
+        """
+        _, workload_options = self.workload_file_paths()
+        with open(workload_options) as f:
+            options = json.load(f)
+        generator = LoadGenerator(options, request_from_envs(envs), self.workload_log_file(),
+                                  self['load_generator_max_in_flight'] or MAX_IN_FLIGHT)
+        return generator.run()
+
     def key_value_args(self, arg_dict, flag) -> str:
         """Converts a dict into key=value cli arguments with a flag.
         Example: '--env "key1=value1" --env "key2=value2"'
@@ -107,6 +148,9 @@ class BenchmarkSpec:
         """Runs a given `cmd` in a Docker `image` and returns its stdout.
         Mounts the root directory into the container as well as provider
         secrets if a provider is specified in the BENCHMARK_CONFIG.
+        In local mode, the `cmd` runs directly on the host in the benchmark directory
+        with the host environment, tools, and provider credentials (e.g., ~/.aws)
+        and the `image` is ignored.
         image: supports global aliases as defined in IMAGES.
         Examples:
         * spec.run('pwd', image='alpine:3')
@@ -116,38 +160,70 @@ class BenchmarkSpec:
         * check: fails upon non-zero exit status if set to True.
                  Defaults: True during prepare phase and False during cleanup.
         """
-        # Resolve image aliases
-        if(image in BenchmarkSpec.IMAGES.keys()):
-            image = self.image(image)
         # Set status code check default
         if(check is None):
             check = BenchmarkSpec.CHECK_RETURNCODE_DEFAULT
-        # Escape double quotes for shell
-        escaped_cmd = cmd.replace('"', '\\"')
-        # Escape dollar sign ($) for local mode support on Windows
-        if(platform.system() != 'Windows'):
-            escaped_cmd = escaped_cmd.replace('$', r'\$')
-        docker_cmd = (
-            "docker run --rm"
-            f"{self.secrets_mount()}"
-            f" -v '{win_vol(self.host_root_path())}':{self.mount_dir()}"
-            f"{self.user_permissions()}"
-            f" --entrypoint=''"  # Some containers already have ENTRYPOINTS, remove them
-            f" {image} {shell} -c \"cd '{self.bench_dir()}' && {escaped_cmd}\""
-        )
-        # MAYBE: provide option to execute in full local mode too.
-        # Need to make the local flag somehow accessible.
-        # if mode.local:
-        #     cmd = escaped_cmd
-        logging.info(f"docker={docker_cmd}")
+        result = self.execute(cmd, image, shell)
+        # Update status flag of last run command (unknown after a timeout)
+        if result.returncode is not None:
+            self.last_run_success = result.returncode == 0
+        if(check and not result.success):
+            raise Exception(self.run_error(result))
+        return result.output
+
+    def run_many(self, cmds, image='alpine:3.12.0', shell='/bin/sh', check=None,
+                 max_parallel=MAX_PARALLEL) -> list:
+        """Runs independent commands concurrently and returns a list of RunResult
+        tuples (cmd, output, returncode, full_cmd) in the order of the `cmds`.
+        The logs of all commands are streamed interleaved with the prefix `[i]`
+        of the command index. Supports the same `image`, `shell`, and `check`
+        arguments as spec.run(). Alternatively, a command can be a dict of
+        spec.run() arguments. Fails after all commands completed if `check` is
+        enabled and any command exited unsuccessfully.
+        Example:
+        spec.run_many([f"aws s3 mb s3://{bucket}" for bucket in buckets], image='aws_cli')
+        spec.run_many(['npm install', {'cmd': 'go build', 'image': 'go1.x'}], max_parallel=2)
+        """
+        if(check is None):
+            check = BenchmarkSpec.CHECK_RETURNCODE_DEFAULT
+        cmds = [c if isinstance(c, dict) else {'cmd': c} for c in cmds]
+        if not cmds:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, int(max_parallel))) as executor:
+            futures = [executor.submit(self.execute, c['cmd'], c.get('image', image),
+                                       c.get('shell', shell), f"[{i}] ")
+                       for i, c in enumerate(cmds)]
+            results = [future.result() for future in futures]
+        returncodes = [result.returncode for result in results if result.returncode is not None]
+        if returncodes:
+            self.last_run_success = all(returncode == 0 for returncode in returncodes)
+        failed = [(i, result) for i, result in enumerate(results) if not result.success]
+        if check and failed:
+            err_msgs = [f"[{i}] {self.run_error(result)}" for i, result in failed]
+            raise Exception(f"{len(failed)}/{len(results)} spec.run_many() commands failed:\n" + '\n'.join(err_msgs))  # noqa: E501
+        return results
+
+    def execute(self, cmd, image='alpine:3.12.0', shell='/bin/sh', prefix='') -> RunResult:
+        """Runs a given `cmd` in Docker or locally and returns a RunResult
+        without checking its status. Log lines are prefixed with `prefix`.
+        The returncode is None if the process did not terminate in time."""
+        if self.local:
+            full_cmd = cmd
+            popen_args = {'args': [shell, '-c', cmd], 'cwd': str(self.host_path())}
+            if platform.system() == 'Windows':
+                popen_args = {'args': cmd, 'shell': True, 'cwd': str(self.host_path())}
+        else:
+            full_cmd = self.docker_cmd(cmd, image, shell)
+            popen_args = {'args': full_cmd, 'shell': True}
+        logging.info(f"{prefix}{self.mode()}={full_cmd}")
         # See: https://docs.python.org/3/library/subprocess.html#subprocess.Popen.stderr
-        proc = subprocess.Popen(docker_cmd, shell=True, text=True,
+        proc = subprocess.Popen(**popen_args, text=True,
                                 stdout=subprocess.PIPE,
                                 stderr=subprocess.STDOUT)
         log = []
         pulling = False
         for line in iter(proc.stdout.readline, ''):
-            logger.info(line.rstrip())
+            logger.info(f"{prefix}{line.rstrip()}")
             # Filter out Docker image pull log if image is unavailable
             # Pulling begins
             if line.startswith('Unable to find image'):
@@ -163,26 +239,46 @@ class BenchmarkSpec:
         # https://docs.python.org/3/library/subprocess.html#subprocess.Popen.communicate
         # Warning: MUST use communicate if stderr is PIPE. See:
         # https://docs.python.org/3/library/subprocess.html#subprocess.Popen.stderr
+        returncode = None
         try:
             _, errs = proc.communicate(DEFAULT_TIMEOUT)
-            # Update status flag of last run command
-            if proc.returncode == 0:
-                self.last_run_success = True
-            else:
-                self.last_run_success = False
-            if(check and proc.returncode != 0):
-                err_msg = (
-                    f"The spec.run() command `{cmd}` exited unsuccessfully."
-                    f" Full Docker command:\n{docker_cmd}"
-                )
-                raise Exception(err_msg)
+            returncode = proc.returncode
         except TimeoutExpired:
-            logging.warning(f"Killing process after waiting for {DEFAULT_TIMEOUT}s ...")
+            logging.warning(f"{prefix}Killing process after waiting for {DEFAULT_TIMEOUT}s ...")
             proc.kill()
             _, errs = proc.communicate()
             logging.warning(errs)
 
-        return ''.join(log)
+        return RunResult(cmd, ''.join(log), returncode, full_cmd)
+
+    def mode(self) -> str:
+        return 'local' if self.local else 'docker'
+
+    def run_error(self, result) -> str:
+        return (
+            f"The spec.run() command `{result.cmd}` exited unsuccessfully."
+            f" Full {self.mode()} command:\n{result.full_cmd}"
+        )
+
+    def docker_cmd(self, cmd, image, shell) -> str:
+        """Returns the Docker command running `cmd` in the benchmark directory
+        of a new container of an `image`."""
+        # Resolve image aliases
+        if(image in BenchmarkSpec.IMAGES.keys()):
+            image = self.image(image)
+        # Escape double quotes for shell
+        escaped_cmd = cmd.replace('"', '\\"')
+        # Escape dollar sign ($) for local mode support on Windows
+        if(platform.system() != 'Windows'):
+            escaped_cmd = escaped_cmd.replace('$', r'\$')
+        return (
+            "docker run --rm"
+            f"{self.secrets_mount()}"
+            f" -v '{win_vol(self.host_root_path())}':{self.mount_dir()}"
+            f"{self.user_permissions()}"
+            f" --entrypoint=''"  # Some containers already have ENTRYPOINTS, remove them
+            f" {image} {shell} -c \"cd '{self.bench_dir()}' && {escaped_cmd}\""
+        )
 
     def shell(self, image, shell='/bin/bash'):
         """Starts an interactive `shell` in a Docker `image`
@@ -322,11 +418,14 @@ class BenchmarkSpec:
 
     def workload_options(self) -> dict:
         """Returns a k6 options dictionary."""
-        gen = WorkloadGenerator(self['workload_type'],
-                                self['scale_factor'], self['scale_type'],
-                                self['workload_trace'],
-                                self['seconds_to_skip'])
-        return gen.generate_trace()
+        return self.workload_generator().generate_trace()
+
+    def workload_generator(self) -> WorkloadGenerator:
+        return WorkloadGenerator(self['workload_type'],
+                                 self['scale_factor'], self['scale_type'],
+                                 self['workload_trace'],
+                                 self['seconds_to_skip'],
+                                 self['stage_tolerance'])
 
     def create_workload_options_file(self, path, workload_options=None):
         script, options = self.workload_file_paths()
@@ -342,8 +441,19 @@ class BenchmarkSpec:
             # return because we already created the file through copying
             return
         else:
-            # generate via workload generator
-            k6_config = self.workload_options()
+            # generate via workload generator and stream long traces into the file
+            generator = self.workload_generator()
+            cache = WorkloadOptionsCache()
+            key = cache_key(generator) if cache.enabled else None
+            if key and cache.get(key, options_path):
+                logger.info(f"Using cached k6 options {key[:12]} from {cache.directory}")
+                log_stage_error(cache.metadata(key).get('stage_error'))
+                return
+            with open(options_path, 'w') as options_file:
+                generator.write_k6_options(options_file)
+            if key:
+                cache.put(key, options_path, {'stage_error': generator.stage_error})
+            return
 
         # write k6 config to workload_options.json file
         with open(options_path, 'w') as options_file:
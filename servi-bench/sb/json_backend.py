@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+
+"""Pluggable JSON backend for decoding X-Ray traces.
+Traces are double-encoded: every line of a traces.json file contains a JSON trace
+and every segment contains its JSON document as a string. Decoding dominates the
+trace analysis and faster backends (orjson or msgspec) are used if installed.
+The backend can be selected via the environment variable SB_JSON_BACKEND=orjson|msgspec|json.
+The default `auto` uses the first installed backend in the order of BACKENDS.
+Traces are always encoded with the stdlib json module such that written traces.json
+files (and hence their content hashes) are identical for every installed backend.
+"""
+
+BACKENDS = ['orjson', 'msgspec', 'json']
+JSON_BACKEND_ENV = 'SB_JSON_BACKEND'
+
+
+def load_backend(name):
+    """Returns the loads function of the backend `name`, which decodes str or bytes.
+    Raises an ImportError if the backend is not installed."""
+    if name == 'orjson':
+        import orjson
+        return orjson.loads
+    if name == 'msgspec':
+        import msgspec
+        return msgspec.json.Decoder().decode
+    if name == 'json':
+        return json.loads
+    raise Exception(f"Unsupported JSON backend {name}. Supported backends: {BACKENDS}")
+
+
+def installed_backends() -> list:
+    backends = []
+    for name in BACKENDS:
+        try:
+            load_backend(name)
+            backends.append(name)
+        except ImportError:
+            pass
+    return backends
+
+
+def select_backend(name='auto'):
+    """Returns a tuple (name, loads) for the requested backend.
+    Falls back to the stdlib json module if the requested backend is unknown
+    (e.g., a typo in SB_JSON_BACKEND) or not installed."""
+    if name != 'auto' and name not in BACKENDS:
+        logging.warning(f"Unsupported JSON backend {name}. Supported backends: {BACKENDS}. Falling back to json.")  # noqa: E501
+        name = 'json'
+    candidates = BACKENDS if name == 'auto' else [name, 'json']
+    for candidate in candidates:
+        try:
+            return candidate, load_backend(candidate)
+        except ImportError:
+            if name != 'auto':
+                logging.warning(f"JSON backend {name} is not installed. Falling back to json.")
+
+
+backend, loads = select_backend(os.getenv(JSON_BACKEND_ENV, 'auto'))
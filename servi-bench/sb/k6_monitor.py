@@ -0,0 +1,177 @@
+import csv
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from sb.quantile_sketch import QuantileSketch
+
+"""Live latency monitoring of a running k6 workload.
+Tails the k6_metrics.csv written by BenchmarkSpec.run_k6 and keeps one mergeable
+quantile sketch of the http_req_duration per second. Periodically logs the latency
+quantiles and the achieved requests per second of the last interval such that
+overloaded runs can be aborted early. The per-second sketches are saved into the
+logs directory when the invocation ends.
+"""
+
+LATENCY_METRIC = 'http_req_duration'
+# Seconds between live summaries (0 disables live monitoring)
+REPORT_INTERVAL = 10
+# Seconds between reads of new metrics
+POLL_INTERVAL = 1
+QUANTILES = [0.5, 0.95, 0.99]
+SKETCHES_FILE = 'k6_latency_sketches.json'
+
+
+class K6MetricsTail:
+    """Incrementally reads the rows of a growing k6 CSV metrics file.
+    Incomplete last lines are kept until the rest of the line has been written."""
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        self.file = None
+        self.buffer = ''
+        self.columns = None
+
+    def read(self, metric=LATENCY_METRIC):
+        """Returns a tuple (timestamps, values) of NumPy arrays with all new samples
+        of a metric since the last read."""
+        if self.file is None:
+            if not self.path.is_file():
+                return empty_samples()
+            self.file = open(self.path, newline='')
+        self.buffer += self.file.read()
+        *lines, self.buffer = self.buffer.split('\n')
+        if self.columns is None:
+            if not lines:
+                return empty_samples()
+            self.columns = next(csv.reader([lines.pop(0)]))
+        # Cheap pre-filter before parsing the CSV rows
+        lines = [line for line in lines if metric in line]
+        name_index = self.columns.index('metric_name')
+        time_index = self.columns.index('timestamp')
+        value_index = self.columns.index('metric_value')
+        timestamps = []
+        values = []
+        for row in csv.reader(lines):
+            if row[name_index] == metric:
+                timestamps.append(row[time_index])
+                values.append(row[value_index])
+        return np.array(timestamps, dtype=np.int64), np.array(values, dtype=np.float64)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def empty_samples():
+    return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+
+class K6Monitor:
+    """Monitors the latency of a running k6 workload in a background thread.
+    Usage: start() before and stop() after running k6."""
+
+    def __init__(self, metrics_file, logs_directory, report_interval=REPORT_INTERVAL,
+                 poll_interval=POLL_INTERVAL, metric=LATENCY_METRIC) -> None:
+        self.tail = K6MetricsTail(metrics_file)
+        self.logs_directory = Path(logs_directory)
+        self.report_interval = report_interval
+        self.poll_interval = poll_interval
+        self.metric = metric
+        # Quantile sketches of the metric by epoch second
+        self.sketches = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='k6-monitor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops monitoring, logs a summary of the entire run, and saves the sketches."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.poll()
+        self.tail.close()
+        if self.sketches:
+            summary = summarize(self.sketches)
+            logging.info(f"k6 {self.metric} total: {format_summary(summary)}")
+            self.save()
+
+    def run(self):
+        last_report = time.monotonic()
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.poll()
+                if time.monotonic() - last_report >= self.report_interval:
+                    self.report()
+                    last_report = time.monotonic()
+            except Exception as e:
+                # Monitoring must never interrupt a running benchmark
+                logging.warning(f"Failed to monitor k6 metrics: {e}")
+
+    def poll(self):
+        timestamps, values = self.tail.read(self.metric)
+        for second in np.unique(timestamps).tolist():
+            sketch = self.sketches.setdefault(second, QuantileSketch())
+            sketch.add(values[timestamps == second])
+
+    def report(self):
+        """Logs the summary of the last interval of completed seconds."""
+        if not self.sketches:
+            return
+        # The latest second is likely incomplete
+        end = max(self.sketches)
+        # The first interval starts with the first monitored second
+        start = max(end - self.report_interval, min(self.sketches))
+        summary = summarize(self.sketches, start, end)
+        if summary is not None:
+            logging.info(f"k6 {self.metric} last {summary['seconds']:g}s: {format_summary(summary)}")  # noqa: E501
+
+    def save(self) -> Path:
+        path = self.logs_directory / SKETCHES_FILE
+        data = {
+            'metric': self.metric,
+            'sketches': {str(second): sketch.to_dict()
+                         for second, sketch in sorted(self.sketches.items())}
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        return path
+
+
+def summarize(sketches, start=None, end=None, quantiles=QUANTILES) -> dict:
+    """Returns a summary of the merged per-second sketches within [start, end)
+    or None if there are no samples. Defaults to all seconds.
+    The rps of a given interval includes its seconds without samples (e.g., stalls)."""
+    seconds = [s for s in sketches
+               if (start is None or s >= start) and (end is None or s < end)]
+    if not seconds:
+        return None
+    merged = QuantileSketch()
+    for second in seconds:
+        merged.merge(sketches[second])
+    first = min(seconds) if start is None else start
+    last = max(seconds) + 1 if end is None else end
+    num_seconds = last - first
+    summary = {'seconds': num_seconds, 'requests': merged.count, 'rps': merged.count / num_seconds}
+    for q, value in zip(quantiles, merged.quantiles(quantiles)):
+        summary[f"p{q * 100:g}"] = value
+    return summary
+
+
+def format_summary(summary) -> str:
+    quantiles = ' '.join(f"{name}={value:.1f}ms" for name, value in summary.items()
+                         if name.startswith('p'))
+    return f"{quantiles} rps={summary['rps']:.1f} requests={summary['requests']}"
+
+
+def load_sketches(path) -> dict:
+    """Returns the per-second quantile sketches saved by a K6Monitor by epoch second."""
+    with open(path) as f:
+        data = json.load(f)
+    return {int(second): QuantileSketch.from_dict(sketch)
+            for second, sketch in data['sketches'].items()}
@@ -0,0 +1,254 @@
+import asyncio
+import csv
+import logging
+import re
+import secrets
+import time
+from collections import namedtuple
+import numpy as np
+
+"""Open-loop HTTP load generator in Python as an alternative to k6 (see BenchmarkSpec.run_k6).
+Replays the k6 options of a workload_options.json generated by the WorkloadGenerator:
+* ramping-arrival-rate scenarios start requests at the arrival times of the linearly
+  ramping rate of the stages independent of the response times (open loop).
+* vus and iterations options run the iterations in closed loop by `vus` workers.
+Every request propagates a new X-Ray trace header (X-Amzn-Trace-Id) as the
+workload scripts and writes the same k6_metrics.csv schema as the k6 csv output
+including the `xray_header` tag. Requires the optional aiohttp dependency.
+"""
+
+# Columns of the k6 csv output: https://k6.io/docs/results-visualization/csv
+METRICS_COLUMNS = ['metric_name', 'timestamp', 'metric_value', 'check', 'error', 'error_code',
+                   'expected_response', 'group', 'method', 'name', 'proto', 'scenario',
+                   'service', 'status', 'subproto', 'tls_version', 'url', 'extra_tags']
+CHECK = 'status is 200'
+# Maximum concurrent requests similar to k6 maxVUs. Arrivals beyond are dropped.
+MAX_IN_FLIGHT = 1000
+# Seconds of arrival times computed at once
+SLICE_SECONDS = 60
+# Seconds between writes of the buffered metrics (e.g., for the K6Monitor)
+FLUSH_INTERVAL = 1
+# Request timeout in seconds (k6 default)
+TIMEOUT = 60
+# k6 error codes: https://k6.io/docs/javascript-api/error-codes
+ERROR_CODE = 1000
+TIMEOUT_ERROR_CODE = 1050
+
+Request = namedtuple('Request', ['method', 'url', 'body', 'headers'])
+
+
+def import_aiohttp():
+    """Lazily imports the optional aiohttp dependency for the Python load generator."""
+    try:
+        import aiohttp
+        return aiohttp
+    except ImportError:
+        raise Exception("The Python load generator requires aiohttp. Install via pip install --editable '.[loadgen]'")  # noqa: E501
+
+
+def request_from_envs(envs) -> Request:
+    """Returns the request of the k6 environment variables URL, BODY, METHOD, and CONTENT_TYPE
+    as used by the basic workload scripts. The METHOD defaults to POST with a BODY and GET
+    otherwise and the CONTENT_TYPE of a BODY defaults to application/json."""
+    if not envs.get('URL'):
+        raise Exception('The Python load generator requires a URL environment variable.')
+    body = envs.get('BODY')
+    method = envs.get('METHOD', 'POST' if body is not None else 'GET')
+    headers = {}
+    if body is not None:
+        headers['Content-Type'] = envs.get('CONTENT_TYPE', 'application/json')
+    return Request(method.upper(), envs['URL'], body, headers)
+
+
+def xray_trace_header() -> str:
+    """Returns a new X-Ray trace header with the current epoch time and a random 96-bit id:
+    https://docs.aws.amazon.com/xray/latest/devguide/xray-concepts.html#xray-concepts-tracingheader"""  # noqa: E501
+    return f"Root=1-{int(time.time()):08x}-{secrets.token_hex(12)}"
+
+
+def parse_duration(duration) -> float:
+    """Returns the seconds of a k6 duration. Examples: 10s, 1m30s, 500ms, 2h"""
+    if isinstance(duration, (int, float)):
+        return float(duration)
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', duration)
+    if not parts or ''.join(value + unit for value, unit in parts) != duration:
+        raise Exception(f"Invalid k6 duration: {duration}")
+    return sum(float(value) * units[unit] for value, unit in parts)
+
+
+def arrival_times(start_rate, stages, time_unit='1s', slice_seconds=SLICE_SECONDS):
+    """Yields NumPy arrays of the arrival times in seconds since the start of a k6
+    ramping-arrival-rate scenario in slices of at most `slice_seconds`.
+    The rate ramps linearly from the target of the previous stage (or `start_rate`)
+    to the target of each stage. An iteration starts whenever the integral of the rate
+    reaches the next whole number starting with one iteration at time 0."""
+    unit = parse_duration(time_unit)
+    start = 0.0
+    rate = start_rate / unit
+    # Expected number of arrivals until `start`
+    count = 0.0
+    for stage in stages:
+        duration = parse_duration(stage['duration'])
+        end_rate = stage['target'] / unit
+        slope = (end_rate - rate) / duration if duration > 0 else 0.0
+        offset = 0.0
+        while offset < duration:
+            length = min(slice_seconds, duration - offset)
+            r0 = rate + slope * offset
+            end_count = count + r0 * length + slope * length ** 2 / 2
+            # Arrivals in the half-open interval [count, end_count)
+            n = np.arange(np.ceil(count), np.ceil(end_count)) - count
+            # Solves r0 * x + slope * x^2 / 2 = n in the numerically stable form
+            root = np.sqrt(np.maximum(r0 ** 2 + 2 * slope * n, 0))
+            denominator = r0 + root
+            x = np.divide(2 * n, denominator, out=np.zeros_like(n), where=denominator > 0)
+            if len(x):
+                yield start + offset + np.minimum(x, length)
+            count = end_count
+            offset += length
+        start += duration
+        rate = end_rate
+
+
+class LoadGenerator:
+    """Runs the k6 `options` of a workload with an asyncio event loop
+    and writes the k6 metrics of every request into `metrics_file`."""
+
+    def __init__(self, options, request, metrics_file, max_in_flight=MAX_IN_FLIGHT,
+                 timeout=TIMEOUT) -> None:
+        self.options = options
+        self.request = request
+        self.metrics_file = metrics_file
+        self.max_in_flight = int(max_in_flight)
+        self.timeout = timeout
+        self.rows = []
+        self.in_flight = 0
+        self.num_requests = 0
+        self.num_failed = 0
+        self.num_dropped = 0
+        self.aiohttp = None
+
+    def run(self) -> dict:
+        """Returns a summary after all requests completed."""
+        return asyncio.run(self.run_async())
+
+    async def run_async(self) -> dict:
+        aiohttp = self.aiohttp = import_aiohttp()
+        scenarios = self.options.get('scenarios')
+        start = time.perf_counter()
+        with open(self.metrics_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(METRICS_COLUMNS)
+            flusher = asyncio.ensure_future(self.flush_periodically(writer, f))
+            # Connections are limited by max_in_flight instead
+            connector = aiohttp.TCPConnector(limit=0)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            try:
+                async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                    if scenarios:
+                        # k6 runs all scenarios concurrently
+                        await asyncio.gather(*(self.run_arrival_rate(session, name, scenario)
+                                               for name, scenario in scenarios.items()))
+                    else:
+                        await self.run_iterations(session, int(self.options.get('vus', 1)),
+                                                  int(self.options.get('iterations', 1)))
+            finally:
+                flusher.cancel()
+                self.flush(writer, f)
+        elapsed = time.perf_counter() - start
+        summary = {
+            'requests': self.num_requests,
+            'failed': self.num_failed,
+            'dropped': self.num_dropped,
+            'seconds': elapsed,
+            'rps': self.num_requests / elapsed if elapsed > 0 else 0.0
+        }
+        logging.info(f"Load generator: requests={summary['requests']} failed={summary['failed']} dropped={summary['dropped']} rps={summary['rps']:.1f} seconds={elapsed:.1f}")  # noqa: E501
+        return summary
+
+    async def run_arrival_rate(self, session, name, scenario):
+        executor = scenario.get('executor')
+        if executor != 'ramping-arrival-rate':
+            raise Exception(f"Unsupported k6 executor {executor} in scenario {name}. The Python load generator supports ramping-arrival-rate.")  # noqa: E501
+        loop = asyncio.get_event_loop()
+        tasks = set()
+        start = loop.time()
+        schedule = arrival_times(scenario.get('startRate', 0), scenario.get('stages', []),
+                                 scenario.get('timeUnit', '1s'))
+        for arrivals in schedule:
+            for arrival in arrivals.tolist():
+                delay = start + arrival - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self.in_flight >= self.max_in_flight:
+                    self.num_dropped += 1
+                    self.add_row('dropped_iterations', 1, scenario=name)
+                    continue
+                task = asyncio.ensure_future(self.iteration(session, name))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def run_iterations(self, session, vus, iterations):
+        remaining = iter(range(iterations))
+
+        async def worker():
+            for _ in remaining:
+                await self.iteration(session, 'default')
+
+        await asyncio.gather(*(worker() for _ in range(max(1, vus))))
+
+    async def iteration(self, session, scenario):
+        request = self.request
+        xray_header = xray_trace_header()
+        headers = dict(request.headers)
+        headers['X-Amzn-Trace-Id'] = xray_header
+        tags = {'method': request.method, 'name': request.url, 'url': request.url,
+                'scenario': scenario, 'extra_tags': f"xray_header={xray_header}"}
+        status = 0
+        error = {}
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            async with session.request(request.method, request.url, data=request.body,
+                                       headers=headers) as response:
+                await response.read()
+                status = response.status
+                tags['proto'] = f"HTTP/{response.version.major}.{response.version.minor}"
+        except asyncio.TimeoutError:
+            error = {'error': 'request timeout', 'error_code': TIMEOUT_ERROR_CODE}
+        except self.aiohttp.ClientError as e:
+            error = {'error': str(e) or type(e).__name__, 'error_code': ERROR_CODE}
+        finally:
+            self.in_flight -= 1
+        duration = (time.perf_counter() - start) * 1000
+        expected = 200 <= status < 400
+        self.num_requests += 1
+        self.num_failed += not expected
+        tags.update(error)
+        tags['status'] = status
+        tags['expected_response'] = 'true' if expected else 'false'
+        self.add_row('http_reqs', 1, **tags)
+        self.add_row('http_req_duration', duration, **tags)
+        self.add_row('http_req_failed', 0 if expected else 1, **tags)
+        self.add_row('checks', 1 if status == 200 else 0, check=CHECK, scenario=scenario,
+                     extra_tags=tags['extra_tags'])
+        self.add_row('iterations', 1, scenario=scenario)
+        self.add_row('iteration_duration', duration, scenario=scenario)
+
+    def add_row(self, metric, value, **tags):
+        row = [metric, int(time.time()), f"{value:.6f}"]
+        row += [tags.get(column, '') for column in METRICS_COLUMNS[3:]]
+        self.rows.append(row)
+
+    async def flush_periodically(self, writer, file):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self.flush(writer, file)
+
+    def flush(self, writer, file):
+        rows, self.rows = self.rows, []
+        writer.writerows(rows)
+        file.flush()
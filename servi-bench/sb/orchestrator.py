@@ -0,0 +1,332 @@
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+from sb.event_log import decode_event
+
+"""Concurrent orchestration of independent benchmarks.
+Every benchmark runs its plan (e.g., prepare, invoke, get_traces, cleanup) through
+the Sb API in its own worker process because Sb changes into the benchmark directory
+and benchmark plugins are loaded into a shared module name. A bounded process pool
+limits the number of concurrently running benchmarks. The output of each benchmark,
+including the Docker subprocesses, is written to a separate log file and the
+orchestration aborts queued benchmarks after exceeding an error threshold.
+Pipelined scheduling serializes selected steps (e.g., invoke) across all benchmarks
+through a cross-process lock such that the prepare and cleanup of other benchmarks
+overlap with the invocation of the current benchmark without any overlapping
+invocations interfering with the measurements.
+"""
+
+DEFAULT_PLAN = ['prepare', 'invoke', 'get_traces', 'cleanup']
+MAX_WORKERS = 4
+LOGS_DIRECTORY = 'orchestration_logs'
+SUMMARY_FILE = 'orchestration_summary.json'
+TIMELINE_FILE = 'orchestration_timeline.csv'
+LOG_FORMAT = '%(asctime)s %(levelname)s:%(name)s:%(message)s'
+
+
+# Cross-process lock for serialized steps shared with each worker process
+serial_lock = None
+
+
+def init_worker(lock):
+    global serial_lock
+    serial_lock = lock
+
+
+def parse_step(step):
+    """Returns a tuple (method, kwargs) for a plan step given as Sb method name
+    or as (method, kwargs) pair. Example: ['invoke', {'workload_type': 'custom'}]"""
+    if isinstance(step, str):
+        return step, {}
+    if isinstance(step, (list, tuple)) and len(step) == 2 and isinstance(step[1], dict):
+        return step[0], step[1]
+    raise Exception(f"Invalid plan step {step}. Expected a method name or a (method, kwargs) pair.")  # noqa: E501
+
+
+def validate_plan(plan, serialize=()):
+    """Raises an exception if a plan step or serialized step is not a public Sb method."""
+    from sb.sb import Sb
+    methods = [parse_step(step)[0] for step in ([] if callable(plan) else plan)]
+    for method in methods + list(serialize):
+        if method.startswith('_') or not callable(getattr(Sb, method, None)):
+            raise Exception(f"Unsupported plan step {method}. Plan steps must be Sb methods.")
+
+
+def serialized(sb, method):
+    """Returns a wrapper of an Sb method that holds the cross-process serial lock
+    while running. The time waiting for the lock is recorded in the event log
+    as `<method>_queue` event."""
+    func = getattr(sb, method)
+
+    def run_serialized(*args, **kwargs):
+        event_log = sb.bench.spec.event_log
+        event_log.start(f"{method}_queue")
+        with serial_lock:
+            event_log.end(f"{method}_queue")
+            return func(*args, **kwargs)
+    return run_serialized
+
+
+def expand_files(files) -> list:
+    """Returns the absolute paths of a list of benchmark files or a glob pattern."""
+    if isinstance(files, (str, Path)):
+        if Path(files).is_file():
+            files = [files]
+        else:
+            files = sorted(Path().glob(str(files)))
+    paths = [Path(file).resolve() for file in files]
+    if not paths:
+        raise Exception(f"No benchmark files found for {files}.")
+    return paths
+
+
+def log_file_names(files) -> list:
+    """Returns unique log file names based on the benchmark file names.
+    Example: [a/x_benchmark.py, b/x_benchmark.py] => [x_benchmark.log, x_benchmark_2.log]"""
+    names = []
+    for file in files:
+        name = Path(file).stem
+        suffix = 1
+        while f"{name}.log" in names:
+            suffix += 1
+            name = f"{Path(file).stem}_{suffix}"
+        names.append(f"{name}.log")
+    return names
+
+
+@contextmanager
+def redirect_output(log_file, log_level='INFO'):
+    """Redirects logging and the stdout and stderr of the current process, including
+    its subprocesses (e.g., docker run), into a log file."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    saved_fds = [os.dup(1), os.dup(2)]
+    with open(log_file, 'a') as f:
+        os.dup2(f.fileno(), 1)
+        os.dup2(f.fileno(), 2)
+        handler = logging.StreamHandler(f)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.handlers = [handler]
+        root.setLevel(logging.getLevelName(log_level))
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            handler.flush()
+            root.handlers = handlers
+            root.setLevel(level)
+            for fd, saved_fd in enumerate(saved_fds, start=1):
+                os.dup2(saved_fd, fd)
+                os.close(saved_fd)
+
+
+def run_benchmark(file, plan, log_file, sb_options={}, retries=0, cleanup_on_error=True,
+                  serialize=()) -> dict:
+    """Runs a plan for a single benchmark file and returns a result dict.
+    A plan is either a list of steps (see parse_step) or a picklable function `plan(sb)`
+    receiving an Sb instance. Failed steps are retried `retries` times. A failed prepare
+    is cleaned up before retrying. Failed benchmarks are cleaned up if `cleanup_on_error`.
+    The Sb methods in `serialize` never run concurrently with other benchmarks.
+    Restores the working directory such that reused worker processes resolve
+    relative paths of the next benchmark against the original directory."""
+    cwd = os.getcwd()
+    try:
+        return run_plan(file, plan, log_file, sb_options, retries, cleanup_on_error, serialize)
+    finally:
+        os.chdir(cwd)
+
+
+def run_plan(file, plan, log_file, sb_options, retries, cleanup_on_error, serialize) -> dict:
+    from sb.sb import Sb
+    start = time.monotonic()
+    result = {'file': str(file), 'benchmark': None, 'status': 'success', 'error': None,
+              'steps': [], 'log_file': str(log_file), 'events': []}
+    with redirect_output(log_file, sb_options.get('log_level', 'INFO')):
+        sb = None
+        try:
+            sb = Sb(file, **sb_options)
+            result['benchmark'] = sb.name()
+            for method in serialize:
+                setattr(sb, method, serialized(sb, method))
+            if callable(plan):
+                plan(sb)
+            else:
+                for step in plan:
+                    method, kwargs = parse_step(step)
+                    run_step(sb, method, kwargs, retries)
+                    result['steps'].append(method)
+        except Exception as e:
+            logging.exception(f"Error during execution of benchmark {file}.")
+            result['status'] = 'error'
+            result['error'] = f"{type(e).__name__}: {e}"
+            if cleanup_on_error and sb is not None and sb.bench is not None:
+                try:
+                    logging.info('Cleaning up after error ...')
+                    sb.cleanup()
+                except Exception:
+                    logging.exception('Error during cleanup of benchmark.')
+        if sb is not None and sb.bench is not None:
+            result['events'] = list(sb.bench.spec.event_log.events)
+    result['duration'] = time.monotonic() - start
+    return result
+
+
+def run_step(sb, method, kwargs, retries=0):
+    for attempt in range(retries + 1):
+        try:
+            logging.info(f"step={method};attempt={attempt + 1}/{retries + 1}")
+            getattr(sb, method)(**kwargs)
+            return
+        except Exception:
+            if attempt == retries:
+                raise
+            logging.exception(f"Error during {method}. Re-trying.")
+            if method == 'prepare':
+                sb.cleanup()
+
+
+class Orchestrator:
+    """Runs a plan for multiple independent benchmarks concurrently with a bounded
+    pool of worker processes. Usage: Orchestrator(files, plan, workers=4).run()"""
+
+    def __init__(self, files, plan=DEFAULT_PLAN, workers=MAX_WORKERS, error_threshold=None,
+                 logs_directory=LOGS_DIRECTORY, retries=0, cleanup_on_error=True,
+                 serialize=(), **sb_options) -> None:
+        """
+        files: list of benchmark files or a glob pattern.
+        plan: list of Sb method steps or a picklable function `plan(sb)`.
+        workers: maximum number of concurrently running benchmarks.
+        error_threshold: maximum number of failed benchmarks before queued benchmarks
+                         are cancelled (None never aborts).
+        logs_directory: directory for one log file per benchmark and the summary.
+        serialize: Sb methods (e.g., ['invoke']) that never run concurrently across
+                   benchmarks while all other steps overlap (i.e., pipelined scheduling).
+        sb_options: options for each Sb instance (e.g., log_level, debug, local).
+        """
+        if isinstance(serialize, str):
+            serialize = [serialize]
+        validate_plan(plan, serialize)
+        self.files = expand_files(files)
+        self.plan = plan
+        self.workers = int(workers)
+        self.error_threshold = error_threshold
+        # Worker processes change into the benchmark directories
+        self.logs_directory = Path(logs_directory).resolve()
+        self.retries = int(retries)
+        self.cleanup_on_error = cleanup_on_error
+        self.serialize = list(serialize)
+        self.sb_options = sb_options
+
+    def run(self) -> list:
+        """Returns a result dict per benchmark file in the order of the files."""
+        self.logs_directory.mkdir(parents=True, exist_ok=True)
+        log_files = [self.logs_directory / name for name in log_file_names(self.files)]
+        results = [None] * len(self.files)
+        num_errors = 0
+        logging.info(f"Orchestrating {len(self.files)} benchmarks with {self.workers} workers. Logs: {self.logs_directory}")  # noqa: E501
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                 initargs=(multiprocessing.Lock(),)) as executor:
+            # Submit benchmarks only when a worker is available such that
+            # queued benchmarks are never started after an abort
+            queue = deque(enumerate(zip(self.files, log_files)))
+            running = {}
+            while queue or running:
+                while queue and len(running) < self.workers:
+                    index, (file, log_file) = queue.popleft()
+                    future = executor.submit(run_benchmark, file, self.plan, log_file,
+                                             self.sb_options, self.retries,
+                                             self.cleanup_on_error, self.serialize)
+                    running[future] = index
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    result = self.future_result(future, self.files[index], log_files[index])
+                    results[index] = result
+                    self.log_result(result)
+                    if result['status'] == 'error':
+                        num_errors += 1
+                if self.error_threshold is not None and num_errors > self.error_threshold and queue:  # noqa: E501
+                    logging.error(f"Exceeded error threshold with {num_errors} errors. Cancelling {len(queue)} queued benchmarks.")  # noqa: E501
+                    for index, (file, log_file) in queue:
+                        results[index] = self.cancelled_result(file, log_file)
+                    queue.clear()
+        self.save_summary(results)
+        self.save_timeline(results)
+        return results
+
+    def cancelled_result(self, file, log_file) -> dict:
+        return {'file': str(file), 'benchmark': None, 'status': 'cancelled', 'error': None,
+                'steps': [], 'log_file': str(log_file), 'events': [], 'duration': 0}
+
+    def future_result(self, future, file, log_file) -> dict:
+        try:
+            return future.result()
+        except Exception as e:
+            # For example, a crashed worker process or an unpicklable plan
+            result = self.cancelled_result(file, log_file)
+            result['status'] = 'error'
+            result['error'] = f"{type(e).__name__}: {e}"
+            return result
+
+    def log_result(self, result):
+        name = result['benchmark'] or Path(result['file']).stem
+        message = f"benchmark={name};status={result['status']};duration={result['duration']:.1f}s;log_file={result['log_file']}"  # noqa: E501
+        if result['status'] == 'error':
+            logging.error(f"{message};error={result['error']}")
+        else:
+            logging.info(message)
+
+    def save_summary(self, results) -> Path:
+        path = self.logs_directory / SUMMARY_FILE
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        num_success = sum(1 for result in results if result['status'] == 'success')
+        logging.info(f"Orchestrated {num_success}/{len(results)} benchmarks successfully. Summary: {path}")  # noqa: E501
+        return path
+
+    def save_timeline(self, results) -> Path:
+        """Saves the events of all benchmarks ordered by time into a CSV file."""
+        path = self.logs_directory / TIMELINE_FILE
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['timestamp', 'benchmark', 'file', 'event', 'type'])
+            writer.writerows(sorted(timeline(results)))
+        return path
+
+
+def timeline(results) -> list:
+    """Returns a list of (timestamp, benchmark, file, event, type) tuples
+    for the event log of all benchmark results."""
+    rows = []
+    for result in results:
+        for event in result['events']:
+            event_time, event_name, event_type = decode_event(event)
+            rows.append((event_time.isoformat(), result['benchmark'], result['file'],
+                         event_name, event_type))
+    return rows
+
+
+def event_windows(results, name) -> list:
+    """Returns a list of (start, end) datetime tuples of all events with a given name."""
+    windows = []
+    for result in results:
+        start = None
+        for event in result['events']:
+            event_time, event_name, event_type = decode_event(event)
+            if event_name == name and event_type == 'start':
+                start = event_time
+            elif event_name == name and event_type == 'end' and start is not None:
+                windows.append((start, event_time))
+                start = None
+    return sorted(windows)
@@ -0,0 +1,124 @@
+import math
+import numpy as np
+
+"""Mergeable quantile sketch with relative-error guarantees based on DDSketch:
+* Paper: https://www.vldb.org/pvldb/vol12/p2195-masson.pdf
+* Title: "DDSketch: A Fast and Fully-Mergeable Quantile Sketch with Relative-Error Guarantees"
+Values are counted in logarithmically sized buckets such that every quantile
+is within `relative_accuracy` of the exact value. The memory usage is bounded by
+the range of values rather than their number and sketches of different time windows
+or files can be merged without loss of accuracy.
+"""
+
+RELATIVE_ACCURACY = 0.01
+# Absolute values below this threshold are counted as zero
+MIN_VALUE = 1e-9
+
+
+class QuantileSketch:
+    """DDSketch supporting positive, zero, and negative values (e.g., negative time
+    differences in a latency breakdown). Values are added in vectorized batches."""
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        # Bucket counts by bucket index of the absolute value
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        """Adds a single value or an array of values. NaN values are ignored."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        positive = values[values > MIN_VALUE]
+        negative = -values[values < -MIN_VALUE]
+        self.add_buckets(self.positive, positive)
+        self.add_buckets(self.negative, negative)
+        self.zero_count += values.size - positive.size - negative.size
+        self.count += values.size
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def add_buckets(self, buckets, values):
+        if values.size == 0:
+            return
+        indexes = np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+        keys, counts = np.unique(indexes, return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    def merge(self, other):
+        """Adds all values of another sketch with the same relative accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise Exception(f"Cannot merge sketches with relative accuracy {other.relative_accuracy} and {self.relative_accuracy}.")  # noqa: E501
+        for buckets, other_buckets in [(self.positive, other.positive),
+                                       (self.negative, other.negative)]:
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def bucket_value(self, key) -> float:
+        """Returns the representative value of a bucket with minimal relative error."""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantiles(self, qs) -> list:
+        """Returns the approximate values for a list of quantiles in [0, 1]
+        or NaN values if the sketch is empty."""
+        if self.count == 0:
+            return [math.nan] * len(qs)
+        negative_keys = sorted(self.negative, reverse=True)
+        positive_keys = sorted(self.positive)
+        values = [-self.bucket_value(k) for k in negative_keys]
+        values += [0.0] + [self.bucket_value(k) for k in positive_keys]
+        counts = [self.negative[k] for k in negative_keys]
+        counts += [self.zero_count] + [self.positive[k] for k in positive_keys]
+        cumulative_counts = np.cumsum(counts)
+        ranks = np.asarray(qs, dtype=np.float64) * (self.count - 1)
+        indexes = np.searchsorted(cumulative_counts, ranks, side='right')
+        return [min(max(values[i], self.min), self.max) for i in indexes.tolist()]
+
+    def quantile(self, q) -> float:
+        return self.quantiles([q])[0]
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count > 0 else math.nan
+
+    def to_dict(self) -> dict:
+        """Returns a JSON-serializable representation (see from_dict)."""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'positive': {str(k): c for k, c in self.positive.items()},
+            'negative': {str(k): c for k, c in self.negative.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count > 0 else None,
+            'max': self.max if self.count > 0 else None
+        }
+
+    @staticmethod
+    def from_dict(data):
+        sketch = QuantileSketch(data['relative_accuracy'])
+        sketch.positive = {int(k): c for k, c in data['positive'].items()}
+        sketch.negative = {int(k): c for k, c in data['negative'].items()}
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        if sketch.count > 0:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
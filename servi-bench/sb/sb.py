@@ -12,9 +12,12 @@ from sb.benchmark import Benchmark
 from sb.benchmark_spec import BenchmarkSpec, win_vol
 from sb.provider import Provider
 from sb.aws_trace_analyzer import AwsTraceAnalyzer
-from sb.aws_trace_downloader import AwsTraceDownloader
+from sb.aws_trace_downloader import AwsTraceDownloader, MAX_IN_FLIGHT
 from sb.azure_trace_downloader import AzureTraceDownloader
 import sb.aws_trace_migrator as aws_trace_migrator
+import sb.trace_stats as trace_stats
+from sb.orchestrator import Orchestrator, DEFAULT_PLAN, MAX_WORKERS, LOGS_DIRECTORY
+from sb.trace_files import find_traces_file
 
 
 SB_IMAGE = 'serverless-benchmarker'
@@ -65,9 +68,47 @@ class Sb:
         return Path(__file__).parent.parent.absolute()
 
     @staticmethod
-    def migrate_traces(log_path, replace=False):
-        """Migrates traces from old single-line format to new one trace-per-line format."""
-        aws_trace_migrator.migrate_traces(log_path, replace)
+    def migrate_traces(log_path, replace=False, workers=1):
+        """Migrates traces from old single-line format to new one trace-per-line format.
+        log_path: path to a traces.json file or a logs directory to migrate
+        all traces.json files within the directory tree.
+        workers: number of parallel worker processes for migrating a directory.
+            Example: --workers=4
+        """
+        if Path(log_path).is_dir():
+            aws_trace_migrator.migrate_logs(log_path, replace, workers)
+        else:
+            aws_trace_migrator.migrate_traces(log_path, replace)
+
+    @staticmethod
+    def orchestrate(files, plan=DEFAULT_PLAN, workers=MAX_WORKERS, error_threshold=None,
+                    logs_directory=LOGS_DIRECTORY, retries=0, cleanup_on_error=True,
+                    serialize=None, log_level='INFO', debug=True, local=False):
+        """Runs a plan for multiple independent benchmarks concurrently.
+        Each benchmark runs in its own worker process and logs into
+        `logs_directory/<benchmark_file>.log`. Returns a list of per-benchmark results
+        and saves them to `logs_directory/orchestration_summary.json`.
+        Examples:
+          sb orchestrate 'apps/*/*_benchmark.py' --workers=4
+          sb orchestrate '[a_benchmark.py,b_benchmark.py]' --plan='[prepare,[invoke,{workload_type:10}],get_traces,cleanup]'
+          sb orchestrate 'apps/*/*_benchmark.py' --serialize=invoke (pipelined scheduling)
+        files: list of benchmark files or a glob pattern.
+        plan: list of Sb method names or [method, kwargs] pairs.
+              The Python API additionally supports a picklable function plan(sb).
+        workers: maximum number of concurrently running benchmarks.
+        error_threshold: maximum number of failed benchmarks before all queued benchmarks
+                         are cancelled. Defaults to no threshold.
+        retries: number of retries per failed step. Failed prepares are cleaned up first.
+        cleanup_on_error: cleans up a benchmark after a failed step.
+        serialize: steps that never overlap across benchmarks. Example: --serialize=invoke
+                   prepares and cleans up other benchmarks during an invocation while
+                   invocations run one at a time to avoid measurement interference.
+                   Saves the timeline of all event logs to orchestration_timeline.csv.
+        """  # noqa: E501
+        orchestrator = Orchestrator(files, plan, workers, error_threshold, logs_directory,
+                                    retries, cleanup_on_error, serialize or (),
+                                    log_level=log_level, debug=debug, local=local)
+        return orchestrator.run()
 
     @staticmethod
     def detect_file(file):
@@ -110,6 +151,7 @@ Explicitly specify a unique file using `--file=FILE|pattern`.')
             file: Path or pattern to a benchmark file.
             local: Flag to enable the local execution mode where everything runs locally
                 instead within Docker. Requires local dependency and credentials configuration.
+                spec.run() commands run directly on the host in the benchmark directory.
             debug: Flag to enable debug mode, which auto-mounts sb code into Docker (avoids
                 rebuild of the sb container after code changes) and runs in interactive mode.
             log_level: Python log level: https://docs.python.org/3/library/logging.html#levels
@@ -130,6 +172,17 @@ Explicitly specify a unique file using `--file=FILE|pattern`.')
         self.log_level = log_level
         self.docker = docker
 
+    @property
+    def local(self) -> bool:
+        return self._local
+
+    @local.setter
+    def local(self, local):
+        """Propagates the local execution mode to spec.run() of the benchmark."""
+        self._local = local
+        if self.bench:
+            self.bench.spec.local = local
+
     def initialize(self, file):
         """Detects and bootstraps the sb benchmark with its configuration (i.e., benchmark spec)"""
         bench_file = Sb.detect_file(file)
@@ -221,6 +274,12 @@ Use --log_level=DEBUG to get more details.")
                                Examples: see data/workload_traces.
           seconds_to_skip=3 * 60: number of seconds of a workload trace that are skipped to
                                   alleviate the bootstrapping issue of 0 rps at t=0 seconds.
+          live_metrics_interval=10: seconds between live logs of the k6 latency quantiles
+                                    and achieved rps. Saves k6_latency_sketches.json.
+                                    0 disables live metrics.
+          stage_tolerance=None: maximum error in rps of a compact piecewise-linear encoding
+                                of a workload trace into fewer k6 stages. Logs the actual error.
+                                Example: --stage_tolerance=2 (0 is lossless)
         """
         self.check_bench_init()
         if(self.docker):
@@ -233,41 +292,82 @@ Use --log_level=DEBUG to get more details.")
             self.bench.invoke(workload_type, **kwargs)
         return self
 
-    def get_traces(self):
-        """Downloads distributed request traces for the previous invocation."""
+    def get_traces(self, max_in_flight=MAX_IN_FLIGHT, analyze=False, compression=None):
+        """Downloads distributed request traces for the previous invocation.
+        Re-running resumes an interrupted download or retries unprocessed trace ids (AWS only).
+        max_in_flight: maximum number of concurrent trace download requests (AWS only).
+                       Example: --max_in_flight=16
+        analyze: analyzes the traces while downloading (AWS only, see analyze_traces).
+                 Example: --analyze
+        compression: gz|zst compression of new downloads into traces.json.gz|zst (AWS only).
+                     zst requires zstandard. Example: --compression=zst"""
         self.check_bench_init()
         if(not self.local):
-            self.run_in_docker('get_traces', local=True)
+            args = {'max_in_flight': max_in_flight, 'analyze': analyze, 'compression': compression}
+            self.run_in_docker(f"get_traces {Sb.key_value_args(args)}", local=True)
         else:
             self.bench.chdir()
             self.bench.save_config_to_logs()
             self.bench.save_workload_options_to_logs()
             trace_downloader = None
             if self.bench.spec['provider'] == 'aws':
-                trace_downloader = AwsTraceDownloader(self.bench.spec)
+                trace_downloader = AwsTraceDownloader(self.bench.spec, max_in_flight,
+                                                      compression=compression)
+                trace_analyzer = None
+                if analyze:
+                    log_path = trace_downloader.trace_file(self.bench.spec.logs_directory())
+                    trace_analyzer = AwsTraceAnalyzer(log_path)
+                trace_downloader.get_traces(trace_analyzer)
             elif self.bench.spec['provider'] == 'azure':
                 trace_downloader = AzureTraceDownloader(self.bench.spec)
+                trace_downloader.get_traces()
             else:
                 logging.error('Unsupported provider for trace downloader')
-            trace_downloader.get_traces()
             self.bench.fix_permissions()
         return self
 
-    def analyze_traces(self, log_path=None):
+    def analyze_traces(self, log_path=None, workers=1, cache=False, output_format='csv',
+                       critical_path=False):
         """Creates a trace breakdown analysis with the output files:
         * trace_breakdown.csv for valid traces
         * invalid_traces.csv for invalid traces (e.g., incomplete)
         log_path: path to `traces.json` file with one trace per line.
-                  Defaults to last invocation if not provided."""
+                  Compressed traces.json.gz|zst files are decompressed while reading.
+                  Defaults to last invocation if not provided.
+        workers: number of parallel worker processes. Example: --workers=4
+        cache: reuse cached per-trace results of unchanged traces and ANALYZER_VERSION
+               from trace_analysis_cache.pickle. Example: --cache
+        output_format: csv|parquet|arrow format of the trace breakdown. The columnar
+               parquet and arrow (IPC) formats require pyarrow. Example: --output_format=parquet
+        critical_path: additionally save trace_critical_path.csv|parquet|arrow with one
+               row per critical path entry of every valid trace. Example: --critical_path"""
         # Default to last execution if no log path provided
         if log_path is None:
             self.check_bench_init()
             logs_directory = self.bench.spec.logs_directory()
-            log_path = logs_directory.joinpath('traces.json')
-        trace_analyzer = AwsTraceAnalyzer(log_path)
+            log_path = find_traces_file(logs_directory)
+        trace_analyzer = AwsTraceAnalyzer(log_path, workers, cache, output_format, critical_path)
         trace_analyzer.analyze_traces()
         return self
 
+    def stats(self, log_path=None, exact=None):
+        """Summarizes a trace breakdown (see analyze_traces) with end-to-end and per-category
+        latency quantiles, cold starts, and error rates. Saves trace_stats.json.
+        log_path: path to a trace_breakdown.csv|parquet|arrow file or a logs directory.
+                  Defaults to last invocation if not provided.
+        exact: exact quantiles or approximate quantiles using streaming quantile sketches
+               for breakdowns that do not fit into memory. Defaults to exact quantiles
+               for files up to 256MB. Example: --noexact"""
+        if log_path is None:
+            self.check_bench_init()
+            log_path = self.bench.spec.logs_directory()
+        summary = trace_stats.trace_stats(log_path, exact)
+        trace_stats.log_stats(summary)
+        directory = Path(log_path) if Path(log_path).is_dir() else Path(log_path).parent
+        stats_file = trace_stats.save_stats(summary, directory)
+        logging.info(f"Saved trace statistics to {stats_file}.")
+        return self
+
     def fix_permissions(self):
         """Restores host permissions because a container running as root
         might have created files and directories owned by a root user.
@@ -0,0 +1,98 @@
+import gzip
+import io
+import os
+import shutil
+from pathlib import Path
+
+"""Helpers for reading and writing optionally compressed traces.json files.
+Supported compressions are gzip (traces.json.gz) and Zstandard (traces.json.zst),
+which requires the optional zstandard dependency (>=0.16.0 for reading multiple frames).
+"""
+
+TRACES_FILE = 'traces.json'
+COMPRESSIONS = ['gz', 'zst']
+
+
+def import_zstandard():
+    """Lazily imports the optional zstandard dependency for .zst compression."""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise Exception("Zstandard compression requires zstandard. Install via pip install --editable '.[zstd]'")  # noqa: E501
+
+
+def traces_file_name(compression=None) -> str:
+    """Returns the name of the traces file for a compression (gz|zst) or None."""
+    if compression is None or str(compression) == 'None':
+        return TRACES_FILE
+    if compression not in COMPRESSIONS:
+        raise Exception(f"Unsupported compression {compression}. Supported compressions: {COMPRESSIONS}")  # noqa: E501
+    return f"{TRACES_FILE}.{compression}"
+
+
+def traces_file_names() -> list:
+    """Returns the names of uncompressed and compressed traces files."""
+    return [traces_file_name()] + [traces_file_name(c) for c in COMPRESSIONS]
+
+
+def find_traces_file(directory) -> Path:
+    """Returns the path to the uncompressed or compressed traces file in a directory.
+    Defaults to the uncompressed traces.json if no traces file exists."""
+    for name in traces_file_names():
+        path = Path(directory) / name
+        if path.exists():
+            return path
+    return Path(directory) / TRACES_FILE
+
+
+def compression_of(path):
+    """Returns the compression (gz|zst) of a file based on its suffix or None otherwise."""
+    suffix = Path(path).suffix.lstrip('.')
+    return suffix if suffix in COMPRESSIONS else None
+
+
+def is_compressed(path) -> bool:
+    return compression_of(path) is not None
+
+
+def open_traces(path, mode='rb'):
+    """Opens an optionally compressed traces file in binary mode ('rb' or 'wb')
+    with streaming (de)compression based on the file suffix.
+    Reading supports files with multiple concatenated gzip members or zstd frames."""
+    compression = compression_of(path)
+    if compression == 'gz':
+        return gzip.open(path, mode)
+    if compression == 'zst':
+        zstandard = import_zstandard()
+        if mode == 'rb':
+            decompressor = zstandard.ZstdDecompressor()
+            reader = decompressor.stream_reader(open(path, 'rb'), read_across_frames=True)
+            return io.BufferedReader(reader)
+        return zstandard.ZstdCompressor().stream_writer(open(path, mode))
+    return open(path, mode)
+
+
+def compress(data, compression=None) -> bytes:
+    """Returns the data compressed into a single self-contained gzip member or zstd frame.
+    Concatenated members or frames can be appended to a file and read as a single stream."""
+    if compression == 'gz':
+        return gzip.compress(data)
+    if compression == 'zst':
+        return import_zstandard().ZstdCompressor().compress(data)
+    return data
+
+
+def recompress(path):
+    """Replaces a compressed traces file consisting of many small gzip members or zstd
+    frames (e.g., one per downloaded chunk) with a single stream. A single stream
+    compresses better because the compression window spans many traces.
+    The original file remains intact until the recompressed file replaces it."""
+    if not is_compressed(path):
+        return
+    path = Path(path)
+    # Keep the suffix of the compression
+    tmp_path = path.with_name(f".tmp.{path.name}")
+    with open_traces(path) as source, open_traces(tmp_path, 'wb') as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+    os.replace(tmp_path, path)
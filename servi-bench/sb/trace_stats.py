@@ -0,0 +1,223 @@
+import json
+import logging
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from sb.aws_trace_analyzer import BREAKDOWN_FILES, DURATION_FIELDS, import_pyarrow
+from sb.quantile_sketch import QuantileSketch
+
+"""Aggregate statistics over a trace breakdown (see AwsTraceAnalyzer) including
+end-to-end and per-category latency quantiles, cold starts, and error rates.
+The breakdown is read in chunks of NumPy arrays. Quantiles are exact for files up to
+MAX_EXACT_BYTES and approximated by mergeable quantile sketches for larger files
+such that the memory usage is independent of the number of traces.
+"""
+
+QUANTILES = [0.5, 0.9, 0.95, 0.99]
+# Larger breakdown files are summarized with streaming quantile sketches by default
+MAX_EXACT_BYTES = 256 * 1024 * 1024
+# Number of rows per chunk
+CHUNK_ROWS = 64 * 1024
+COUNT_COLUMNS = ['num_cold_starts', 'errors', 'throttles', 'faults']
+STATS_FILE = 'trace_stats.json'
+
+
+def find_breakdown_file(directory) -> Path:
+    """Returns the trace breakdown in a directory preferring the columnar formats."""
+    for output_format in ['parquet', 'arrow', 'csv']:
+        path = Path(directory) / BREAKDOWN_FILES[output_format]
+        if path.is_file():
+            return path
+    raise Exception(f"No trace breakdown found in {directory}. Run sb analyze_traces first.")
+
+
+def breakdown_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yields dicts of NumPy arrays for chunks of a trace breakdown (csv|parquet|arrow)
+    with latencies in milliseconds (float) and counts (int).
+    Categories missing in a trace (i.e., empty values) do not contribute any latency
+    and are hence 0 such that all categories add up to the duration."""
+    columns = DURATION_FIELDS + COUNT_COLUMNS
+    path = Path(path)
+    if path.suffix == '.csv':
+        dtypes = {field: object for field in DURATION_FIELDS}
+        chunks = pd.read_csv(path, usecols=columns, chunksize=chunk_rows, dtype=dtypes)
+        for chunk in chunks:
+            arrays = {}
+            for field in DURATION_FIELDS:
+                arrays[field] = timedelta_ms(chunk[field])
+            for field in COUNT_COLUMNS:
+                arrays[field] = chunk[field].astype(np.int64).to_numpy()
+            yield fill_missing(arrays)
+        return
+    pa = import_pyarrow()
+    if path.suffix == '.parquet':
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns)
+    else:
+        reader = pa.ipc.open_file(path)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    for batch in batches:
+        arrays = {}
+        for field in DURATION_FIELDS:
+            # Durations are in µs with nulls for missing categories
+            column = batch.column(batch.schema.get_field_index(field)).cast(pa.int64())
+            arrays[field] = column.to_numpy(zero_copy_only=False).astype(np.float64) / 1000
+        for field in COUNT_COLUMNS:
+            column = batch.column(batch.schema.get_field_index(field))
+            arrays[field] = column.to_numpy(zero_copy_only=False).astype(np.int64)
+        yield fill_missing(arrays)
+
+
+def timedelta_ms(column) -> np.ndarray:
+    """Returns the durations in ms of a column with str(timedelta) values or NaN if missing.
+    The common format H:MM:SS.ffffff is parsed vectorized from the character codes
+    and all other values (e.g., with days or without fraction) are parsed by pandas."""
+    strings = column.to_numpy(dtype=str)
+    ms = np.full(len(strings), np.nan)
+    common = np.zeros(len(strings), dtype=bool)
+    width = strings.dtype.itemsize // 4
+    if width >= 14:
+        codes = strings.view(np.uint32).reshape(-1, width)
+        common = (codes[:, 1] == ord(':')) & (codes[:, 4] == ord(':')) & (codes[:, 7] == ord('.'))
+        if width > 14:
+            common &= codes[:, 14] == 0
+        digits = codes[common, :14].astype(np.int64) - ord('0')
+        minutes = digits[:, 2] * 10 + digits[:, 3]
+        seconds = digits[:, 0] * 3600 + minutes * 60 + digits[:, 5] * 10 + digits[:, 6]
+        micros = digits[:, 8:14] @ np.array([100_000, 10_000, 1_000, 100, 10, 1])
+        ms[common] = seconds * 1000 + micros / 1000
+    rest = ~common & column.notna().to_numpy()
+    if rest.any():
+        ms[rest] = pd.to_timedelta(strings[rest]).total_seconds() * 1000
+    return ms
+
+
+def fill_missing(arrays) -> dict:
+    for field in DURATION_FIELDS:
+        if field != 'duration':
+            arrays[field] = np.nan_to_num(arrays[field], nan=0.0)
+    return arrays
+
+
+class TraceStats:
+    """Accumulates aggregate statistics over chunks of a trace breakdown.
+    Latencies are kept as arrays for exact quantiles or as quantile sketches."""
+
+    def __init__(self, exact=True, quantiles=QUANTILES) -> None:
+        self.exact = exact
+        self.quantiles = list(quantiles)
+        self.num_traces = 0
+        self.counts = {field: 0 for field in COUNT_COLUMNS}
+        # Number of traces with at least one cold start, error, throttle, or fault
+        self.traces_with = {field: 0 for field in COUNT_COLUMNS}
+        if exact:
+            self.latencies = {field: [] for field in DURATION_FIELDS}
+        else:
+            self.sketches = {field: QuantileSketch() for field in DURATION_FIELDS}
+
+    def add(self, arrays):
+        self.num_traces += len(arrays['duration'])
+        for field in COUNT_COLUMNS:
+            self.counts[field] += int(arrays[field].sum())
+            self.traces_with[field] += int(np.count_nonzero(arrays[field]))
+        for field in DURATION_FIELDS:
+            if self.exact:
+                self.latencies[field].append(arrays[field])
+            else:
+                self.sketches[field].add(arrays[field])
+
+    def latency_summary(self, field) -> dict:
+        if self.exact:
+            values = np.concatenate(self.latencies[field]) if self.latencies[field] else np.array([])  # noqa: E501
+            if values.size == 0:
+                return {}
+            mean = values.mean()
+            quantiles = np.quantile(values, self.quantiles).tolist()
+            minimum, maximum = values.min(), values.max()
+        else:
+            sketch = self.sketches[field]
+            if sketch.count == 0:
+                return {}
+            mean = sketch.mean()
+            quantiles = sketch.quantiles(self.quantiles)
+            minimum, maximum = sketch.min, sketch.max
+        summary = {'mean': float(mean), 'min': float(minimum)}
+        for q, value in zip(self.quantiles, quantiles):
+            summary[quantile_name(q)] = float(value)
+        summary['max'] = float(maximum)
+        return summary
+
+    def summary(self, num_invalid_traces=None) -> dict:
+        """Returns a JSON-serializable dict of all statistics with latencies in ms."""
+        num_traces = self.num_traces
+        rate = (lambda n: n / num_traces if num_traces > 0 else None)
+        summary = {
+            'method': 'exact' if self.exact else 'sketch',
+            'traces': num_traces,
+            'cold_starts': self.counts['num_cold_starts'],
+            'cold_start_traces': self.traces_with['num_cold_starts'],
+            'cold_start_rate': rate(self.traces_with['num_cold_starts']),
+            'error_rate': rate(self.traces_with['errors']),
+            'throttle_rate': rate(self.traces_with['throttles']),
+            'fault_rate': rate(self.traces_with['faults'])
+        }
+        if num_invalid_traces is not None:
+            summary['invalid_traces'] = num_invalid_traces
+            total = num_traces + num_invalid_traces
+            summary['invalid_rate'] = num_invalid_traces / total if total > 0 else None
+        summary['latency_ms'] = {field: self.latency_summary(field) for field in DURATION_FIELDS}
+        return summary
+
+
+def quantile_name(q) -> str:
+    """Returns the name of a quantile. Example: 0.99 => p99, 0.999 => p99.9"""
+    return f"p{q * 100:g}"
+
+
+def count_invalid_traces(directory):
+    """Returns the number of invalid traces in invalid_traces.csv or None if missing."""
+    path = Path(directory) / 'invalid_traces.csv'
+    if not path.is_file():
+        return None
+    with open(path, 'rb') as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+
+def trace_stats(path, exact=None, quantiles=QUANTILES, chunk_rows=CHUNK_ROWS) -> dict:
+    """Returns aggregate statistics (see TraceStats.summary) for a trace breakdown file
+    or the trace breakdown within a directory. Quantiles are exact unless the file
+    is larger than MAX_EXACT_BYTES or `exact` is explicitly disabled."""
+    path = Path(path)
+    if path.is_dir():
+        path = find_breakdown_file(path)
+    if exact is None:
+        exact = path.stat().st_size <= MAX_EXACT_BYTES
+    stats = TraceStats(exact, quantiles)
+    for arrays in breakdown_chunks(path, chunk_rows):
+        stats.add(arrays)
+    summary = stats.summary(count_invalid_traces(path.parent))
+    summary['breakdown_file'] = path.name
+    return summary
+
+
+def log_stats(summary):
+    """Logs a compact table of the statistics."""
+    logging.info(f"Trace statistics of {summary['traces']} valid traces ({summary['method']}) from {summary['breakdown_file']}:")  # noqa: E501
+    if 'invalid_traces' in summary:
+        logging.info(f"invalid_traces={summary['invalid_traces']} invalid_rate={format_rate(summary['invalid_rate'])}")  # noqa: E501
+    logging.info(f"cold_starts={summary['cold_starts']} cold_start_rate={format_rate(summary['cold_start_rate'])} error_rate={format_rate(summary['error_rate'])} throttle_rate={format_rate(summary['throttle_rate'])} fault_rate={format_rate(summary['fault_rate'])}")  # noqa: E501
+    for field, latency in summary['latency_ms'].items():
+        if latency:
+            values = ' '.join(f"{name}={value:.1f}" for name, value in latency.items())
+            logging.info(f"{field:<25} {values} (ms)")
+
+
+def format_rate(rate) -> str:
+    return 'n/a' if rate is None else f"{rate * 100:.2f}%"
+
+
+def save_stats(summary, directory) -> Path:
+    path = Path(directory) / STATS_FILE
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    return path
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from sb.workload_generator import CHUNK_MINUTES
+
+"""On-disk cache of generated k6 workload options (i.e., workload_options.json).
+Generating the options of a workload trace samples fractional Brownian motion,
+scales, and encodes every second of the trace. Repetitions of a benchmark with the
+same trace, scaling, skipped seconds, and SB_WORKLOADGEN_SEED yield identical
+options and hence copy them from the cache instead.
+Entries are keyed by a hash of these inputs, the content of the trace CSV file,
+and the workload generator source code. The least recently used entries are evicted
+beyond MAX_ENTRIES. The cache directory and size can be configured through the
+environment variables SB_WORKLOAD_CACHE_DIR and SB_WORKLOAD_CACHE_SIZE (0 disables it).
+"""
+
+CACHE_DIRECTORY_ENV = 'SB_WORKLOAD_CACHE_DIR'
+CACHE_SIZE_ENV = 'SB_WORKLOAD_CACHE_SIZE'
+CACHE_DIRECTORY = Path.home() / '.cache' / 'sb' / 'workload_options'
+MAX_ENTRIES = 32
+SUFFIX = '.json'
+# Metadata of an entry (e.g., the stage_error of the options) next to the options file
+METADATA_SUFFIX = '.meta'
+
+
+def generator_version() -> str:
+    """Returns a hash of the workload generator source code.
+    Cached options of a different generator version are invalid."""
+    source = (Path(__file__).parent / 'workload_generator.py').read_bytes()
+    return hashlib.sha256(source).hexdigest()
+
+
+def file_hash(path) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def cache_key(generator, chunk_minutes=CHUNK_MINUTES) -> str:
+    """Returns the cache key of the options generated by a WorkloadGenerator
+    or None for workloads without a trace (e.g., single), which are cheap to generate."""
+    if generator.workload_trace_file is None:
+        return None
+    inputs = {
+        'workload_type': str(generator.workload_type),
+        'trace_hash': file_hash(generator.workload_trace_file),
+        'scale_factor': generator.scale_factor,
+        'scale_type': generator.scale_type,
+        'seconds_to_skip': generator.seconds_to_skip,
+        'stage_tolerance': generator.stage_tolerance,
+        'seed': generator.rng_seed,
+        'chunk_minutes': chunk_minutes,
+        'version': generator_version()
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+class WorkloadOptionsCache:
+    """Directory of cached options files named by their cache key.
+    The modification time of an entry marks its last use for the LRU eviction."""
+
+    def __init__(self, directory=None, max_entries=None) -> None:
+        if directory is None:
+            directory = os.getenv(CACHE_DIRECTORY_ENV, CACHE_DIRECTORY)
+        if max_entries is None:
+            max_entries = int(os.getenv(CACHE_SIZE_ENV, MAX_ENTRIES))
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def path(self, key) -> Path:
+        return self.directory / f"{key}{SUFFIX}"
+
+    def metadata_path(self, key) -> Path:
+        return self.directory / f"{key}{METADATA_SUFFIX}"
+
+    def metadata(self, key) -> dict:
+        """Returns the metadata stored with an entry or an empty dict."""
+        try:
+            with open(self.metadata_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key, destination) -> bool:
+        """Copies the cached options of a key to `destination`.
+        Returns False if the key is not cached."""
+        path = self.path(key)
+        try:
+            shutil.copyfile(path, destination)
+            # Mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            # Missing or concurrently evicted
+            return False
+        return True
+
+    def put(self, key, source, metadata=None):
+        """Adds a copy of the options file `source` with optional `metadata` (dict)
+        and evicts the least recently used entries.
+        Failures are logged because caching must never interrupt a benchmark."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Metadata first such that a visible entry always has its metadata
+            if metadata:
+                with open(self.metadata_path(key), 'w') as f:
+                    json.dump(metadata, f)
+            # Write atomically such that concurrent benchmarks never read partial entries
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            os.close(fd)
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, self.path(key))
+            self.evict()
+        except OSError as e:
+            logging.warning(f"Failed to cache workload options in {self.directory}: {e}")
+
+    def evict(self):
+        entries = []
+        for path in self.directory.glob(f"*{SUFFIX}"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                pass
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            for file in [path, path.with_suffix(METADATA_SUFFIX)]:
+                try:
+                    file.unlink()
+                except FileNotFoundError:
+                    # Concurrently evicted or without metadata
+                    pass
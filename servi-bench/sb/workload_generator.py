@@ -1,10 +1,16 @@
 from pathlib import Path
+import json
+import logging
 import os
 import numpy as np
 import pandas as pd
 from stochastic.processes.continuous import FractionalBrownianMotion
 import stochastic
 
+# Number of minutes per window of the chunked workload generation (see iter_per_second_rates).
+# The long-range correlation of the generated fractional Brownian motion holds within a window.
+CHUNK_MINUTES = 24 * 60
+
 
 class WorkloadGenerator:
 
@@ -16,10 +22,14 @@ class WorkloadGenerator:
     }
 
     def __init__(self, workload_type, scale_factor=1, scale_type='linear', workload_trace=None,
-                 seconds_to_skip=3 * 60):
+                 seconds_to_skip=3 * 60, stage_tolerance=None):
         self.workload_type = workload_type
         self.workload_trace_file = None
         self.seconds_to_skip = seconds_to_skip
+        # Maximum absolute error in rps of the compact stage encoding (None uses K6StageEncoder)
+        self.stage_tolerance = stage_tolerance
+        # Error summary of the last compact stage encoding (see stage_error)
+        self.stage_error = None
         # Seed random number generator for stochastic library
         self.rng_seed = int(os.getenv('SB_WORKLOADGEN_SEED', 42))
         stochastic.random.seed(self.rng_seed)
@@ -68,25 +78,19 @@ class WorkloadGenerator:
         }
         return options
 
+    def per_minute_rates(self, per_minute_rates_file_path=None) -> np.ndarray:
+        path = per_minute_rates_file_path or self.workload_trace_file
+        return pd.read_csv(path)['InvocationsPerMinute'].values
+
     def upscale_trace(self, per_minute_rates_file_path, scale_factor=1, scale_type='linear'):
-        per_minute_rates_arr = pd.read_csv(per_minute_rates_file_path)['InvocationsPerMinute'].values  # noqa E501
+        per_minute_rates_arr = self.per_minute_rates(per_minute_rates_file_path)
 
         bm = FractionalBrownianMotion(hurst=0.8, t=10)
         magnitude_multiplier = 100  # Need to increase magnitude or values become too small
         samples = bm.sample(60 * len(per_minute_rates_arr)) * magnitude_multiplier
         all_bm_samples = samples + np.abs(np.floor(samples.min()))
 
-        per_second_rates = np.array([])
-        for i in range(len(per_minute_rates_arr)):
-            current_rate_minute = per_minute_rates_arr[i]
-            bm_samples = all_bm_samples[i * 60:(i + 1) * 60]
-
-            # Scale random samples by actual request rate per minute
-            total_units = bm_samples.sum()
-            requests_per_unit = current_rate_minute / total_units
-            upscaled_samples = bm_samples * requests_per_unit
-
-            per_second_rates = np.append(per_second_rates, upscaled_samples)
+        per_second_rates = self.scale_minutes(all_bm_samples, per_minute_rates_arr)
 
         scaled_per_second_rates = None
         if scale_type == 'linear':
@@ -106,39 +110,106 @@ class WorkloadGenerator:
 
         return np.round(scaled_per_second_rates)
 
-    def encode_for_k6(self, per_second_rates) -> dict:
-        # Run length encoding merges contiguous seconds with the same request rate
-        n = len(per_second_rates)
-        element_does_not_match_prev = per_second_rates[1:] != per_second_rates[:-1]
-        positions_where_element_does_not_match = np.append(np.where(element_does_not_match_prev), n - 1)  # noqa E501
-        run_lengths = np.diff(np.append(-1, positions_where_element_does_not_match))
-        key_elements = per_second_rates[positions_where_element_does_not_match]
-        pre_allocated_vus = int(np.ceil(np.max(per_second_rates) / 10))
-        start_rate = 0
-        if len(key_elements) > 0:
-            start_rate = int(key_elements[0])
+    def scale_minutes(self, bm_samples, per_minute_rates) -> np.ndarray:
+        """Returns per-second rates scaling 60 random samples per minute by the request rate
+        of the minute. Surplus samples are unused because sample(n) returns n + 1 values."""
+        # One row of 60 per-second samples per minute
+        num_minutes = len(per_minute_rates)
+        minute_samples = bm_samples[:60 * num_minutes].reshape(num_minutes, 60)
+        # Scale random samples by actual request rate per minute
+        total_units = minute_samples.sum(axis=1)
+        requests_per_unit = per_minute_rates / total_units
+        return (minute_samples * requests_per_unit[:, np.newaxis]).ravel()
 
-        stage_list = []
-        for i in range(len(key_elements)):
-            duration_in_seconds = int(run_lengths[i])
-            target = int(key_elements[i])
-            # Split longer stages than 1s to model sharp transitions
-            # instead of linearly ramping up/down.
-            # Skip splitting for first stage and use startRate instead.
-            if duration_in_seconds > 1 and i > 0:
-                stage_list.append({
-                    'target': target,
-                    'duration': '1s'
-                })
-                stage_list.append({
-                    'target': target,
-                    'duration': str(duration_in_seconds - 1) + 's'
-                })
-            else:
-                stage_list.append({
-                    'target': target,
-                    'duration': str(duration_in_seconds) + 's'
-                })
+    def iter_per_second_rates(self, per_minute_rates_file_path=None, scale_factor=None,
+                              chunk_minutes=CHUNK_MINUTES):
+        """Yields the linearly scaled per-second rates of a trace in windows of `chunk_minutes`
+        such that only a single window is held in memory.
+        Approximation: every window samples an independent fractional Brownian motion path
+        with the same time resolution as sampling the entire trace at once and continues
+        at the last value of the previous window. Hence, the path is continuous but the
+        long-range correlation of its increments (hurst=0.8) only holds within a window
+        and restarts at window boundaries. Longer windows trade memory for fidelity.
+        All windows are shifted by the same offset for non-negative samples based on the
+        global minimum of the path, which requires sampling the path twice (same seed).
+        A trace that fits into a single window yields the same rates as upscale_trace."""
+        if self.scale_type != 'linear':
+            raise Exception(f"Chunked workload generation only supports linear scaling but got {self.scale_type}.")  # noqa: E501
+        per_minute_rates_arr = self.per_minute_rates(per_minute_rates_file_path)
+        if scale_factor is None:
+            scale_factor = self.scale_factor
+        # First pass: global minimum of the path without keeping the windows
+        min_sample = min(samples.min() for _, samples in
+                         self.iter_bm_windows(per_minute_rates_arr, chunk_minutes))
+        offset = np.abs(np.floor(min_sample))
+        for rates, samples in self.iter_bm_windows(per_minute_rates_arr, chunk_minutes):
+            yield np.round(self.scale_minutes(samples + offset, rates) * scale_factor)
+
+    def iter_bm_windows(self, per_minute_rates, chunk_minutes=CHUNK_MINUTES):
+        """Yields tuples (rates, samples) of the per-minute rates and the unshifted fractional
+        Brownian motion samples of each window. Re-seeds the random number generator such
+        that repeated iterations yield the same samples."""
+        stochastic.random.seed(self.rng_seed)
+        num_minutes = len(per_minute_rates)
+        magnitude_multiplier = 100  # Need to increase magnitude or values become too small
+        last_sample = 0.0
+        for start in range(0, num_minutes, int(chunk_minutes)):
+            rates = per_minute_rates[start:start + int(chunk_minutes)]
+            bm = FractionalBrownianMotion(hurst=0.8, t=10 * len(rates) / num_minutes)
+            samples = bm.sample(60 * len(rates)) * magnitude_multiplier + last_sample
+            # The surplus last sample is the start of the next window
+            last_sample = samples[-1]
+            yield rates, samples
+
+    def iter_k6_stages(self, chunk_minutes=CHUNK_MINUTES, encoder=None):
+        """Yields lists of k6 stages for windows of the workload trace (see
+        iter_per_second_rates) skipping the first `seconds_to_skip` as generate_trace.
+        The `encoder` (see stage_encoder) provides the startRate and preAllocatedVUs
+        after the last window."""
+        if encoder is None:
+            encoder = self.stage_encoder()
+        num_seconds = 60 * len(self.per_minute_rates())
+        to_skip = self.seconds_to_skip if num_seconds > self.seconds_to_skip else 0
+        for per_second_rates in self.iter_per_second_rates(chunk_minutes=chunk_minutes):
+            skipped = min(to_skip, len(per_second_rates))
+            to_skip -= skipped
+            stages = encoder.add(per_second_rates[skipped:])
+            if stages:
+                yield stages
+        stages = encoder.finish()
+        if stages:
+            yield stages
+
+    def write_k6_options(self, file, chunk_minutes=CHUNK_MINUTES):
+        """Writes the k6 options JSON into an open text `file`.
+        Stages of linearly scaled workload traces are generated and written in windows
+        of `chunk_minutes` with bounded memory. Other workloads use generate_trace."""
+        if self.workload_trace_file is None or self.scale_type != 'linear':
+            json.dump(self.generate_trace(), file)
+            return
+        encoder = self.stage_encoder()
+        file.write('{"scenarios": {"benchmark_scenario": {"executor": "ramping-arrival-rate", "timeUnit": "1s", "stages": [')  # noqa: E501
+        separator = ''
+        for stages in self.iter_k6_stages(chunk_minutes, encoder):
+            for stage in stages:
+                file.write(separator + json.dumps(stage))
+                separator = ', '
+        self.stage_error = stage_error(encoder)
+        log_stage_error(self.stage_error)
+        file.write(f'], "startRate": {encoder.start_rate or 0}, "preAllocatedVUs": {encoder.pre_allocated_vus()}}}}}}}')  # noqa: E501
+
+    def stage_encoder(self):
+        """Returns a new K6StageEncoder or a LinearStageEncoder if a stage_tolerance is set."""
+        if self.stage_tolerance is None:
+            return K6StageEncoder()
+        return LinearStageEncoder(float(self.stage_tolerance))
+
+    def encode_for_k6(self, per_second_rates) -> dict:
+        encoder = self.stage_encoder()
+        stage_list = encoder.add(per_second_rates) + encoder.finish()
+        self.stage_error = stage_error(encoder)
+        log_stage_error(self.stage_error)
+        start_rate = encoder.start_rate or 0
 
         # reference for this object:
         # https://k6.io/docs/using-k6/scenarios/executors/ramping-arrival-rate
@@ -148,10 +219,202 @@ class WorkloadGenerator:
                     'executor': 'ramping-arrival-rate',
                     'startRate': start_rate,
                     'timeUnit': '1s',
-                    'preAllocatedVUs': pre_allocated_vus,
+                    'preAllocatedVUs': encoder.pre_allocated_vus(),
                     'stages': stage_list
                 }
             }
         }
 
         return config_object
+
+
+class K6StageEncoder:
+    """Incrementally encodes per-second rates into k6 ramping-arrival-rate stages.
+    Run length encoding merges contiguous seconds with the same request rate,
+    including runs that continue across consecutive chunks of rates."""
+
+    def __init__(self) -> None:
+        self.start_rate = None
+        self.max_rate = None
+        self.num_runs = 0
+        # Last run that might continue in the next chunk
+        self.run_target = None
+        self.run_length = 0
+
+    def add(self, per_second_rates) -> list:
+        """Returns the stages of all runs completed by a chunk of per-second rates."""
+        n = len(per_second_rates)
+        if n == 0:
+            return []
+        # Run length encoding merges contiguous seconds with the same request rate
+        element_does_not_match_prev = per_second_rates[1:] != per_second_rates[:-1]
+        positions_where_element_does_not_match = np.append(np.where(element_does_not_match_prev), n - 1)  # noqa E501
+        run_lengths = np.diff(np.append(-1, positions_where_element_does_not_match))
+        key_elements = per_second_rates[positions_where_element_does_not_match]
+        max_rate = np.max(per_second_rates)
+        self.max_rate = max_rate if self.max_rate is None else max(self.max_rate, max_rate)
+        if self.start_rate is None:
+            self.start_rate = int(key_elements[0])
+        stage_list = []
+        if self.run_length > 0:
+            if key_elements[0] == self.run_target:
+                run_lengths[0] += self.run_length
+            else:
+                stage_list += self.run_stages(self.run_target, self.run_length)
+        for target, duration_in_seconds in zip(key_elements[:-1], run_lengths[:-1]):
+            stage_list += self.run_stages(target, duration_in_seconds)
+        self.run_target = key_elements[-1]
+        self.run_length = int(run_lengths[-1])
+        return stage_list
+
+    def finish(self) -> list:
+        """Returns the stages of the last run."""
+        stage_list = []
+        if self.run_length > 0:
+            stage_list = self.run_stages(self.run_target, self.run_length)
+        self.run_length = 0
+        return stage_list
+
+    def run_stages(self, target, duration_in_seconds) -> list:
+        duration_in_seconds = int(duration_in_seconds)
+        target = int(target)
+        is_first = self.num_runs == 0
+        self.num_runs += 1
+        # Split longer stages than 1s to model sharp transitions
+        # instead of linearly ramping up/down.
+        # Skip splitting for first stage and use startRate instead.
+        if duration_in_seconds > 1 and not is_first:
+            return [
+                {
+                    'target': target,
+                    'duration': '1s'
+                },
+                {
+                    'target': target,
+                    'duration': str(duration_in_seconds - 1) + 's'
+                }
+            ]
+        return [{
+            'target': target,
+            'duration': str(duration_in_seconds) + 's'
+        }]
+
+    def pre_allocated_vus(self) -> int:
+        if self.max_rate is None:
+            return 0
+        return int(np.ceil(self.max_rate / 10))
+
+
+class LinearStageEncoder:
+    """Incrementally encodes per-second rates into a compact piecewise-linear approximation
+    with k6 ramping-arrival-rate stages, which ramp linearly from the previous target.
+    The rate of second i is the target at time i. Every stage ends at the rate of an actual
+    second and spans as many seconds as the linear ramp stays within `tolerance` rps of
+    all rates in between (swing door compression). Hence, constant runs and steady ramps
+    become single stages. A tolerance of 0 is lossless.
+    The absolute errors of the approximation against the per-second rates are tracked."""
+
+    def __init__(self, tolerance=0) -> None:
+        if tolerance < 0:
+            raise Exception(f"The stage tolerance must not be negative but got {tolerance}.")
+        self.tolerance = tolerance
+        self.start_rate = None
+        self.max_rate = None
+        self.num_stages = 0
+        # Second and rate where the current stage starts
+        self.anchor = None
+        # Rates of the seconds after the anchor in the current stage
+        self.rates = []
+        # Range of slopes of a ramp from the anchor within the tolerance of all rates
+        self.min_slope = -np.inf
+        self.max_slope = np.inf
+        self.second = 0
+        self.max_error = 0.0
+        self.sum_error = 0.0
+        self.num_seconds = 0
+
+    def add(self, per_second_rates) -> list:
+        """Returns the stages completed by a chunk of per-second rates."""
+        if len(per_second_rates) == 0:
+            return []
+        max_rate = np.max(per_second_rates)
+        self.max_rate = max_rate if self.max_rate is None else max(self.max_rate, max_rate)
+        stage_list = []
+        for rate in np.asarray(per_second_rates).tolist():
+            self.num_seconds += 1
+            if self.anchor is None:
+                self.start_rate = int(rate)
+                self.anchor = (self.second, rate)
+                self.second += 1
+                continue
+            anchor_second, anchor_rate = self.anchor
+            duration = self.second - anchor_second
+            slope = (rate - anchor_rate) / duration
+            if not self.min_slope <= slope <= self.max_slope:
+                # The previous second ends the stage and anchors the next one
+                stage_list.append(self.close_stage())
+                anchor_second, anchor_rate = self.anchor
+                duration = self.second - anchor_second
+            self.rates.append(rate)
+            self.min_slope = max(self.min_slope, (rate - self.tolerance - anchor_rate) / duration)
+            self.max_slope = min(self.max_slope, (rate + self.tolerance - anchor_rate) / duration)
+            self.second += 1
+        return stage_list
+
+    def close_stage(self) -> dict:
+        """Returns the stage from the anchor to the last added second, which becomes the anchor."""
+        anchor_second, anchor_rate = self.anchor
+        rates = np.array(self.rates, dtype=np.float64)
+        duration = len(rates)
+        ramp = anchor_rate + (rates[-1] - anchor_rate) * np.arange(1, duration + 1) / duration
+        errors = np.abs(ramp - rates)
+        self.max_error = max(self.max_error, float(errors.max()))
+        self.sum_error += float(errors.sum())
+        self.anchor = (anchor_second + duration, rates[-1])
+        self.rates = []
+        self.min_slope = -np.inf
+        self.max_slope = np.inf
+        self.num_stages += 1
+        return {'target': int(rates[-1]), 'duration': f"{duration}s"}
+
+    def finish(self) -> list:
+        """Returns the last stage and a final stage holding the last rate for one second
+        such that the stages last as many seconds as there are rates."""
+        if self.anchor is None:
+            return []
+        stage_list = []
+        if self.rates:
+            stage_list.append(self.close_stage())
+        self.num_stages += 1
+        stage_list.append({'target': int(self.anchor[1]), 'duration': '1s'})
+        self.anchor = None
+        return stage_list
+
+    def pre_allocated_vus(self) -> int:
+        if self.max_rate is None:
+            return 0
+        return int(np.ceil(self.max_rate / 10))
+
+    def error_summary(self) -> dict:
+        """Returns the number of stages and the maximum and mean absolute error in rps of
+        the encoded rate curve against the per-second rates."""
+        return {
+            'stages': self.num_stages,
+            'seconds': self.num_seconds,
+            'max_error': self.max_error,
+            'mean_error': self.sum_error / self.num_seconds if self.num_seconds > 0 else 0.0
+        }
+
+
+def stage_error(encoder) -> dict:
+    """Returns the error summary including the tolerance of a LinearStageEncoder
+    or None for the lossless K6StageEncoder."""
+    if isinstance(encoder, LinearStageEncoder):
+        return dict(encoder.error_summary(), tolerance=encoder.tolerance)
+    return None
+
+
+def log_stage_error(summary):
+    """Logs a stage_error summary (e.g., also for cached workload options)."""
+    if summary:
+        logging.info(f"Encoded {summary['seconds']}s of per-second rates into {summary['stages']} k6 stages with tolerance={summary['tolerance']:g}rps max_error={summary['max_error']:.2f}rps mean_error={summary['mean_error']:.3f}rps")  # noqa: E501
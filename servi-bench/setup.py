@@ -19,8 +19,6 @@ setup(
         'PyYAML>=6.0,<7',
         # Deep merge for benchmark config
         'mergedeep>=1.3.4,<2',
-        # Graph-based trace analysis
-        'networkx>=2.6.3,<3',
         # peekable iterator for trace breakdown extraction
         'more-itertools>=8.12.0,<9',
         # Workload generation
@@ -37,6 +35,23 @@ setup(
         'dev': [
             'pytest>=6.2.5,<7',
             'flake8>=4.0.1,<5'
+        ],
+        # Columnar trace breakdown output via sb analyze_traces --output_format=parquet
+        'parquet': [
+            'pyarrow>=6.0.1'
+        ],
+        # Zstandard-compressed traces via sb get_traces --compression=zst
+        'zstd': [
+            # Multi-frame reads via stream_reader(read_across_frames=True) verified since 0.16.0
+            'zstandard>=0.16.0'
+        ],
+        # Faster JSON decoding of traces (select via SB_JSON_BACKEND=orjson|msgspec|json)
+        'fastjson': [
+            'orjson>=3.6.0'
+        ],
+        # Python load generator as alternative to k6 via the benchmark config load_generator: python
+        'loadgen': [
+            'aiohttp>=3.8.1,<4'
         ]
     },
     entry_points='''
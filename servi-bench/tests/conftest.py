@@ -1,6 +1,8 @@
 from pathlib import Path
 import logging
 import shutil
+import pytest
+from sb.workload_cache import CACHE_DIRECTORY_ENV
 
 tests_dir = Path(__file__).parent
 fixtures_dir = tests_dir.joinpath('fixtures')
@@ -18,3 +20,11 @@ def pytest_sessionstart(session):
             else:
                 logging.debug(f"rm-dir:{path}")
                 shutil.rmtree(path)
+
+
+@pytest.fixture(autouse=True, scope='session')
+def workload_cache_dir(tmp_path_factory):
+    """Keeps the workload options cached by tests out of the user's home directory."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv(CACHE_DIRECTORY_ENV, str(tmp_path_factory.mktemp('workload_cache')))
+        yield
@@ -22,3 +22,17 @@ def test_check_on_prepare(sb):
 def test_no_check_on_cleanup(sb):
     """All cleanup commands should be executed even if some spec.run commands fail"""
     sb.cleanup()
+
+
+@pytest.mark.local
+def test_check_on_prepare_local(sb):
+    sb.local = True
+    exception_msg = r"The spec.run\(\) command `false` exited unsuccessfully\..*"
+    with pytest.raises(Exception, match=exception_msg):
+        sb.prepare()
+
+
+@pytest.mark.local
+def test_no_check_on_cleanup_local(sb):
+    sb.local = True
+    sb.cleanup()
@@ -26,3 +26,12 @@ def test_dollar_sign_docker(sb):
     cmd = "echo '  POST - https://abcdef1234.execute-api.us-east-1.amazonaws.com/production/upload' | awk '{print $3}'"  # noqa: E501
     out = spec.run(cmd).rstrip()
     assert out == 'https://abcdef1234.execute-api.us-east-1.amazonaws.com/production/upload'
+
+
+@pytest.mark.local
+def test_dollar_sign_local(sb):
+    sb.local = True
+    spec = sb.bench.spec
+    cmd = "echo '  POST - https://abcdef1234.execute-api.us-east-1.amazonaws.com/production/upload' | awk '{print $3}'"  # noqa: E501
+    out = spec.run(cmd).rstrip()
+    assert out == 'https://abcdef1234.execute-api.us-east-1.amazonaws.com/production/upload'
@@ -1,3 +1,4 @@
+import re
 from pathlib import Path
 import subprocess
 import platform
@@ -22,6 +23,25 @@ def test_mock_sample_benchmark(sb):
     assert sb.bench.spec['git_version'] == '2.30.1'
 
 
+@pytest.mark.local
+@pytest.mark.skipif(platform.system() == 'Windows',
+                    reason="shell pwd command incompatible for local Windows execution")
+def test_mock_sample_benchmark_local(sb):
+    """Runs spec.run() commands directly on the host (requires a local git installation)."""
+    sb.local = True
+    sb.test()
+    assert sb.bench.spec['result'] == 'my-function.com'
+    assert re.match(r'\d+\.\d+', sb.bench.spec['git_version'])
+
+
+@pytest.mark.local
+def test_local_run_in_benchmark_directory(sb):
+    sb.local = True
+    spec = sb.bench.spec
+    assert spec.run('pwd').rstrip() == str(bench_file.parent)
+    assert spec.run('echo $HOME').rstrip() == str(Path.home())
+
+
 @pytest.mark.cli
 @pytest.mark.skipif(platform.system() == 'Windows',
                     reason="shell pwd command incompatible for local Windows execution")
@@ -0,0 +1,50 @@
+import logging
+import time
+from pathlib import Path
+import pytest
+from sb.sb import Sb
+
+tests_path = Path(__file__).parent.parent
+sub_path = 'fixtures/empty/empty_benchmark.py'
+bench_file = (tests_path / sub_path).resolve()
+
+
+@pytest.fixture
+def sb():
+    return Sb(bench_file, log_level='DEBUG', debug=True)
+
+
+def test_run_many(sb):
+    spec = sb.bench.spec
+    results = spec.run_many(['echo a', 'echo b', {'cmd': 'echo $HOSTNAME', 'image': 'alpine:3'}])
+    assert [result.output.rstrip() for result in results[:2]] == ['a', 'b']
+    assert [result.returncode for result in results] == [0, 0, 0]
+
+
+@pytest.mark.local
+def test_run_many_local_concurrent(sb, caplog):
+    sb.local = True
+    spec = sb.bench.spec
+    cmds = [f"sleep 0.5 && echo {i}" for i in range(4)]
+    start = time.monotonic()
+    with caplog.at_level(logging.INFO):
+        results = spec.run_many(cmds, max_parallel=4)
+    assert time.monotonic() - start < 1.5
+    assert [result.output for result in results] == ['0\n', '1\n', '2\n', '3\n']
+    assert [result.cmd for result in results] == cmds
+    assert '[2] 2' in caplog.messages
+
+
+@pytest.mark.local
+def test_run_many_local_failures(sb):
+    sb.local = True
+    spec = sb.bench.spec
+    results = spec.run_many(['true', 'echo failed && exit 2'], check=False)
+    assert [result.returncode for result in results] == [0, 2]
+    assert [result.success for result in results] == [True, False]
+    assert results[1].output == 'failed\n'
+    assert not spec.last_run_success
+    with pytest.raises(Exception, match=r"1/3 spec.run_many\(\) commands failed:\n\[1\] The spec.run\(\) command `exit 3`"):  # noqa: E501
+        spec.run_many(['true', 'exit 3', 'true'], check=True, max_parallel=1)
+    spec.run_many(['true'])
+    assert spec.last_run_success
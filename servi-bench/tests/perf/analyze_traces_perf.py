@@ -0,0 +1,57 @@
+"""Benchmarks the throughput of the trace analysis for different numbers of workers.
+Builds a synthetic traces.json by repeating the aws_trace_analyzer test fixtures and
+validates that the parallel output is byte-identical to the serial output.
+Usage: python tests/perf/analyze_traces_perf.py --repetitions=2000 --workers=1,2,4,8
+"""
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+import fire
+
+from sb.aws_trace_analyzer import AwsTraceAnalyzer
+
+fixtures_dir = Path(__file__).parent.parent / 'fixtures' / 'aws_trace_analyzer'
+
+
+def fixture_traces() -> list:
+    """Returns the single-line JSON encoding of all fixture traces."""
+    lines = []
+    for path in sorted(fixtures_dir.glob('*/traces.json')):
+        with open(path) as json_file:
+            lines.append(json.dumps(json.load(json_file)) + '\n')
+    return lines
+
+
+def write_synthetic_traces(path, repetitions) -> int:
+    """Writes the fixture traces `repetitions` times into `path` and
+    returns the number of traces written."""
+    lines = fixture_traces()
+    with open(path, 'w') as f:
+        for _ in range(repetitions):
+            f.writelines(lines)
+    return len(lines) * repetitions
+
+
+def main(repetitions=500, workers=(1, 2, 4, os.cpu_count())):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        traces_file = Path(tmp_dir) / 'traces.json'
+        num_traces = write_synthetic_traces(traces_file, repetitions)
+        size_mb = traces_file.stat().st_size / 1024 / 1024
+        print(f"traces={num_traces} size={size_mb:.1f}MB cpus={os.cpu_count()}")
+        reference = None
+        for num_workers in sorted(set(workers)):
+            start = time.perf_counter()
+            AwsTraceAnalyzer(traces_file, num_workers).analyze_traces()
+            elapsed = time.perf_counter() - start
+            output = (traces_file.parent / 'trace_breakdown.csv').read_bytes() + \
+                (traces_file.parent / 'invalid_traces.csv').read_bytes()
+            if reference is None:
+                reference = output
+            identical = output == reference
+            print(f"workers={num_workers} time={elapsed:.2f}s traces/sec={num_traces / elapsed:.0f} identical={identical}")  # noqa: E501
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
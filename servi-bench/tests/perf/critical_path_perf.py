@@ -0,0 +1,71 @@
+"""Stress benchmark of the critical path extraction (longest_path and call_stack)
+on synthetic traces with thousands of subsegments. Every trace consists of a chain of
+`depth` nested synchronous segments (e.g., deep Step Functions workflows) where every
+segment has `fanout` sequential subsegments and the last segment invokes an asynchronous
+segment that ends after the root. Reports the time per trace of the span graph
+construction and the critical path extraction.
+Usage: python tests/perf/critical_path_perf.py --depths=10,100,1000,5000 --fanout=10
+"""
+import json
+import time
+import fire
+
+from sb.aws_trace_analyzer import call_stack, create_span_graph, longest_path
+
+# Time step between nested segments in seconds
+STEP = 0.001
+
+
+def segment(id, start_time, end_time, parent_id=None, subsegments=None) -> dict:
+    doc = {'id': id, 'name': id, 'start_time': start_time, 'end_time': end_time}
+    if parent_id is not None:
+        doc['parent_id'] = parent_id
+    if subsegments:
+        doc['subsegments'] = subsegments
+    return doc
+
+
+def synthetic_trace(depth, fanout) -> dict:
+    """Returns a trace in the traces.json format with depth * (fanout + 1) + 1 spans."""
+    base = 1_600_000_000.0
+    end = base + 2 * depth * STEP * (fanout + 1)
+    docs = []
+    for i in range(depth):
+        start_time = base + i * STEP * (fanout + 1)
+        end_time = end - i * STEP * (fanout + 1)
+        # Sequential subsegments before the nested segment starts
+        subsegments = [segment(f"s{i}-{j}", start_time + j * STEP, start_time + (j + 1) * STEP)
+                       for j in range(fanout)]
+        parent_id = f"n{i - 1}" if i > 0 else None
+        docs.append(segment(f"n{i}", start_time, end_time, parent_id, subsegments))
+    # Asynchronous invocation that ends after the root
+    last = docs[-1]
+    docs.append(segment('async', last['end_time'] - STEP, end + STEP, last['id']))
+    return {
+        'Id': f"1-synthetic-{depth}-{fanout}",
+        'Duration': round(end + STEP - base, 3),
+        'LimitExceeded': False,
+        'Segments': [{'Id': doc['id'], 'Document': json.dumps(doc)} for doc in docs]
+    }
+
+
+def main(depths=(10, 100, 1000, 5000), fanout=10, iterations=3):
+    for depth in depths:
+        trace = synthetic_trace(depth, fanout)
+        try:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                G = create_span_graph(trace)
+            graph_time = (time.perf_counter() - start) / iterations
+            start = time.perf_counter()
+            for _ in range(iterations):
+                G.graph['call_stack'] = call_stack(G, G.graph['end'])
+                path = longest_path(G, G.graph['start'])
+            path_time = (time.perf_counter() - start) / iterations
+            print(f"depth={depth} spans={len(G)} graph={graph_time * 1000:.1f}ms critical_path={path_time * 1000:.1f}ms path_length={len(path)}")  # noqa: E501
+        except RecursionError as e:
+            print(f"depth={depth} spans={depth * (fanout + 1) + 1} failed: {e}")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,54 @@
+"""Micro-benchmarks the JSON decoding cost per trace for all installed JSON backends.
+Decoding a trace comprises the outer traces.json line and the JSON document of every
+segment. The decoding share is relative to the full analysis (decoding and breakdown)
+of the aws_trace_analyzer test fixtures with the respective backend.
+Usage: python tests/perf/json_decode_perf.py --repetitions=200
+"""
+import json
+import time
+from pathlib import Path
+import fire
+
+import sb.json_backend as json_backend
+from sb.aws_trace_analyzer import analyze_trace
+from sb.json_backend import installed_backends, load_backend
+
+fixtures_dir = Path(__file__).parent.parent / 'fixtures' / 'aws_trace_analyzer'
+
+
+def fixture_lines() -> list:
+    lines = []
+    for path in sorted(fixtures_dir.glob('*/traces.json')):
+        with open(path) as json_file:
+            lines.append(json.dumps(json.load(json_file)).encode())
+    return lines
+
+
+def decode(loads, line):
+    trace = loads(line)
+    return [loads(segment['Document']) for segment in trace['Segments']]
+
+
+def main(repetitions=200):
+    lines = fixture_lines()
+    num_traces = len(lines) * repetitions
+    num_segments = sum(len(json.loads(line)['Segments']) for line in lines)
+    print(f"traces={num_traces} segments/trace={num_segments / len(lines):.1f} default={json_backend.backend}")  # noqa: E501
+    for backend in installed_backends():
+        loads = load_backend(backend)
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            for line in lines:
+                decode(loads, line)
+        decode_time = time.perf_counter() - start
+        json_backend.loads = loads
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            for line in lines:
+                analyze_trace(loads(line))
+        analysis_time = time.perf_counter() - start
+        print(f"backend={backend} decode={decode_time / num_traces * 1e6:.0f}µs/trace analysis={analysis_time / num_traces * 1e6:.0f}µs/trace decode_share={decode_time / analysis_time:.0%}")  # noqa: E501
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
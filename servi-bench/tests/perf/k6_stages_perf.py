@@ -0,0 +1,67 @@
+"""Compares the k6 stage encodings of the default workload traces and a synthetic
+long trace: the run length encoding (K6StageEncoder) against the compact
+piecewise-linear encoding (LinearStageEncoder) with different tolerances in rps.
+Reports the number of stages, the size of the options JSON, the encoding time,
+and the maximum and mean absolute error against the per-second rates.
+Usage: PYTHONPATH=. python tests/perf/k6_stages_perf.py --tolerances=0,1,2,5 --minutes=1440
+"""
+import io
+import tempfile
+import time
+from pathlib import Path
+import fire
+import numpy as np
+import pandas as pd
+
+from sb.workload_generator import LinearStageEncoder, WorkloadGenerator
+
+traces_path = Path(__file__).parent.parent.parent / 'data' / 'workload_traces' / '20min_20rps'
+
+
+def write_synthetic_trace(path, num_minutes):
+    """Writes a per-minute rate trace with a diurnal pattern and noise."""
+    rng = np.random.default_rng(42)
+    t = np.arange(num_minutes)
+    rates = 600 + 400 * np.sin(2 * np.pi * t / 1440) + rng.normal(0, 50, num_minutes)
+    pd.DataFrame({'InvocationsPerMinute': np.maximum(rates, 1).round()}).to_csv(path, index=False)
+
+
+def encode(workload_type, trace, stage_tolerance):
+    """Returns the options size in KB, the encoding time, and the error summary."""
+    generator = WorkloadGenerator(workload_type, 1, 'linear', trace, 0, stage_tolerance)
+    options_file = io.StringIO()
+    start = time.perf_counter()
+    generator.write_k6_options(options_file)
+    elapsed = time.perf_counter() - start
+    options = options_file.getvalue()
+    return len(options) / 1024, elapsed, options.count('"target"')
+
+
+def report(name, workload_type, trace, tolerances):
+    size, elapsed, num_stages = encode(workload_type, trace, None)
+    print(f"{name:<12} rle        {num_stages:>7} stages {size:>9.1f}KB {elapsed:.2f}s")
+    for tolerance in tolerances:
+        size, elapsed, num_stages = encode(workload_type, trace, tolerance)
+        # Re-encode the same seeded rates to obtain the error summary
+        rates = WorkloadGenerator(workload_type, 1, 'linear', trace, 0).upscale_trace(
+            trace or traces_path / WorkloadGenerator.workload_type_to_file_map[workload_type])
+        encoder = LinearStageEncoder(tolerance)
+        encoder.add(rates)
+        encoder.finish()
+        summary = encoder.error_summary()
+        print(f"{'':<12} linear±{tolerance:<3g} {num_stages:>7} stages {size:>9.1f}KB {elapsed:.2f}s max_error={summary['max_error']:.2f}rps mean_error={summary['mean_error']:.3f}rps")  # noqa: E501
+
+
+def main(tolerances=(0, 1, 2, 5), minutes=1440):
+    if not isinstance(tolerances, (list, tuple)):
+        tolerances = [tolerances]
+    for workload_type in WorkloadGenerator.workload_type_to_file_map:
+        report(workload_type, workload_type, None, tolerances)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / f"trace_{minutes}min.csv"
+        write_synthetic_trace(path, minutes)
+        report(f"{minutes}min", 'custom', str(path), tolerances)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
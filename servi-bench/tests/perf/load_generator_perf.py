@@ -0,0 +1,82 @@
+"""Benchmarks the achievable request rate of the Python load generator (sb.load_generator)
+against a local HTTP stub. The stub (aiohttp.web) runs in a separate process such that
+the load generator has its own core. Every target rate runs for `seconds` as a constant
+ramping-arrival-rate scenario and reports the achieved rps, dropped iterations,
+the p50 and p99 latency, and the rps per core (requests per CPU second of the
+load generator process, i.e., the maximum rate of a saturated core).
+Usage: PYTHONPATH=. python tests/perf/load_generator_perf.py --rates=100,500,1000,2000 --seconds=10
+"""
+import multiprocessing
+import socket
+import tempfile
+import time
+from pathlib import Path
+import fire
+import numpy as np
+import pandas as pd
+
+from sb.load_generator import LoadGenerator, Request
+
+
+def serve(port):
+    from aiohttp import web
+
+    async def handle(request):
+        await request.read()
+        return web.Response(text='ok')
+
+    app = web.Application()
+    app.router.add_route('*', '/', handle)
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise Exception(f"HTTP stub did not start on port {port}")
+
+
+def options(rate, seconds):
+    return {'scenarios': {'benchmark_scenario': {
+        'executor': 'ramping-arrival-rate', 'startRate': rate, 'timeUnit': '1s',
+        'preAllocatedVUs': int(np.ceil(rate / 10)),
+        'stages': [{'target': rate, 'duration': f"{seconds}s"}]}}}
+
+
+def main(rates=(100, 500, 1000, 2000, 4000), seconds=10):
+    if isinstance(rates, int):
+        rates = [rates]
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(port,), daemon=True)
+    server.start()
+    try:
+        wait_for(port)
+        request = Request('POST', f"http://127.0.0.1:{port}/", '{"input": 1}',
+                          {'Content-Type': 'application/json'})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for rate in rates:
+                metrics_file = Path(tmp_dir) / f"k6_metrics_{rate}.csv"
+                cpu_start = time.process_time()
+                summary = LoadGenerator(options(rate, seconds), request, metrics_file).run()
+                cpu_seconds = time.process_time() - cpu_start
+                metrics = pd.read_csv(metrics_file)
+                durations = metrics[metrics.metric_name == 'http_req_duration']['metric_value']
+                p50, p99 = np.quantile(durations, [0.5, 0.99])
+                print(f"target {rate:>5} rps: achieved {summary['rps']:>7.1f} rps | requests={summary['requests']} dropped={summary['dropped']} failed={summary['failed']} | p50={p50:.1f}ms p99={p99:.1f}ms | cpu={cpu_seconds / summary['seconds'] * 100:.0f}% rps/core={summary['requests'] / cpu_seconds:.0f}")  # noqa: E501
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
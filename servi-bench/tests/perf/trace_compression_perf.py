@@ -0,0 +1,66 @@
+"""Benchmarks the disk footprint and analysis throughput of compressed traces files
+against the plain traces.json. Compressed files are written as the downloader does
+with one gzip member or zstd frame per chunk of `chunk_size` traces and as a single
+stream (e.g., compressed after the download). Validates that the analysis output
+is identical for all files. Note that the repeated fixture traces exaggerate the ratio
+of single-stream zstd, whose window spans many repetitions.
+Usage: python tests/perf/trace_compression_perf.py --repetitions=500 --chunk_size=5
+"""
+import tempfile
+import time
+from pathlib import Path
+import fire
+
+from analyze_traces_perf import fixture_traces
+from sb.aws_trace_analyzer import AwsTraceAnalyzer
+from sb.trace_files import compress, open_traces, traces_file_name
+
+
+def write_traces_files(directory, lines, compression, chunk_size) -> dict:
+    """Writes the lines into a per-chunk and a single-stream compressed traces file.
+    Returns a dict of paths by layout."""
+    chunked_dir = directory / f"{compression}-chunked"
+    stream_dir = directory / f"{compression}-stream"
+    chunked_dir.mkdir()
+    stream_dir.mkdir()
+    chunked_path = chunked_dir / traces_file_name(compression)
+    with open(chunked_path, 'wb') as f:
+        for i in range(0, len(lines), chunk_size):
+            f.write(compress(b''.join(lines[i:i + chunk_size]), compression))
+    stream_path = stream_dir / traces_file_name(compression)
+    with open_traces(stream_path, 'wb') as f:
+        for line in lines:
+            f.write(line)
+    return {'chunked': chunked_path, 'stream': stream_path}
+
+
+def analyze(traces_file, workers):
+    start = time.perf_counter()
+    AwsTraceAnalyzer(traces_file, workers).analyze_traces()
+    elapsed = time.perf_counter() - start
+    output = (traces_file.parent / 'trace_breakdown.csv').read_bytes() + \
+        (traces_file.parent / 'invalid_traces.csv').read_bytes()
+    return elapsed, output
+
+
+def main(repetitions=500, chunk_size=5, workers=1, compressions=('gz', 'zst')):
+    lines = [line.encode() for line in fixture_traces()] * repetitions
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        plain_dir = tmp_dir / 'plain'
+        plain_dir.mkdir()
+        plain_path = plain_dir / traces_file_name()
+        plain_path.write_bytes(b''.join(lines))
+        plain_size = plain_path.stat().st_size
+        elapsed, reference = analyze(plain_path, workers)
+        print(f"traces={len(lines)} workers={workers} chunk_size={chunk_size}")
+        print(f"plain size={plain_size / 1024 / 1024:.1f}MB time={elapsed:.2f}s traces/sec={len(lines) / elapsed:.0f}")  # noqa: E501
+        for compression in compressions:
+            for layout, path in write_traces_files(tmp_dir, lines, compression, chunk_size).items():  # noqa: E501
+                size = path.stat().st_size
+                elapsed, output = analyze(path, workers)
+                print(f"{compression}-{layout} size={size / 1024 / 1024:.1f}MB ratio={plain_size / size:.1f}x time={elapsed:.2f}s traces/sec={len(lines) / elapsed:.0f} identical={output == reference}")  # noqa: E501
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,104 @@
+"""Benchmarks the trace download throughput for different numbers of concurrent requests
+and the trace id enumeration for different numbers of time slices.
+Uses a local fake X-Ray client that simulates the latency of paginated requests
+and throttles BatchGetTraces requests beyond a maximum number of concurrent requests.
+Usage: python tests/perf/trace_download_perf.py --num_traces=2000 --latency=0.05
+"""
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import fire
+from botocore.exceptions import ClientError
+
+from sb.aws_trace_downloader import AwsTraceDownloader
+
+
+class FakeBatchGetTracesPaginator:
+
+    def __init__(self, latency, throttle_above) -> None:
+        self.latency = latency
+        self.throttle_above = throttle_above
+        self.in_flight = 0
+        self.num_throttled = 0
+        self.lock = threading.Lock()
+
+    def paginate(self, TraceIds):
+        with self.lock:
+            self.in_flight += 1
+            throttled = self.in_flight > self.throttle_above
+            if throttled:
+                self.num_throttled += 1
+        try:
+            time.sleep(self.latency)
+            if throttled:
+                error = {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}
+                raise ClientError(error, 'BatchGetTraces')
+            traces = [{'Id': id, 'Duration': 0.1, 'LimitExceeded': False, 'Segments': []}
+                      for id in TraceIds]
+            return [{'Traces': traces, 'UnprocessedTraceIds': []}]
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class FakeTraceSummariesPaginator:
+    """Returns pages of 100 trace summaries for traces starting once per second."""
+
+    def __init__(self, latency, start, trace_ids) -> None:
+        self.latency = latency
+        self.start = start
+        self.trace_ids = trace_ids
+
+    def paginate(self, StartTime, EndTime):
+        first = max(0, int((StartTime - self.start).total_seconds()))
+        last = int((EndTime - self.start).total_seconds())
+        ids = self.trace_ids[first:last + 1]
+        for i in range(0, len(ids), 100):
+            time.sleep(self.latency)
+            yield {'TraceSummaries': [{'Id': id} for id in ids[i:i + 100]]}
+
+
+class FakeXRayClient:
+
+    def __init__(self, latency, throttle_above, start=None, trace_ids=None) -> None:
+        self.paginator = FakeBatchGetTracesPaginator(latency, throttle_above)
+        self.summaries_paginator = FakeTraceSummariesPaginator(latency, start, trace_ids)
+
+    def get_paginator(self, operation_name):
+        if operation_name == 'get_trace_summaries':
+            return self.summaries_paginator
+        return self.paginator
+
+
+def main(num_traces=2000, latency=0.05, throttle_above=12, max_in_flight=(1, 4, 8, 16, 32)):
+    trace_ids = [f"1-60be2454-{i:024x}" for i in range(num_traces)]
+    print(f"traces={num_traces} latency={latency}s throttle_above={throttle_above}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        trace_file = Path(tmp_dir) / 'traces.json'
+        for in_flight in max_in_flight:
+            client = FakeXRayClient(latency, throttle_above)
+            downloader = AwsTraceDownloader(None, in_flight, client)
+            start = time.perf_counter()
+            unprocessed_ids = downloader.retrieve_traces(trace_ids, trace_file)
+            elapsed = time.perf_counter() - start
+            num_lines = len(trace_file.read_text().splitlines())
+            print(f"max_in_flight={in_flight} time={elapsed:.2f}s traces/sec={num_lines / elapsed:.0f} throttled={client.paginator.num_throttled} unprocessed={len(unprocessed_ids)}")  # noqa: E501
+        # Trace id enumeration with one trace per second
+        start = datetime(2021, 8, 31, 20, 0, 0)
+        end = start + timedelta(seconds=num_traces - 1)
+        client = FakeXRayClient(latency, throttle_above, start, trace_ids)
+        downloader = AwsTraceDownloader(None, 8, client)
+        reference = None
+        for num_slices in [1, 2, 4, 8]:
+            begin = time.perf_counter()
+            ids = downloader.retrieve_trace_ids(start, end, trace_file, num_slices)
+            elapsed = time.perf_counter() - begin
+            if reference is None:
+                reference = ids
+            print(f"time_slices={num_slices} time={elapsed:.2f}s trace_ids={len(ids)} identical={ids == reference}")  # noqa: E501
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,60 @@
+"""Benchmarks the per-trace cost of the span graph construction and the latency breakdown.
+Reports the throughput (traces/sec), the peak traced allocation of a single trace,
+and the peak RSS of the process using the aws_trace_analyzer test fixtures.
+Usage: python tests/perf/trace_graph_perf.py --iterations=200
+"""
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+import fire
+
+from sb.aws_trace_analyzer import analyze_trace
+
+fixtures_dir = Path(__file__).parent.parent / 'fixtures' / 'aws_trace_analyzer'
+
+
+def fixture_traces() -> list:
+    traces = []
+    for path in sorted(fixtures_dir.glob('*/traces.json')):
+        with open(path) as json_file:
+            traces.append(json.load(json_file))
+    return traces
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of this process in MB."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return max_rss / 1024 / 1024
+    return max_rss / 1024
+
+
+def main(iterations=100):
+    traces = fixture_traces()
+    # Peak allocation per trace (measured separately because tracing slows down execution)
+    peak_allocations = []
+    for trace in traces:
+        tracemalloc.start()
+        analyze_trace(trace)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_allocations.append(peak)
+    mean_peak_kb = sum(peak_allocations) / len(peak_allocations) / 1024
+    # Throughput
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for trace in traces:
+            analyze_trace(trace)
+    elapsed = time.perf_counter() - start
+    num_traces = iterations * len(traces)
+    print(f"traces={num_traces} time={elapsed:.2f}s traces/sec={num_traces / elapsed:.0f}")
+    print(f"mean_peak_alloc_per_trace={mean_peak_kb:.1f}KB max_peak_alloc_per_trace={max(peak_allocations) / 1024:.1f}KB")  # noqa: E501
+    print(f"peak_rss={peak_rss_mb():.1f}MB")
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,70 @@
+"""Benchmarks sb stats on a synthetic trace breakdown with exact quantiles and with
+streaming quantile sketches. Reports the time, the peak traced allocation, and the
+maximum relative error of the sketch-based quantiles.
+Usage: python tests/perf/trace_stats_perf.py --num_traces=1000000 --output_format=csv
+"""
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import fire
+import numpy as np
+import pandas as pd
+
+from sb.aws_trace_analyzer import BREAKDOWN_FILES, CSV_FIELDS, DURATION_FIELDS, breakdown_writer
+from sb.trace_stats import trace_stats
+
+
+def write_synthetic_breakdown(path, num_traces, output_format):
+    """Writes a breakdown with log-normally distributed category latencies."""
+    rng = np.random.default_rng(42)
+    categories = [field for field in DURATION_FIELDS if field != 'duration']
+    latencies = {field: rng.lognormal(3, 1, num_traces) for field in categories}
+    durations = sum(latencies.values())
+    with breakdown_writer(path, CSV_FIELDS, output_format) as writer:
+        for i in range(num_traces):
+            values = {
+                'trace_id': f"1-{i:08x}",
+                'start_time': 1_600_000_000 + i / 100,
+                'end_time': 1_600_000_000 + i / 100 + durations[i] / 1000,
+                'duration': pd.Timedelta(milliseconds=durations[i]).to_pytimedelta(),
+                'num_cold_starts': int(i % 100 == 0),
+                'errors': int(i % 50 == 0),
+                'throttles': 0,
+                'faults': 0,
+                'services': [],
+                'longest_path_names': []
+            }
+            for field in categories:
+                values[field] = pd.Timedelta(milliseconds=latencies[field][i]).to_pytimedelta()
+            writer.writerow([values.get(field) for field in CSV_FIELDS])
+
+
+def measure(path, exact):
+    start = time.perf_counter()
+    summary = trace_stats(path, exact=exact)
+    elapsed = time.perf_counter() - start
+    # Peak allocation measured separately because tracing slows down execution
+    tracemalloc.start()
+    trace_stats(path, exact=exact)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summary, elapsed, peak / 1024 / 1024
+
+
+def main(num_traces=200_000, output_format='csv'):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / BREAKDOWN_FILES[output_format]
+        write_synthetic_breakdown(path, num_traces, output_format)
+        size_mb = path.stat().st_size / 1024 / 1024
+        print(f"traces={num_traces} format={output_format} size={size_mb:.1f}MB")
+        exact, exact_time, exact_peak = measure(path, True)
+        print(f"exact time={exact_time:.2f}s peak_alloc={exact_peak:.1f}MB")
+        sketch, sketch_time, sketch_peak = measure(path, False)
+        errors = [abs(sketch['latency_ms'][field][q] / exact['latency_ms'][field][q] - 1)
+                  for field in DURATION_FIELDS for q in ['p50', 'p90', 'p95', 'p99']]
+        print(f"sketch time={sketch_time:.2f}s peak_alloc={sketch_peak:.1f}MB max_relative_error={max(errors):.4f}")  # noqa: E501
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,94 @@
+"""Benchmarks WorkloadGenerator.upscale_trace for per-minute rate traces of
+20 minutes, 1 day, and 14 days (e.g., derived from the Azure Functions dataset).
+Compares the vectorized upscaling against the previous per-minute loop with
+np.append (quadratic in the trace length) and checks that the seeded outputs
+are identical. The loop is skipped for traces longer than `max_loop_minutes`.
+Additionally compares the time and peak traced allocation of writing the k6 options
+file at once (generate_trace) and in windows of `chunk_minutes` (write_k6_options).
+Usage: python tests/perf/workload_upscale_perf.py --minutes=20,1440,20160 --max_loop_minutes=1440
+"""
+import io
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import fire
+import numpy as np
+import pandas as pd
+import stochastic
+from stochastic.processes.continuous import FractionalBrownianMotion
+
+from sb.workload_generator import CHUNK_MINUTES, WorkloadGenerator
+
+
+def loop_upscale_trace(per_minute_rates_file_path, scale_factor=1):
+    """Previous linear upscaling with one np.append per minute (reference)."""
+    per_minute_rates_arr = pd.read_csv(per_minute_rates_file_path)['InvocationsPerMinute'].values  # noqa E501
+    bm = FractionalBrownianMotion(hurst=0.8, t=10)
+    samples = bm.sample(60 * len(per_minute_rates_arr)) * 100
+    all_bm_samples = samples + np.abs(np.floor(samples.min()))
+    per_second_rates = np.array([])
+    for i in range(len(per_minute_rates_arr)):
+        bm_samples = all_bm_samples[i * 60:(i + 1) * 60]
+        requests_per_unit = per_minute_rates_arr[i] / bm_samples.sum()
+        per_second_rates = np.append(per_second_rates, bm_samples * requests_per_unit)
+    return np.round(per_second_rates * scale_factor)
+
+
+def write_synthetic_trace(path, num_minutes):
+    """Writes a per-minute rate trace with a diurnal pattern and noise."""
+    rng = np.random.default_rng(42)
+    t = np.arange(num_minutes)
+    rates = 600 + 400 * np.sin(2 * np.pi * t / 1440) + rng.normal(0, 50, num_minutes)
+    pd.DataFrame({'InvocationsPerMinute': np.maximum(rates, 1).round()}).to_csv(path, index=False)
+
+
+def measure(func):
+    """Returns the time and peak traced allocation in MB of calling func."""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def write_options(path, chunk_minutes=None):
+    generator = WorkloadGenerator('custom', 1, 'linear', path)
+    if chunk_minutes is None:
+        json.dump(generator.generate_trace(), io.StringIO())
+    else:
+        generator.write_k6_options(io.StringIO(), chunk_minutes)
+
+
+def main(minutes=(20, 1440, 20160), max_loop_minutes=1440, chunk_minutes=CHUNK_MINUTES):
+    if isinstance(minutes, int):
+        minutes = [minutes]
+    generator = WorkloadGenerator('single')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_minutes in minutes:
+            path = Path(tmp_dir) / f"trace_{num_minutes}min.csv"
+            write_synthetic_trace(path, num_minutes)
+            stochastic.random.seed(generator.rng_seed)
+            start = time.perf_counter()
+            rates = generator.upscale_trace(path)
+            vectorized_time = time.perf_counter() - start
+            line = f"{num_minutes:>6} minutes ({len(rates):>8} seconds): vectorized {vectorized_time:.3f}s"  # noqa: E501
+            if num_minutes <= max_loop_minutes:
+                stochastic.random.seed(generator.rng_seed)
+                start = time.perf_counter()
+                loop_rates = loop_upscale_trace(path)
+                loop_time = time.perf_counter() - start
+                identical = np.array_equal(rates, loop_rates)
+                line += f" | loop {loop_time:.3f}s | speedup {loop_time / vectorized_time:.1f}x | identical={identical}"  # noqa: E501
+            print(line)
+            full_time, full_peak = measure(lambda: write_options(path))
+            chunked_time, chunked_peak = measure(lambda: write_options(path, chunk_minutes))
+            print(f"{'':>6} k6 options: full {full_time:.2f}s {full_peak:.0f}MB | chunked ({chunk_minutes}min) {chunked_time:.2f}s {chunked_peak:.0f}MB")  # noqa: E501
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -4,13 +4,15 @@ import sys
 from pathlib import Path
 import datetime
 import pytest
-import networkx as nx
+from concurrent.futures import ThreadPoolExecutor
 
-from sb.aws_trace_analyzer import CSV_FIELDS, extract_trace_breakdown, longest_path, create_span_graph, duration, get_sorted_children, is_async_call, call_stack  # noqa: E501
+import sb.aws_trace_analyzer as aws_trace_analyzer
+from sb.trace_files import compress, traces_file_name
+from sb.aws_trace_analyzer import AwsTraceAnalyzer, CSV_FIELDS, extract_trace_breakdown, longest_path, create_span_graph, get_sorted_children, TraceGraph, is_async_call, call_stack, byte_ranges, read_lines, ordered_results, load_cache, analyzer_version, analysis_source_hash, CACHE_FILE, CRITICAL_PATH, CRITICAL_PATH_FIELDS  # noqa: E501
 
 
 def test_get_sorted_children():
-    G = nx.DiGraph()
+    G = TraceGraph()
     # Example inspired from the matrix multiplication app
     # where two spans (sub1, sub2) have the same end_time (end) but
     # sub1 just starts 1ms earlier (start1). Timeline: start1<end1=start2=end2
@@ -20,19 +22,31 @@ def test_get_sorted_children():
     root_id = 'root_id'
     sub1_id = 'sub1'
     sub2_id = 'sub2'
-    G.add_node(root_id)
+    G.span(root_id)
     # Adding sub2 first
-    G.add_node('sub2', **{'doc': {'start_time': start2, 'end_time': end}})
+    G.add_span({'id': sub2_id, 'start_time': start2, 'end_time': end})
     G.add_edge(root_id, sub2_id)
     # Adding sub1 second
-    G.add_node('sub1', **{'doc': {'start_time': start1, 'end_time': end}})
+    G.add_span({'id': sub1_id, 'start_time': start1, 'end_time': end})
     G.add_edge(root_id, sub1_id)
-    succ_ids = list(G.successors(root_id))
+    succ_ids = [child.id for child in G[root_id].children]
     # Should have wrong order by default
     assert succ_ids == [sub2_id, sub1_id]
     assert get_sorted_children(G, root_id) == ['sub1', 'sub2']
 
 
+def test_trace_graph_missing_parent():
+    G = TraceGraph()
+    G.add_span({'id': 'child', 'start_time': 1.0, 'end_time': 2.0})
+    G.add_edge('parent', 'child')
+    G.add_edge('parent', 'child')
+    assert [span.id for span in G.spans] == ['child', 'parent']
+    assert G['child'].parent is G['parent']
+    assert G['parent'].children == [G['child']]
+    # Placeholder span without segment document
+    assert G['parent'].doc is None
+
+
 def test_is_async_call_async():
     parent = {'end_time': 1624353531.865}
     child = {'end_time': 1624353532.865}
@@ -242,13 +256,11 @@ def test_longest_path_sync():
         ('s3', s3_start, s3_end)
     ]
 
-    G = nx.DiGraph()
+    G = TraceGraph()
     G.graph['start'] = 's1'
     G.graph['end'] = 's1'
     for (id, start_time, end_time) in segments:
-        s1 = {'id': id, 'start_time': start_time, 'end_time': end_time}
-        node_attr = {'doc': s1, 'duration': duration(s1)}
-        G.add_node(s1['id'], **node_attr)
+        G.add_span({'id': id, 'start_time': start_time, 'end_time': end_time})
     G.add_edge('s1', 's2')
     G.add_edge('s2', 'a')
     G.add_edge('s1', 's3')
@@ -276,11 +288,9 @@ def test_longest_path_async():
         ('s3', s3_start, s3_end)
     ]
 
-    G = nx.DiGraph()
+    G = TraceGraph()
     for (id, start_time, end_time) in segments:
-        s1 = {'id': id, 'start_time': start_time, 'end_time': end_time}
-        node_attr = {'doc': s1, 'duration': duration(s1)}
-        G.add_node(s1['id'], **node_attr)
+        G.add_span({'id': id, 'start_time': start_time, 'end_time': end_time})
     G.add_edge('s1', 's2')
     G.add_edge('s1', 's')
     G.add_edge('s2', 's3')
@@ -289,6 +299,26 @@ def test_longest_path_async():
     assert ['s1', 's2', 's3'] == longest_path(G, 's1')
 
 
+def test_longest_path_deep_chain():
+    """Deeply nested synchronous calls beyond the recursion limit with an asynchronous call
+    at the deepest level that ends last"""
+    depth = sys.getrecursionlimit() + 100
+    start_time = 1619760991.000
+    G = TraceGraph()
+    for i in range(depth):
+        G.add_span({'id': f"n{i}", 'start_time': start_time + i, 'end_time': start_time + 3 * depth - i})  # noqa: E501
+        G.add_span({'id': f"c{i}", 'start_time': start_time + i, 'end_time': start_time + i + 0.5})  # noqa: E501
+        G.add_edge(f"n{i}", f"c{i}")
+        if i > 0:
+            G.add_edge(f"n{i - 1}", f"n{i}")
+    G.add_span({'id': 'async', 'start_time': start_time + depth, 'end_time': start_time + 4 * depth})  # noqa: E501
+    G.add_edge(f"n{depth - 1}", 'async')
+    G.graph['call_stack'] = call_stack(G, 'async')
+    expected = [id for i in range(depth) for id in (f"n{i}", f"c{i}")] + ['async']
+    assert longest_path(G, 'n0') == expected
+    assert G.graph['call_stack'] == ['async']
+
+
 def test_longest_path_event_processing_app():
     """Reproduces an issue where the last returning child
     was appended to the longest path although not being part of it.
@@ -406,6 +436,196 @@ def test_extract_trace_matrix_app_same_end_time():
     assert_trace_breakdown(tp, expected_breakdown)
 
 
+def write_traces_json(path, apps):
+    """Writes the traces of the given fixture apps into a
+    traces.json file at `path` with one trace per line."""
+    with open(path, 'w') as f:
+        for app in apps:
+            with open(traces_path(app)) as json_file:
+                trace = json.load(json_file)
+            f.write(json.dumps(trace) + '\n')
+
+
+def analyze_traces_output(traces_file, workers, cache=False):
+    """Returns the bytes of trace_breakdown.csv and invalid_traces.csv for traces_file."""
+    AwsTraceAnalyzer(traces_file, workers, cache).analyze_traces()
+    breakdown = (traces_file.parent / 'trace_breakdown.csv').read_bytes()
+    invalid = (traces_file.parent / 'invalid_traces.csv').read_bytes()
+    return breakdown, invalid
+
+
+fixture_apps = [
+    'thumbnail_app',
+    'thumbnail_app_missing_root',
+    'matrix_app',
+    'event_processing_memory_leak',
+    'realworld_app',
+    'todo_app',
+    'thumbnail_app_in_progress',
+    'hello_retail_app_error'
+]
+
+
+def test_read_lines_byte_ranges(tmp_path):
+    """Every line must be read exactly once regardless of where the byte ranges split."""
+    traces_file = tmp_path / 'traces.json'
+    write_traces_json(traces_file, fixture_apps)
+    expected_lines = traces_file.read_bytes().splitlines(keepends=True)
+    file_size = traces_file.stat().st_size
+    for num_chunks in [1, 2, 3, 7, 64, file_size]:
+        lines = []
+        for start, end in byte_ranges(file_size, num_chunks):
+            lines.extend(read_lines(traces_file, start, end))
+        assert lines == expected_lines
+
+
+def test_analyze_traces_parallel(tmp_path, monkeypatch):
+    """The parallel analysis must produce byte-identical output files as the serial analysis."""
+    traces_file = tmp_path / 'traces.json'
+    write_traces_json(traces_file, fixture_apps)
+    serial_breakdown, serial_invalid = analyze_traces_output(traces_file, workers=1)
+    # Force more chunks than workers
+    monkeypatch.setattr(aws_trace_analyzer, 'CHUNK_BYTES', 10_000)
+    parallel_breakdown, parallel_invalid = analyze_traces_output(traces_file, workers=3)
+    assert serial_breakdown.count(b'\n') == 1 + 5
+    assert serial_invalid.count(b'\n') == 1 + 3
+    assert parallel_breakdown == serial_breakdown
+    assert parallel_invalid == serial_invalid
+
+
+@pytest.mark.parametrize('compression', ['gz', 'zst'])
+def test_analyze_traces_compressed(tmp_path, monkeypatch, compression):
+    """Compressed traces files with multiple members or frames must produce
+    identical output files as the uncompressed traces.json."""
+    if compression == 'zst':
+        pytest.importorskip('zstandard')
+    traces_file = tmp_path / 'traces.json'
+    write_traces_json(traces_file, fixture_apps)
+    expected = analyze_traces_output(traces_file, workers=1)
+    lines = traces_file.read_bytes().splitlines(keepends=True)
+    compressed_file = tmp_path / traces_file_name(compression)
+    with open(compressed_file, 'wb') as f:
+        f.write(compress(b''.join(lines[:3]), compression))
+        f.write(compress(b''.join(lines[3:]), compression))
+    traces_file.unlink()
+    assert analyze_traces_output(compressed_file, workers=1) == expected
+    # Force multiple batches of lines
+    monkeypatch.setattr(aws_trace_analyzer, 'CHUNK_BYTES', 10_000)
+    assert analyze_traces_output(compressed_file, workers=3) == expected
+
+
+def test_ordered_results_bounded():
+    """Tasks are submitted lazily with at most max_pending unconsumed futures."""
+    submitted = []
+    consumed = []
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args):
+            submitted.append(args[0])
+            assert len(submitted) - len(consumed) <= 3
+            return super().submit(fn, *args)
+
+    tasks = ((lambda i: [str(i), i], i) for i in range(10))
+    with RecordingExecutor(max_workers=2) as executor:
+        for result in ordered_results(executor, tasks, max_pending=3):
+            if isinstance(result, int):
+                consumed.append(result)
+    assert consumed == list(range(10))
+    assert submitted == list(range(10))
+
+
+def test_analyzer_version_pinned():
+    """Changing the trace analysis requires bumping ANALYZER_VERSION such that cached
+    results of the previous analysis are invalidated. Update both values together."""
+    pinned = (1, '92974ada33e60d68458399a19f6dabf723f68c3d3a42baf679b0d8a2cf522788')
+    actual = (aws_trace_analyzer.ANALYZER_VERSION, analysis_source_hash())
+    assert actual == pinned, 'The trace analysis changed. Bump ANALYZER_VERSION and update the pinned hash.'  # noqa: E501
+
+
+def test_analyze_traces_cache(tmp_path, monkeypatch):
+    traces_file = tmp_path / 'traces.json'
+    write_traces_json(traces_file, fixture_apps)
+    expected = analyze_traces_output(traces_file, workers=1)
+    assert analyze_traces_output(traces_file, workers=1, cache=True) == expected
+    cache_file = tmp_path / CACHE_FILE
+    cache_version = analyzer_version()
+    cache = load_cache(cache_file, cache_version)
+    assert len(cache) == len(fixture_apps)
+    # Cached results are reused instead of re-analyzing the traces
+    analyzed = []
+    analyze_trace = aws_trace_analyzer.analyze_trace
+    monkeypatch.setattr(aws_trace_analyzer, 'analyze_trace',
+                        lambda trace, fields: analyzed.append(trace['Id']) or analyze_trace(trace, fields))  # noqa: E501
+    write_traces_json(traces_file, fixture_apps + ['matrix_app_same_end_time'])
+    assert analyze_traces_output(traces_file, workers=1, cache=True)[0].startswith(expected[0])
+    assert len(analyzed) == 1
+    # Outdated cache of a different analyzer version or output fields
+    assert load_cache(cache_file, 'other_version') == {}
+    monkeypatch.setattr(aws_trace_analyzer, 'ANALYZER_VERSION', aws_trace_analyzer.ANALYZER_VERSION + 1)  # noqa: E501
+    assert analyzer_version() != cache_version
+    assert analyzer_version() != analyzer_version(CSV_FIELDS[:-1])
+    assert load_cache(cache_file, analyzer_version()) == {}
+    monkeypatch.undo()
+    monkeypatch.setattr(aws_trace_analyzer, 'CHUNK_BYTES', 10_000)
+    assert analyze_traces_output(traces_file, workers=2, cache=True)[0].startswith(expected[0])
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'arrow'])
+def test_analyze_traces_columnar(tmp_path, output_format):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    traces_file = tmp_path / 'traces.json'
+    write_traces_json(traces_file, fixture_apps)
+    AwsTraceAnalyzer(traces_file, output_format=output_format).analyze_traces()
+    breakdown_file = tmp_path / f"trace_breakdown.{output_format}"
+    if output_format == 'parquet':
+        table = pq.read_table(breakdown_file)
+    else:
+        table = pa.ipc.open_file(breakdown_file).read_all()
+    assert table.column_names == CSV_FIELDS
+    assert table.schema.field('duration').type == pa.duration('us')
+    assert table.schema.field('start_time').type == pa.timestamp('us')
+    assert table.schema.field('longest_path_names').type == pa.list_(pa.string())
+    rows = table.to_pylist()
+    assert len(rows) == 5
+    with open(traces_path('thumbnail_app')) as json_file:
+        expected = extract_trace_breakdown(json.load(json_file))
+    actual = rows[0]
+    assert actual['trace_id'] == expected[0]
+    epoch = datetime.datetime(1970, 1, 1)
+    assert (actual['start_time'] - epoch).total_seconds() == pytest.approx(expected[1], abs=1e-6)
+    for field in ['duration', 'num_cold_starts', 'longest_path_names', 'computation', 'queing']:
+        assert actual[field] == expected[CSV_FIELDS.index(field)]
+
+
+def test_analyze_traces_critical_path(tmp_path, monkeypatch):
+    """The critical path output must not change the trace breakdown and be identical
+    for serial, parallel, and cached analyses."""
+    traces_file = tmp_path / 'traces.json'
+    write_traces_json(traces_file, fixture_apps)
+    expected_breakdown, expected_invalid = analyze_traces_output(traces_file, workers=1)
+    critical_path_file = tmp_path / 'trace_critical_path.csv'
+    outputs = []
+    monkeypatch.setattr(aws_trace_analyzer, 'CHUNK_BYTES', 10_000)
+    for workers, cache in [(1, False), (3, False), (1, True), (1, True)]:
+        AwsTraceAnalyzer(traces_file, workers, cache, critical_path=True).analyze_traces()
+        assert (tmp_path / 'trace_breakdown.csv').read_bytes() == expected_breakdown
+        assert (tmp_path / 'invalid_traces.csv').read_bytes() == expected_invalid
+        outputs.append(critical_path_file.read_bytes())
+    assert all(output == outputs[0] for output in outputs)
+    with open(critical_path_file) as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0].keys()) == CRITICAL_PATH_FIELDS
+    assert len({row['trace_id'] for row in rows}) == 5
+    with open(traces_path('thumbnail_app')) as json_file:
+        expected = extract_trace_breakdown(json.load(json_file), CSV_FIELDS + [CRITICAL_PATH])
+    trace_rows = [row for row in rows if row['trace_id'] == expected[0]]
+    assert [int(row['position']) for row in trace_rows] == list(range(len(expected[-1])))
+    # The critical path durations add up to the breakdown categories
+    computation = sum((row[-1] for row in expected[-1] if row[3] == 'computation'), datetime.timedelta())  # noqa: E501
+    assert computation == expected[CSV_FIELDS.index('computation')]
+
+
 @pytest.mark.skip(reason="Just used for creating visualizer data.")
 def test_extract_tmp_visualizer():
     """Just a tmp case for creating visualizer data
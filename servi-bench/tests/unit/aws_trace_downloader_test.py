@@ -0,0 +1,287 @@
+import json
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+import boto3
+import pytest
+from botocore.stub import Stubber
+import sb.aws_trace_downloader as aws_trace_downloader
+from sb.aws_trace_analyzer import AwsTraceAnalyzer
+from sb.trace_files import open_traces
+from sb.aws_trace_downloader import AwsTraceDownloader, AdaptiveLimiter, CHECKPOINT_FILE, time_slices  # noqa: E501
+
+
+def xray_client():
+    return boto3.client('xray', region_name='us-east-1',
+                        aws_access_key_id='testing', aws_secret_access_key='testing')
+
+
+def trace(trace_id):
+    return {'Id': trace_id, 'Duration': 0.1, 'LimitExceeded': False, 'Segments': []}
+
+
+def trace_ids(num):
+    return [f"1-60be2454-2cb82d1221d24201751e{i:04d}" for i in range(num)]
+
+
+def test_retrieve_traces_sequential(tmp_path):
+    client = xray_client()
+    ids = trace_ids(7)
+    with Stubber(client) as stubber:
+        stubber.add_response('batch_get_traces',
+                             {'Traces': [trace(id) for id in ids[:5]], 'UnprocessedTraceIds': []},
+                             {'TraceIds': ids[:5]})
+        stubber.add_response('batch_get_traces',
+                             {'Traces': [trace(ids[5])], 'UnprocessedTraceIds': [ids[6]]},
+                             {'TraceIds': ids[5:]})
+        downloader = AwsTraceDownloader(None, max_in_flight=1, client=client)
+        trace_file = tmp_path / 'traces.json'
+        unprocessed_ids = downloader.retrieve_traces(ids, trace_file)
+        stubber.assert_no_pending_responses()
+    assert unprocessed_ids == [ids[6]]
+    lines = trace_file.read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [trace(id) for id in ids[:6]]
+
+
+def test_retrieve_traces_concurrent_throttling(tmp_path, monkeypatch):
+    monkeypatch.setattr(aws_trace_downloader, 'BACKOFF_BASE', 0)
+    client = xray_client()
+    ids = trace_ids(100)
+    chunks = aws_trace_downloader.chunks(ids, 5)
+    num_throttles = 3
+    with Stubber(client) as stubber:
+        # Responses are consumed in the non-deterministic order of concurrent requests.
+        # Hence, responses are not matched against the requested chunk of trace ids.
+        for i in range(num_throttles):
+            stubber.add_client_error('batch_get_traces', 'ThrottlingException',
+                                     http_status_code=400)
+            for chunk in chunks[i::num_throttles]:
+                stubber.add_response('batch_get_traces',
+                                     {'Traces': [trace(id) for id in chunk],
+                                      'UnprocessedTraceIds': []})
+        downloader = AwsTraceDownloader(None, max_in_flight=4, client=client)
+        trace_file = tmp_path / 'traces.json'
+        unprocessed_ids = downloader.retrieve_traces(ids, trace_file)
+        stubber.assert_no_pending_responses()
+    assert unprocessed_ids == []
+    traces = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert sorted(trace['Id'] for trace in traces) == ids
+
+
+def test_adaptive_limiter():
+    limiter = AdaptiveLimiter(8)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 4
+    limiter.acquire()
+    limiter.release(throttled=True)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 1
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 8
+    assert limiter.in_flight == 0
+
+
+def add_batch_response(stubber, ids, unprocessed_ids=()):
+    stubber.add_response('batch_get_traces',
+                         {'Traces': [trace(id) for id in ids if id not in unprocessed_ids],
+                          'UnprocessedTraceIds': list(unprocessed_ids)},
+                         {'TraceIds': ids})
+
+
+def test_retrieve_traces_resume_checkpoint(tmp_path):
+    client = xray_client()
+    ids = trace_ids(20)
+    trace_file = tmp_path / 'traces.json'
+    checkpoint_file = tmp_path / CHECKPOINT_FILE
+    downloader = AwsTraceDownloader(None, max_in_flight=1, client=client)
+    with Stubber(client) as stubber:
+        add_batch_response(stubber, ids[:5])
+        add_batch_response(stubber, ids[5:10], unprocessed_ids=[ids[9]])
+        stubber.add_client_error('batch_get_traces', 'ServiceUnavailableException')
+        with pytest.raises(Exception):
+            downloader.retrieve_traces(ids, trace_file, checkpoint_file)
+    # Simulate a partially written trace after the last checkpoint
+    with open(trace_file, 'a') as f:
+        f.write('{"Id": "1-60be')
+    with Stubber(client) as stubber:
+        add_batch_response(stubber, ids[10:15])
+        add_batch_response(stubber, ids[15:])
+        unprocessed_ids = downloader.retrieve_traces(ids, trace_file, checkpoint_file)
+        stubber.assert_no_pending_responses()
+    assert unprocessed_ids == [ids[9]]
+    lines = trace_file.read_text().splitlines()
+    assert [json.loads(line)['Id'] for line in lines] == ids[:9] + ids[10:]
+
+
+@pytest.mark.parametrize('compression', ['gz', 'zst'])
+def test_retrieve_traces_compressed_resume_checkpoint(tmp_path, compression):
+    """Every chunk is compressed separately such that checkpoint offsets remain valid."""
+    if compression == 'zst':
+        pytest.importorskip('zstandard')
+    client = xray_client()
+    ids = trace_ids(15)
+    trace_file = tmp_path / f"traces.json.{compression}"
+    checkpoint_file = tmp_path / CHECKPOINT_FILE
+    downloader = AwsTraceDownloader(None, max_in_flight=1, client=client)
+    with Stubber(client) as stubber:
+        add_batch_response(stubber, ids[:5])
+        stubber.add_client_error('batch_get_traces', 'ServiceUnavailableException')
+        with pytest.raises(Exception):
+            downloader.retrieve_traces(ids, trace_file, checkpoint_file)
+    # Simulate a partially written chunk after the last checkpoint
+    with open(trace_file, 'ab') as f:
+        f.write(b'\x1f\x8b\x08\x00' if compression == 'gz' else b'\x28\xb5\x2f\xfd')
+    with Stubber(client) as stubber:
+        add_batch_response(stubber, ids[5:10])
+        add_batch_response(stubber, ids[10:])
+        assert downloader.retrieve_traces(ids, trace_file, checkpoint_file) == []
+        stubber.assert_no_pending_responses()
+    with open_traces(trace_file) as f:
+        assert [json.loads(line)['Id'] for line in f] == ids
+
+
+def fake_spec(logs_directory, start, end):
+    return SimpleNamespace(
+        event_log=SimpleNamespace(get_invoke_timespan=lambda: (start, end)),
+        logs_directory=lambda: logs_directory
+    )
+
+
+def test_get_traces_retry_unprocessed(tmp_path):
+    client = xray_client()
+    ids = trace_ids(6)
+    start = datetime(2021, 8, 31, 20, 0, 0)
+    end = start + timedelta(minutes=1)
+    spec = fake_spec(tmp_path, start, end)
+    downloader = AwsTraceDownloader(spec, max_in_flight=1, client=client)
+    with Stubber(client) as stubber:
+        stubber.add_response('get_trace_summaries',
+                             {'TraceSummaries': [{'Id': id} for id in ids + ids[:1]]},
+                             {'StartTime': start, 'EndTime': end})
+        add_batch_response(stubber, ids[:5], unprocessed_ids=[ids[2]])
+        add_batch_response(stubber, ids[5:], unprocessed_ids=[ids[5]])
+        downloader.get_traces()
+        stubber.assert_no_pending_responses()
+    unprocessed_ids_file = tmp_path / 'unprocessed_trace_ids.txt'
+    assert unprocessed_ids_file.read_text().splitlines() == [ids[2], ids[5]]
+    assert not (tmp_path / CHECKPOINT_FILE).exists()
+    # Re-running get_traces retries the unprocessed trace ids
+    with Stubber(client) as stubber:
+        add_batch_response(stubber, [ids[2], ids[5]])
+        downloader.get_traces()
+        stubber.assert_no_pending_responses()
+    assert not unprocessed_ids_file.exists()
+    lines = (tmp_path / 'traces.json').read_text().splitlines()
+    assert sorted(json.loads(line)['Id'] for line in lines) == ids
+    # Re-running a complete download aborts
+    assert downloader.get_traces() is None
+
+
+@pytest.mark.parametrize('compression', ['gz', 'zst'])
+def test_get_traces_recompresses(tmp_path, compression):
+    """A complete download is recompressed from one frame per chunk into a single stream."""
+    if compression == 'gz':
+        decompressor = zlib.decompressobj(wbits=31)
+    else:
+        decompressor = pytest.importorskip('zstandard').ZstdDecompressor().decompressobj()
+    client = xray_client()
+    ids = trace_ids(12)
+    start = datetime(2021, 8, 31, 20, 0, 0)
+    end = start + timedelta(minutes=1)
+    downloader = AwsTraceDownloader(fake_spec(tmp_path, start, end), max_in_flight=1,
+                                    client=client, compression=compression)
+    with Stubber(client) as stubber:
+        stubber.add_response('get_trace_summaries',
+                             {'TraceSummaries': [{'Id': id} for id in ids]},
+                             {'StartTime': start, 'EndTime': end})
+        for i in range(0, len(ids), 5):
+            add_batch_response(stubber, ids[i:i + 5])
+        downloader.get_traces()
+        stubber.assert_no_pending_responses()
+    trace_file = tmp_path / f"traces.json.{compression}"
+    assert list(tmp_path.glob('.tmp*')) == []
+    with open_traces(trace_file) as f:
+        content = f.read()
+    assert sorted(json.loads(line)['Id'] for line in content.splitlines()) == ids
+    # The first gzip member or zstd frame spans the entire file
+    assert decompressor.decompress(trace_file.read_bytes()) == content
+
+
+class FakeTraceSummariesClient:
+    """Fake X-Ray client returning pages of trace summaries with inclusive time ranges."""
+
+    def __init__(self, timed_trace_ids, page_size=3) -> None:
+        self.timed_trace_ids = timed_trace_ids
+        self.page_size = page_size
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, StartTime, EndTime):
+        ids = [id for time, id in self.timed_trace_ids if StartTime <= time <= EndTime]
+        for i in range(0, len(ids), self.page_size):
+            yield {'TraceSummaries': [{'Id': id} for id in ids[i:i + self.page_size]]}
+
+
+def test_time_slices():
+    start = datetime(2021, 8, 31, 20, 0, 0)
+    end = start + timedelta(minutes=10)
+    slices = time_slices(start, end, 4)
+    assert len(slices) == 4
+    assert slices[0][0] == start and slices[-1][1] == end
+    assert all(prev[1] == next[0] for prev, next in zip(slices, slices[1:]))
+
+
+def test_retrieve_trace_ids_time_slices(tmp_path):
+    start = datetime(2021, 8, 31, 20, 0, 0)
+    end = start + timedelta(minutes=30)
+    # Traces every 15 seconds including slice boundaries and duplicate trace ids
+    timed_trace_ids = [(start + timedelta(seconds=15 * i), f"1-{i:08x}") for i in range(121)]
+    timed_trace_ids.insert(7, timed_trace_ids[6])
+    downloader = AwsTraceDownloader(None, max_in_flight=4,
+                                    client=FakeTraceSummariesClient(timed_trace_ids))
+    expected = downloader.retrieve_trace_ids(start, end, tmp_path / 'sequential.txt', num_slices=1)
+    assert len(expected) == 122
+    for num_slices in [None, 2, 3, 8]:
+        trace_ids_file = tmp_path / 'trace_ids.txt'
+        trace_ids = downloader.retrieve_trace_ids(start, end, trace_ids_file, num_slices)
+        assert trace_ids == expected
+        assert trace_ids_file.read_text().splitlines() == expected
+
+
+def test_get_traces_analyze(tmp_path):
+    fixtures_dir = Path(__file__).parent.parent / 'fixtures' / 'aws_trace_analyzer'
+    traces = []
+    for path in sorted(fixtures_dir.glob('*/traces.json')):
+        with open(path) as json_file:
+            traces.append(json.load(json_file))
+    ids = [trace['Id'] for trace in traces]
+    start = datetime(2021, 8, 31, 20, 0, 0)
+    end = start + timedelta(minutes=1)
+    client = xray_client()
+    downloader = AwsTraceDownloader(fake_spec(tmp_path, start, end), max_in_flight=1, client=client)
+    trace_file = tmp_path / 'traces.json'
+    with Stubber(client) as stubber:
+        stubber.add_response('get_trace_summaries',
+                             {'TraceSummaries': [{'Id': id} for id in ids]},
+                             {'StartTime': start, 'EndTime': end})
+        for i in range(0, len(traces), 5):
+            stubber.add_response('batch_get_traces',
+                                 {'Traces': traces[i:i + 5], 'UnprocessedTraceIds': []},
+                                 {'TraceIds': ids[i:i + 5]})
+        downloader.get_traces(AwsTraceAnalyzer(trace_file, cache=True))
+        stubber.assert_no_pending_responses()
+    breakdown = (tmp_path / 'trace_breakdown.csv').read_bytes()
+    invalid = (tmp_path / 'invalid_traces.csv').read_bytes()
+    assert breakdown.count(b'\n') + invalid.count(b'\n') == len(traces) + 2
+    # Identical to analyzing the downloaded traces.json afterwards including the cache
+    AwsTraceAnalyzer(trace_file, cache=True).analyze_traces()
+    assert (tmp_path / 'trace_breakdown.csv').read_bytes() == breakdown
+    assert (tmp_path / 'invalid_traces.csv').read_bytes() == invalid
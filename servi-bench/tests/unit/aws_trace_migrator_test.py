@@ -0,0 +1,90 @@
+import io
+import json
+import pytest
+from sb.trace_files import compress, open_traces
+from sb.aws_trace_migrator import iter_legacy_traces, migrate_traces, migrate_logs, is_legacy_format
+
+
+def legacy_traces():
+    return {
+        f"1-60be2454-2cb82d1221d24201751ea2e{i}": {
+            'Id': f"1-60be2454-2cb82d1221d24201751ea2e{i}",
+            'Duration': 0.1 * i,
+            'Segments': [{'Id': str(i), 'Document': json.dumps({'id': str(i), 'name': '{"}'})}]
+        } for i in range(5)
+    }
+
+
+def test_iter_legacy_traces_small_chunks():
+    traces = legacy_traces()
+    # Pretty-printed with whitespace and chunks splitting keys and traces
+    traces_file = io.StringIO(json.dumps(traces, indent=2))
+    assert list(iter_legacy_traces(traces_file, chunk_size=7)) == list(traces.items())
+    assert list(iter_legacy_traces(io.StringIO(' { } '), chunk_size=1)) == []
+
+
+class CountingReader(io.StringIO):
+    """Counts the number of read chunks."""
+    reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def test_iter_legacy_traces_malformed():
+    """Malformed input fails at the first invalid line without reading the remaining file."""
+    traces = json.dumps(legacy_traces(), indent=2)
+    # Missing value of the second trace in line 3 followed by valid traces
+    malformed = '{\n  "1-a": {"Id": "1-a"},\n  "1-b": ,\n' + traces[1:] * 100
+    traces_file = CountingReader(malformed)
+    with pytest.raises(Exception, match='at line 3: Expecting value'):
+        list(iter_legacy_traces(traces_file, chunk_size=64))
+    assert traces_file.reads <= 2
+    # Traces in the new format are no trace id mapping
+    new_format = ''.join(json.dumps(trace) + '\n' for trace in legacy_traces().values())
+    with pytest.raises(Exception, match='at line 1: expected a trace object for trace id Id'):
+        list(iter_legacy_traces(io.StringIO(new_format)))
+    with pytest.raises(Exception, match='at line 2: unexpected data'):
+        list(iter_legacy_traces(io.StringIO('{"1-a": {}}\n{"1-b": {}}\n')))
+    with pytest.raises(Exception, match='at line 2: unexpected end of file'):
+        list(iter_legacy_traces(io.StringIO('{"1-a": {}\n')))
+    with pytest.raises(Exception, match='at line 1: Unterminated string'):
+        list(iter_legacy_traces(io.StringIO('{"1-a": {"Id": "1-a}}'), chunk_size=4))
+
+
+def test_migrate_traces(tmp_path):
+    traces = legacy_traces()
+    traces_path = tmp_path / 'traces.json'
+    traces_path.write_text(json.dumps(traces))
+    assert is_legacy_format(traces_path)
+    assert migrate_traces(traces_path, replace=True) == len(traces)
+    expected = ''.join(json.dumps(trace) + '\n' for trace in traces.values())
+    assert traces_path.read_text() == expected
+    assert not is_legacy_format(traces_path)
+    # Skip already migrated files
+    assert migrate_traces(traces_path) is None
+
+
+@pytest.mark.parametrize('compression', ['gz', 'zst'])
+def test_migrate_traces_compressed(tmp_path, compression):
+    if compression == 'zst':
+        pytest.importorskip('zstandard')
+    traces = legacy_traces()
+    traces_path = tmp_path / f"traces.json.{compression}"
+    traces_path.write_bytes(compress(json.dumps(traces).encode(), compression))
+    assert migrate_logs(tmp_path) == {traces_path: len(traces)}
+    with open_traces(tmp_path / f"traces_v2.json.{compression}") as f:
+        assert [json.loads(line) for line in f] == list(traces.values())
+
+
+def test_migrate_logs_parallel(tmp_path):
+    traces = legacy_traces()
+    for run in ['run1', 'run2', 'run3']:
+        run_dir = tmp_path / 'logs' / run
+        run_dir.mkdir(parents=True)
+        (run_dir / 'traces.json').write_text(json.dumps(traces))
+    results = migrate_logs(tmp_path / 'logs', workers=2)
+    assert list(results.values()) == [len(traces)] * 3
+    for path in results:
+        assert len((path.parent / 'traces_v2.json').read_text().splitlines()) == len(traces)
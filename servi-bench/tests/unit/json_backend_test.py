@@ -0,0 +1,71 @@
+import importlib
+import io
+import json
+from pathlib import Path
+import pytest
+import sb.json_backend as json_backend
+from sb.aws_trace_analyzer import analyze_trace
+from sb.aws_trace_downloader import write_traces
+from sb.json_backend import JSON_BACKEND_ENV, installed_backends, load_backend, select_backend
+
+fixtures_dir = Path(__file__).parent.parent / 'fixtures' / 'aws_trace_analyzer'
+
+
+def fixture_lines() -> list:
+    lines = []
+    for path in sorted(fixtures_dir.glob('*/traces.json')):
+        with open(path) as json_file:
+            lines.append(json.dumps(json.load(json_file)).encode())
+    return lines
+
+
+@pytest.mark.parametrize('backend', installed_backends())
+def test_backend_roundtrip(backend):
+    loads = load_backend(backend)
+    for line in fixture_lines():
+        trace = loads(line)
+        assert trace == json.loads(line)
+        assert loads(line.decode()) == trace
+
+
+@pytest.mark.parametrize('backend', installed_backends())
+def test_backend_analysis_identical(backend, monkeypatch):
+    lines = fixture_lines()
+    expected = [analyze_trace(json.loads(line)) for line in lines]
+    monkeypatch.setattr(json_backend, 'loads', load_backend(backend))
+    assert [analyze_trace(json_backend.loads(line)) for line in lines] == expected
+
+
+def test_select_backend_fallback(monkeypatch):
+    def load_json_only(name):
+        if name != 'json':
+            raise ImportError(name)
+        return json.loads
+    monkeypatch.setattr(json_backend, 'load_backend', load_json_only)
+    assert select_backend('auto')[0] == 'json'
+    assert select_backend('orjson')[0] == 'json'
+    with pytest.raises(Exception):
+        load_backend('yaml')
+
+
+def test_select_unknown_backend(caplog):
+    assert select_backend('ojson')[0] == 'json'
+    assert 'Unsupported JSON backend ojson' in caplog.text
+
+
+@pytest.mark.parametrize('backend', installed_backends())
+def test_written_traces_identical(backend, monkeypatch):
+    """Downloaded traces.json files are byte-identical regardless of the installed backend."""
+    traces = [json.loads(line) for line in fixture_lines()]
+    traces.append({'Id': '1-0', 'Duration': 1e-05, 'Name': 'ü', 'Segments': []})
+    expected = ''.join(json.dumps(trace) + '\n' for trace in traces).encode()
+    monkeypatch.setenv(JSON_BACKEND_ENV, backend)
+    try:
+        importlib.reload(json_backend)
+        assert json_backend.backend == backend
+        f = io.BytesIO()
+        write_traces(f, traces)
+        assert f.getvalue() == expected
+    finally:
+        monkeypatch.undo()
+        importlib.reload(json_backend)
@@ -0,0 +1,83 @@
+import logging
+import pytest
+from sb.k6_monitor import K6MetricsTail, K6Monitor, load_sketches, summarize, SKETCHES_FILE
+
+HEADER = 'metric_name,timestamp,metric_value,check,error,error_code,expected_response,group,method,name,proto,scenario,service,status,subproto,tls_version,url,extra_tags\n'  # noqa: E501
+
+
+def k6_rows(timestamp, durations):
+    rows = ''
+    for duration in durations:
+        rows += f"http_reqs,{timestamp},1.000000,,,,true,,POST,https://example.com/dev,HTTP/1.1,default,,200,,tls1.2,https://example.com/dev,xray_header=Root=1-60b\n"  # noqa: E501
+        rows += f"http_req_duration,{timestamp},{duration:.6f},,,,true,,POST,https://example.com/dev,HTTP/1.1,default,,200,,tls1.2,https://example.com/dev,xray_header=Root=1-60b\n"  # noqa: E501
+    return rows
+
+
+def test_k6_metrics_tail_partial_lines(tmp_path):
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    tail = K6MetricsTail(metrics_file)
+    assert len(tail.read()[0]) == 0
+    content = HEADER + k6_rows(1630440000, [10, 20]) + k6_rows(1630440001, [30])
+    split = content.index('http_req_duration,1630440001') + 10
+    metrics_file.write_text(content[:split])
+    timestamps, values = tail.read()
+    assert timestamps.tolist() == [1630440000, 1630440000]
+    assert values.tolist() == [10, 20]
+    with open(metrics_file, 'a') as f:
+        f.write(content[split:])
+    timestamps, values = tail.read()
+    assert timestamps.tolist() == [1630440001]
+    assert values.tolist() == [30]
+    tail.close()
+
+
+def test_summarize():
+    monitor = K6Monitor('missing.csv', '.')
+    monitor.sketches = {}
+    for second in range(10):
+        monitor.sketches[second] = sketch_of([100.0] * 5 + [1000.0] * (second == 9))
+    summary = summarize(monitor.sketches, 0, 9)
+    assert summary['seconds'] == 9
+    assert summary['rps'] == 5
+    assert summary['p99'] == pytest.approx(100, rel=0.01)
+    total = summarize(monitor.sketches)
+    assert total['requests'] == 51
+    assert total['rps'] == pytest.approx(5.1)
+    assert summarize(monitor.sketches, 20, 30) is None
+
+
+def test_summarize_idle_seconds():
+    """Seconds without samples at the edges of an interval lower the rps."""
+    sketches = {second: sketch_of([100.0] * 10) for second in range(12, 16)}
+    summary = summarize(sketches, 10, 20)
+    assert summary['seconds'] == 10
+    assert summary['requests'] == 40
+    assert summary['rps'] == 4
+    assert summarize(sketches)['rps'] == 10
+    assert summarize(sketches, 10)['rps'] == 40 / 6
+    assert summarize(sketches, end=20)['rps'] == 5
+
+
+def sketch_of(values):
+    from sb.quantile_sketch import QuantileSketch
+    sketch = QuantileSketch()
+    sketch.add(values)
+    return sketch
+
+
+def test_k6_monitor_live(tmp_path, caplog):
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    monitor = K6Monitor(metrics_file, tmp_path, report_interval=1, poll_interval=0.01)
+    with caplog.at_level(logging.INFO):
+        monitor.start()
+        metrics_file.write_text(HEADER + k6_rows(1630440000, [10] * 50) + k6_rows(1630440001, [20] * 30))  # noqa: E501
+        for _ in range(300):
+            if any('http_req_duration last' in message for message in caplog.messages):
+                break
+            monitor.stop_event.wait(0.01)
+        monitor.stop()
+    assert any('http_req_duration last' in message for message in caplog.messages)
+    assert any('http_req_duration total' in message for message in caplog.messages)
+    sketches = load_sketches(tmp_path / SKETCHES_FILE)
+    assert {second: sketch.count for second, sketch in sketches.items()} == {1630440000: 50, 1630440001: 30}  # noqa: E501
+    assert summarize(sketches)['rps'] == 40
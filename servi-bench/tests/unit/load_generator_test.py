@@ -0,0 +1,108 @@
+import csv
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pytest
+from sb.k6_monitor import K6MetricsTail
+from sb.load_generator import (METRICS_COLUMNS, LoadGenerator, arrival_times, parse_duration,
+                               request_from_envs, xray_trace_header)
+
+
+def test_parse_duration():
+    assert parse_duration('10s') == 10
+    assert parse_duration('1m30s') == 90
+    assert parse_duration('500ms') == 0.5
+    assert parse_duration('2h') == 7200
+    with pytest.raises(Exception, match='Invalid k6 duration'):
+        parse_duration('10 s')
+
+
+def test_arrival_times_constant_rate():
+    arrivals = np.concatenate(list(arrival_times(10, [{'target': 10, 'duration': '10s'}])))
+    assert np.allclose(arrivals, np.arange(100) / 10)
+
+
+def test_arrival_times_ramps():
+    """The number of arrivals equals the integral of the linearly ramping rate."""
+    stages = [{'target': 10, 'duration': '10s'}, {'target': 0, 'duration': '10s'}]
+    arrivals = np.concatenate(list(arrival_times(0, stages, slice_seconds=3)))
+    assert len(arrivals) == 100
+    assert np.all(np.diff(arrivals) > 0)
+    assert np.count_nonzero(arrivals < 10) == 50
+    # Arrivals of a ramp from 0 rps: t = sqrt(2n / slope)
+    assert np.allclose(arrivals[:50], np.sqrt(2 * np.arange(50)))
+    minutes = np.concatenate(list(arrival_times(60, [{'target': 60, 'duration': '2s'}], '1m')))
+    assert np.allclose(minutes, [0, 1])
+
+
+def test_request_from_envs():
+    assert request_from_envs({'URL': 'http://a'}) == ('GET', 'http://a', None, {})
+    request = request_from_envs({'URL': 'http://a', 'BODY': '{}'})
+    assert request == ('POST', 'http://a', '{}', {'Content-Type': 'application/json'})
+    with pytest.raises(Exception, match='URL'):
+        request_from_envs({})
+
+
+def test_xray_trace_header():
+    header = xray_trace_header()
+    assert header.startswith('Root=1-')
+    _, epoch, trace_id = header[len('Root='):].split('-')
+    assert len(epoch) == 8 and len(trace_id) == 24
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    trace_headers = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        StubHandler.trace_headers.append(self.headers['X-Amzn-Trace-Id'])
+        self.send_response(200 if self.path == '/ok' else 500)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_load_generator_metrics(tmp_path, stub_url):
+    pytest.importorskip('aiohttp')
+    StubHandler.trace_headers = []
+    options = {'scenarios': {'benchmark_scenario': {
+        'executor': 'ramping-arrival-rate', 'startRate': 20, 'timeUnit': '1s',
+        'preAllocatedVUs': 2, 'stages': [{'target': 20, 'duration': '1s'}]}}}
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    request = request_from_envs({'URL': f"{stub_url}/ok", 'BODY': '{"a": 1}'})
+    summary = LoadGenerator(options, request, metrics_file).run()
+    assert summary['requests'] == 20 and summary['failed'] == 0
+    with open(metrics_file, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0].keys()) == METRICS_COLUMNS
+    durations = [row for row in rows if row['metric_name'] == 'http_req_duration']
+    assert len(durations) == 20
+    assert all(row['status'] == '200' and row['method'] == 'POST' for row in durations)
+    # Every request is tagged with the propagated X-Ray header
+    tags = sorted(row['extra_tags'] for row in durations)
+    assert tags == sorted(f"xray_header={header}" for header in StubHandler.trace_headers)
+    _, values = K6MetricsTail(metrics_file).read()
+    assert len(values) == 20
+
+
+def test_load_generator_iterations(tmp_path, stub_url):
+    pytest.importorskip('aiohttp')
+    metrics_file = tmp_path / 'k6_metrics.csv'
+    request = request_from_envs({'URL': f"{stub_url}/fail", 'BODY': ''})
+    summary = LoadGenerator({'vus': 2, 'iterations': 5}, request, metrics_file).run()
+    assert summary['requests'] == 5 and summary['failed'] == 5
+    with open(metrics_file, newline='') as f:
+        rows = [row for row in csv.DictReader(f) if row['metric_name'] == 'http_req_failed']
+    assert [row['metric_value'] for row in rows] == ['1.000000'] * 5
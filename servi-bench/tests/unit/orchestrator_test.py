@@ -0,0 +1,123 @@
+import json
+import shutil
+from pathlib import Path
+import pytest
+from sb.orchestrator import Orchestrator, event_windows, log_file_names, parse_step, SUMMARY_FILE, TIMELINE_FILE  # noqa: E501
+
+tests_path = Path(__file__).parent.parent
+bench_file = (tests_path / 'fixtures/empty/empty_benchmark.py').resolve()
+
+
+def copy_benchmarks(tmp_path, num):
+    files = []
+    for i in range(num):
+        app_dir = tmp_path / f"app{i}"
+        app_dir.mkdir()
+        shutil.copy(bench_file, app_dir)
+        files.append(app_dir / bench_file.name)
+    return files
+
+
+def failing_plan(sb):
+    sb.prepare()
+    raise Exception('Failed trial')
+
+
+def test_parse_step():
+    assert parse_step('prepare') == ('prepare', {})
+    assert parse_step(['invoke', {'workload_type': 10}]) == ('invoke', {'workload_type': 10})
+    with pytest.raises(Exception):
+        parse_step(['invoke', 10])
+
+
+def test_log_file_names():
+    files = ['a/x_benchmark.py', 'b/x_benchmark.py', 'c/y_benchmark.py']
+    assert log_file_names(files) == ['x_benchmark.log', 'x_benchmark_2.log', 'y_benchmark.log']
+
+
+def test_unsupported_plan_step(tmp_path):
+    with pytest.raises(Exception, match='Unsupported plan step'):
+        Orchestrator(copy_benchmarks(tmp_path, 1), ['prepare', 'deploy'])
+
+
+def test_orchestrate_benchmarks(tmp_path):
+    files = copy_benchmarks(tmp_path, 3)
+    plan = ['prepare', ['invoke', {'workload_type': 'single', 'live_metrics_interval': 0}], 'cleanup']  # noqa: E501
+    logs_directory = tmp_path / 'logs'
+    results = Orchestrator(files, plan, workers=2, logs_directory=logs_directory).run()
+    assert [result['status'] for result in results] == ['success'] * 3
+    assert [result['file'] for result in results] == [str(file) for file in files]
+    assert results[0]['steps'] == ['prepare', 'invoke', 'cleanup']
+    log = Path(results[0]['log_file']).read_text()
+    assert 'step=invoke' in log
+    assert 'empty_benchmark]prepare_time' in log
+    summary = json.loads((logs_directory / SUMMARY_FILE).read_text())
+    assert summary == results
+
+
+def test_orchestrate_relative_logs_directory(tmp_path, monkeypatch):
+    """Reused workers must not resolve the relative logs directory in a benchmark directory."""
+    files = copy_benchmarks(tmp_path, 3)
+    monkeypatch.chdir(tmp_path)
+    results = Orchestrator(files, ['prepare', 'cleanup'], workers=1,
+                           logs_directory='relative_logs').run()
+    assert [result['status'] for result in results] == ['success'] * 3
+    assert (tmp_path / 'relative_logs' / 'empty_benchmark_3.log').is_file()
+    assert (tmp_path / 'relative_logs' / SUMMARY_FILE).is_file()
+
+
+def test_orchestrate_error_threshold(tmp_path):
+    files = copy_benchmarks(tmp_path, 4)
+    orchestrator = Orchestrator(files, failing_plan, workers=1, error_threshold=0,
+                                logs_directory=tmp_path / 'logs')
+    results = orchestrator.run()
+    assert results[0]['status'] == 'error'
+    assert results[0]['error'] == 'Exception: Failed trial'
+    assert [result['status'] for result in results[1:]] == ['cancelled'] * 3
+    # Cleaned up after the error
+    assert 'cleanup()' in Path(results[0]['log_file']).read_text()
+    assert not (files[0].parent / '.sb/config.yml').exists()
+
+
+SLOW_BENCHMARK = '''
+import time
+
+BENCHMARK_CONFIG = """
+slow_benchmark:
+"""
+
+
+def prepare(spec):
+    time.sleep(0.2)
+
+
+def invoke(spec):
+    time.sleep(0.3)
+
+
+def cleanup(spec):
+    time.sleep(0.2)
+'''
+
+
+def test_orchestrate_serialized_invoke(tmp_path):
+    files = []
+    for i in range(3):
+        (tmp_path / f"app{i}").mkdir()
+        files.append(tmp_path / f"app{i}/slow_benchmark.py")
+        files[-1].write_text(SLOW_BENCHMARK)
+    plan = ['prepare', ['invoke', {'live_metrics_interval': 0}], 'cleanup']
+    results = Orchestrator(files, plan, workers=3, serialize='invoke',
+                           logs_directory=tmp_path / 'logs').run()
+    assert [result['status'] for result in results] == ['success'] * 3
+    invokes = event_windows(results, 'invoke')
+    assert len(invokes) == 3
+    for (_, previous_end), (next_start, _) in zip(invokes, invokes[1:]):
+        assert previous_end <= next_start
+    # Prepares and cleanups overlap with invocations of other benchmarks
+    prepares = event_windows(results, 'prepare')
+    assert any(start < invokes[0][1] for start, _ in prepares[1:] + event_windows(results, 'cleanup'))  # noqa: E501
+    assert len(event_windows(results, 'invoke_queue')) == 3
+    timeline = (tmp_path / 'logs' / TIMELINE_FILE).read_text().splitlines()
+    assert timeline[0] == 'timestamp,benchmark,file,event,type'
+    assert len(timeline) == 1 + 3 * 8
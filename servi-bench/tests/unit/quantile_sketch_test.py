@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from sb.quantile_sketch import QuantileSketch
+
+QUANTILES = [0, 0.01, 0.5, 0.9, 0.99, 1]
+
+
+def test_quantile_sketch_relative_accuracy():
+    rng = np.random.default_rng(42)
+    values = rng.lognormal(3, 1, 10_000)
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.add(values)
+    for q, estimate in zip(QUANTILES, sketch.quantiles(QUANTILES)):
+        exact = np.quantile(values, q, method='lower')
+        assert estimate == pytest.approx(exact, rel=0.01)
+    assert sketch.count == len(values)
+    assert sketch.mean() == pytest.approx(values.mean())
+
+
+def test_quantile_sketch_merge_negative_zero():
+    values = np.array([-5.0, -1.0, 0.0, 0.0, np.nan, 1.0, 2.0, 100.0])
+    merged = QuantileSketch()
+    merged.add(values[:3])
+    other = QuantileSketch()
+    other.add(values[3:])
+    merged.merge(other)
+    assert merged.count == 7
+    assert merged.quantiles([0, 0.5, 1]) == [-5.0, 0.0, 100.0]
+    assert merged.quantile(0.2) == pytest.approx(-1.0, rel=0.01)
+    restored = QuantileSketch.from_dict(merged.to_dict())
+    assert restored.quantiles(QUANTILES) == merged.quantiles(QUANTILES)
+    with pytest.raises(Exception):
+        merged.merge(QuantileSketch(relative_accuracy=0.05))
+
+
+def test_quantile_sketch_empty():
+    sketch = QuantileSketch()
+    sketch.add([])
+    assert np.isnan(sketch.quantile(0.5))
+    assert QuantileSketch.from_dict(sketch.to_dict()).count == 0
@@ -0,0 +1,84 @@
+import zlib
+import pytest
+from sb.trace_files import compress, compression_of, find_traces_file, open_traces, recompress, traces_file_name  # noqa: E501
+
+
+def test_traces_file_name():
+    assert traces_file_name() == 'traces.json'
+    assert traces_file_name('None') == 'traces.json'
+    assert traces_file_name('zst') == 'traces.json.zst'
+    assert compression_of('logs/traces.json.gz') == 'gz'
+    assert compression_of('logs/traces.json') is None
+    with pytest.raises(Exception):
+        traces_file_name('bz2')
+
+
+def test_find_traces_file(tmp_path):
+    assert find_traces_file(tmp_path) == tmp_path / 'traces.json'
+    (tmp_path / 'traces.json.gz').write_bytes(b'')
+    assert find_traces_file(tmp_path) == tmp_path / 'traces.json.gz'
+
+
+@pytest.mark.parametrize('compression', [None, 'gz', 'zst'])
+def test_open_traces_roundtrip(tmp_path, compression):
+    if compression == 'zst':
+        pytest.importorskip('zstandard')
+    path = tmp_path / traces_file_name(compression)
+    with open_traces(path, 'wb') as f:
+        f.write(b'{"Id": "1"}\n')
+    # Appended members or frames are read as a single stream
+    with open(path, 'ab') as f:
+        f.write(compress(b'{"Id": "2"}\n{"Id": "3"}\n', compression))
+    with open_traces(path) as f:
+        assert list(f) == [b'{"Id": "1"}\n', b'{"Id": "2"}\n', b'{"Id": "3"}\n']
+
+
+def traces_lines(num):
+    return [f'{{"Id": "1-{i:08x}", "Segments": ["{"x" * (i % 700)}"]}}\n'.encode()
+            for i in range(num)]
+
+
+def first_frame(data, compression) -> bytes:
+    """Returns the decompressed content of the first gzip member or zstd frame."""
+    if compression == 'gz':
+        return zlib.decompressobj(wbits=31).decompress(data)
+    return pytest.importorskip('zstandard').ZstdDecompressor().decompressobj().decompress(data)
+
+
+@pytest.mark.parametrize('compression', ['gz', 'zst'])
+def test_open_traces_many_frames(tmp_path, compression):
+    """Reading continues across frames beyond the first one and the read buffer size."""
+    if compression == 'zst':
+        pytest.importorskip('zstandard')
+    lines = traces_lines(1000)
+    path = tmp_path / traces_file_name(compression)
+    with open(path, 'wb') as f:
+        for i in range(0, len(lines), 5):
+            f.write(compress(b''.join(lines[i:i + 5]), compression))
+    assert first_frame(path.read_bytes(), compression) == b''.join(lines[:5])
+    with open_traces(path) as f:
+        assert list(f) == lines
+
+
+@pytest.mark.parametrize('compression', ['gz', 'zst'])
+def test_recompress(tmp_path, compression):
+    if compression == 'zst':
+        pytest.importorskip('zstandard')
+    lines = traces_lines(100)
+    path = tmp_path / traces_file_name(compression)
+    with open(path, 'wb') as f:
+        for i in range(0, len(lines), 5):
+            f.write(compress(b''.join(lines[i:i + 5]), compression))
+    size = path.stat().st_size
+    recompress(path)
+    # A single stream spans the entire file
+    assert first_frame(path.read_bytes(), compression) == b''.join(lines)
+    assert path.stat().st_size < size
+    assert list(tmp_path.iterdir()) == [path]
+    with open_traces(path) as f:
+        assert list(f) == lines
+    # Uncompressed files remain unchanged
+    plain = tmp_path / traces_file_name()
+    plain.write_bytes(b''.join(lines))
+    recompress(plain)
+    assert plain.read_bytes() == b''.join(lines)
@@ -0,0 +1,75 @@
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+from sb.aws_trace_analyzer import AwsTraceAnalyzer
+from sb.trace_stats import trace_stats, save_stats, timedelta_ms, STATS_FILE
+
+fixtures_dir = Path(__file__).parent.parent / 'fixtures' / 'aws_trace_analyzer'
+fixture_apps = [
+    'thumbnail_app',
+    'thumbnail_app_missing_root',
+    'matrix_app',
+    'event_processing_memory_leak',
+    'realworld_app',
+    'todo_app',
+    'thumbnail_app_in_progress',
+    'hello_retail_app_error'
+]
+
+
+def analyzed_logs(tmp_path, output_format='csv'):
+    """Analyzes the traces of the fixture apps and returns the logs directory."""
+    traces_file = tmp_path / 'traces.json'
+    with open(traces_file, 'w') as f:
+        for app in fixture_apps:
+            with open(fixtures_dir / app / 'traces.json') as json_file:
+                f.write(json.dumps(json.load(json_file)) + '\n')
+    AwsTraceAnalyzer(traces_file, output_format=output_format).analyze_traces()
+    return tmp_path
+
+
+def test_trace_stats_exact(tmp_path):
+    summary = trace_stats(analyzed_logs(tmp_path))
+    assert summary['method'] == 'exact'
+    assert summary['traces'] == 5
+    assert summary['invalid_traces'] == 3
+    assert summary['breakdown_file'] == 'trace_breakdown.csv'
+    duration = summary['latency_ms']['duration']
+    assert duration['min'] <= duration['p50'] <= duration['p99'] <= duration['max']
+    # Missing categories count as 0ms such that the category means add up to the mean duration
+    category_means = sum(latency['mean'] for field, latency in summary['latency_ms'].items()
+                         if field != 'duration')
+    assert category_means == pytest.approx(duration['mean'])
+    save_stats(summary, tmp_path)
+    assert json.loads((tmp_path / STATS_FILE).read_text()) == summary
+
+
+def test_trace_stats_sketch(tmp_path):
+    exact = trace_stats(analyzed_logs(tmp_path), exact=True)
+    sketch = trace_stats(tmp_path, exact=False, chunk_rows=2)
+    assert sketch['method'] == 'sketch'
+    for field, latency in exact['latency_ms'].items():
+        assert sketch['latency_ms'][field]['mean'] == pytest.approx(latency['mean'])
+        assert sketch['latency_ms'][field]['max'] == pytest.approx(latency['max'])
+    assert sketch['cold_starts'] == exact['cold_starts']
+    assert sketch['error_rate'] == exact['error_rate']
+
+
+@pytest.mark.parametrize('output_format', ['parquet', 'arrow'])
+def test_trace_stats_columnar(tmp_path, output_format):
+    pytest.importorskip('pyarrow')
+    (tmp_path / 'csv').mkdir()
+    expected = trace_stats(analyzed_logs(tmp_path / 'csv'))
+    summary = trace_stats(analyzed_logs(tmp_path, output_format))
+    assert summary['breakdown_file'] == f"trace_breakdown.{output_format}"
+    for field, latency in expected['latency_ms'].items():
+        assert summary['latency_ms'][field] == pytest.approx(latency)
+    assert summary['cold_start_rate'] == expected['cold_start_rate']
+
+
+def test_timedelta_ms():
+    values = ['0:00:00.123456', None, '-1 day, 23:59:59.999000', '2 days, 1:00:00', '9:59:59.000001']  # noqa: E501
+    expected = [123.456, np.nan, -1.0, 49 * 3600 * 1000, 35999000.001]
+    assert timedelta_ms(pd.Series(values, dtype=object)) == pytest.approx(expected, nan_ok=True)  # noqa: E501
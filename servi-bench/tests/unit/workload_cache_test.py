@@ -0,0 +1,85 @@
+import os
+from pathlib import Path
+from sb.benchmark_spec import BenchmarkSpec
+from sb.workload_cache import CACHE_DIRECTORY_ENV, WorkloadOptionsCache, cache_key
+from sb.workload_generator import WorkloadGenerator
+
+traces_path = Path(__file__).parent.parent.parent / 'data' / 'workload_traces'
+
+
+def test_cache_key_depends_on_inputs(monkeypatch):
+    key = cache_key(WorkloadGenerator('jump'))
+    assert key == cache_key(WorkloadGenerator('jump'))
+    assert key != cache_key(WorkloadGenerator('spikes'))
+    assert key != cache_key(WorkloadGenerator('jump', scale_factor=2))
+    assert key != cache_key(WorkloadGenerator('jump', seconds_to_skip=0))
+    monkeypatch.setenv('SB_WORKLOADGEN_SEED', '7')
+    assert key != cache_key(WorkloadGenerator('jump'))
+
+
+def test_cache_key_depends_on_trace_content(tmp_path):
+    trace = tmp_path / 'trace.csv'
+    trace.write_text('InvocationsPerMinute\n60\n120\n')
+    key = cache_key(WorkloadGenerator(str(trace), workload_trace=str(trace)))
+    trace.write_text('InvocationsPerMinute\n60\n180\n')
+    assert key != cache_key(WorkloadGenerator(str(trace), workload_trace=str(trace)))
+
+
+def test_no_cache_key_without_trace():
+    assert cache_key(WorkloadGenerator('single')) is None
+    assert cache_key(WorkloadGenerator(10)) is None
+
+
+def test_get_and_put(tmp_path):
+    cache = WorkloadOptionsCache(tmp_path / 'cache', max_entries=2)
+    source = tmp_path / 'options.json'
+    source.write_text('{"vus": 1}')
+    destination = tmp_path / 'copy.json'
+    assert not cache.get('a', destination)
+    cache.put('a', source)
+    assert cache.get('a', destination)
+    assert destination.read_text() == '{"vus": 1}'
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = WorkloadOptionsCache(tmp_path / 'cache', max_entries=2)
+    source = tmp_path / 'options.json'
+    source.write_text('{}')
+    for mtime, key in enumerate(['a', 'b']):
+        cache.put(key, source)
+        os.utime(cache.path(key), (mtime, mtime))
+    # Using 'a' makes 'b' the least recently used entry
+    assert cache.get('a', tmp_path / 'copy.json')
+    cache.put('c', source)
+    assert sorted(p.stem for p in cache.directory.glob('*.json')) == ['a', 'c']
+
+
+def test_create_workload_options_file_uses_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIRECTORY_ENV, str(tmp_path / 'cache'))
+    config = {'workload_type': 'jump', 'scale_factor': 1, 'scale_type': 'linear',
+              'seconds_to_skip': 180}
+    spec = BenchmarkSpec({'bench': config})
+    spec.create_workload_options_file(tmp_path)
+    options = (tmp_path / BenchmarkSpec.DEFAULT_OPTIONS).read_text()
+    cached = list((tmp_path / 'cache').glob('*.json'))
+    assert len(cached) == 1
+    # A cache hit must not regenerate the options
+    monkeypatch.setattr(WorkloadGenerator, 'write_k6_options', None)
+    (tmp_path / BenchmarkSpec.DEFAULT_OPTIONS).unlink()
+    spec.create_workload_options_file(tmp_path)
+    assert (tmp_path / BenchmarkSpec.DEFAULT_OPTIONS).read_text() == options
+
+
+def test_cache_hit_logs_stage_error(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv(CACHE_DIRECTORY_ENV, str(tmp_path / 'cache'))
+    config = {'workload_type': 'jump', 'scale_factor': 1, 'scale_type': 'linear',
+              'seconds_to_skip': 180, 'stage_tolerance': 2}
+    spec = BenchmarkSpec({'bench': config})
+    caplog.set_level('INFO')
+    spec.create_workload_options_file(tmp_path)
+    logged = [r.message for r in caplog.records if 'tolerance=2rps' in r.message]
+    assert len(logged) == 1
+    caplog.clear()
+    spec.create_workload_options_file(tmp_path)
+    assert 'Using cached k6 options' in caplog.text
+    assert [r.message for r in caplog.records if 'tolerance=2rps' in r.message] == logged
@@ -1,5 +1,13 @@
+import io
 import json
-from sb.workload_generator import WorkloadGenerator
+from pathlib import Path
+import numpy as np
+import pytest
+import stochastic
+from stochastic.processes.continuous import FractionalBrownianMotion
+from sb.workload_generator import K6StageEncoder, LinearStageEncoder, WorkloadGenerator
+
+traces_path = Path(__file__).parent.parent.parent / 'data' / 'workload_traces'
 
 
 def test_default_workload():
@@ -28,6 +36,129 @@ def test_steady_workload():
     assert actual.startswith(expected_start)
 
 
+def test_upscale_trace_matches_per_minute_loop():
+    """The vectorized upscaling yields the same seeded output as scaling minute by minute."""
+    trace = traces_path / '20min_min1rps' / 'bursty.csv'
+    generator = WorkloadGenerator('bursty')
+    actual = generator.upscale_trace(trace, 3)
+    stochastic.random.seed(generator.rng_seed)
+    per_minute_rates = np.loadtxt(trace, skiprows=1, delimiter=',', ndmin=2)[:, 0]
+    samples = FractionalBrownianMotion(hurst=0.8, t=10).sample(60 * len(per_minute_rates)) * 100
+    samples = samples + np.abs(np.floor(samples.min()))
+    expected = []
+    for i, rate in enumerate(per_minute_rates):
+        minute_samples = samples[i * 60:(i + 1) * 60]
+        expected.extend(minute_samples * (rate / minute_samples.sum()))
+    assert len(actual) == 20 * 60
+    assert np.array_equal(actual, np.round(np.array(expected) * 3))
+
+
+def test_write_k6_options_single_window():
+    """Traces that fit into a single window are identical to generate_trace."""
+    options_file = io.StringIO()
+    WorkloadGenerator('jump', 2).write_k6_options(options_file)
+    assert json.loads(options_file.getvalue()) == WorkloadGenerator('jump', 2).generate_trace()
+
+
+def test_iter_k6_stages_windows():
+    generator = WorkloadGenerator('bursty', 1, 'linear', None, 100)
+    windows = list(generator.iter_per_second_rates(chunk_minutes=7))
+    assert [len(rates) for rates in windows] == [7 * 60, 7 * 60, 6 * 60]
+    per_second_rates = np.concatenate(windows)
+    assert per_second_rates.min() >= 0
+    # Stages continue across windows with the same encoding as the concatenated rates
+    generator = WorkloadGenerator('bursty', 1, 'linear', None, 100)
+    encoder = K6StageEncoder()
+    stages = [stage for window in generator.iter_k6_stages(7, encoder) for stage in window]
+    expected = generator.encode_for_k6(per_second_rates[100:])['scenarios']['benchmark_scenario']
+    assert stages == expected['stages']
+    assert encoder.start_rate == expected['startRate']
+    assert encoder.pre_allocated_vus() == expected['preAllocatedVUs']
+    with pytest.raises(Exception, match='only supports linear scaling'):
+        next(WorkloadGenerator('bursty', 2, 'compound').iter_per_second_rates())
+
+
+def test_iter_per_second_rates_global_offset():
+    """All windows are shifted by the same offset based on the minimum of the entire path."""
+    generator = WorkloadGenerator('bursty')
+    per_minute_rates = generator.per_minute_rates()
+    windows = list(generator.iter_bm_windows(per_minute_rates, 7))
+    offset = np.abs(np.floor(min(samples.min() for _, samples in windows)))
+    expected = [np.round(generator.scale_minutes(samples + offset, rates)) for rates, samples in windows]  # noqa: E501
+    actual = list(generator.iter_per_second_rates(chunk_minutes=7))
+    assert all(np.array_equal(a, e) for a, e in zip(actual, expected))
+    # Re-seeded windows are identical across iterations
+    assert all(np.array_equal(a, e) for a, e in zip(generator.iter_per_second_rates(chunk_minutes=7), actual))  # noqa: E501
+
+
+def test_k6_stage_encoder_chunks():
+    per_second_rates = np.array([3, 3, 3, 5, 5, 5, 5, 4, 4, 7, 7, 7], dtype=float)
+    for split in [[1, 2, 6], [3, 7], [4, 5, 8, 11]]:
+        encoder = K6StageEncoder()
+        stages = []
+        for chunk in np.split(per_second_rates, split):
+            stages += encoder.add(chunk)
+        encoder_full = K6StageEncoder()
+        assert stages + encoder.finish() == encoder_full.add(per_second_rates) + encoder_full.finish()  # noqa: E501
+    assert encoder.start_rate == 3
+    assert encoder.pre_allocated_vus() == 1
+
+
+def test_linear_stage_encoder_lossless():
+    per_second_rates = np.array([3, 3, 3, 5, 7, 9, 9, 9, 4, 4], dtype=float)
+    encoder = LinearStageEncoder(0)
+    stages = encoder.add(per_second_rates) + encoder.finish()
+    assert encoder.start_rate == 3
+    assert stages == [
+        {'target': 3, 'duration': '2s'},
+        {'target': 9, 'duration': '3s'},
+        {'target': 9, 'duration': '2s'},
+        {'target': 4, 'duration': '1s'},
+        {'target': 4, 'duration': '1s'},
+        {'target': 4, 'duration': '1s'}
+    ]
+    assert np.array_equal(k6_rates(encoder.start_rate, stages), per_second_rates)
+    assert encoder.error_summary() == {'stages': 6, 'seconds': 10, 'max_error': 0.0, 'mean_error': 0.0}  # noqa: E501
+
+
+def test_linear_stage_encoder_tolerance():
+    """Fewer stages than the run length encoding within the tolerance across chunks."""
+    per_second_rates = WorkloadGenerator('bursty').upscale_trace(traces_path / '20min_20rps' / 'bursty.csv')  # noqa: E501
+    rle_stages = WorkloadGenerator('bursty').encode_for_k6(per_second_rates)['scenarios']['benchmark_scenario']['stages']  # noqa: E501
+    encoder = LinearStageEncoder(2)
+    stages = []
+    for chunk in np.array_split(per_second_rates, 7):
+        stages += encoder.add(chunk)
+    stages += encoder.finish()
+    errors = np.abs(k6_rates(encoder.start_rate, stages) - per_second_rates)
+    summary = encoder.error_summary()
+    assert len(stages) == summary['stages'] < len(rle_stages) / 2
+    assert errors.max() == pytest.approx(summary['max_error'])
+    assert errors.mean() == pytest.approx(summary['mean_error'])
+    assert summary['max_error'] <= 2
+    with pytest.raises(Exception, match='must not be negative'):
+        LinearStageEncoder(-1)
+
+
+def test_stage_tolerance_options():
+    options = WorkloadGenerator('jump', stage_tolerance=1).generate_trace()
+    options_file = io.StringIO()
+    WorkloadGenerator('jump', stage_tolerance=1).write_k6_options(options_file)
+    assert json.loads(options_file.getvalue()) == options
+    stages = options['scenarios']['benchmark_scenario']['stages']
+    assert len(stages) < len(WorkloadGenerator('jump').generate_trace()['scenarios']['benchmark_scenario']['stages'])  # noqa: E501
+
+
+def k6_rates(start_rate, stages) -> np.ndarray:
+    """Returns the per-second rates of linearly ramping k6 stages starting at `start_rate`."""
+    times = [0]
+    targets = [start_rate]
+    for stage in stages:
+        times.append(times[-1] + int(stage['duration'][:-1]))
+        targets.append(stage['target'])
+    return np.interp(np.arange(times[-1]), times, targets)
+
+
 # Helper returning a JSON-string based on given args for the workload generator
 def json_options(*args):
     generator = WorkloadGenerator(*args)